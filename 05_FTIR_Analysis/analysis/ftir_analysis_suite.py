@@ -5,14 +5,25 @@ Command-line interface for batch processing and reproducible analysis
 """
 
 import argparse
+import contextlib
+import glob
+import io
 import sys
+import time
 from pathlib import Path
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import json
 from datetime import datetime
-import jcamp
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from shared.utils.jcamp_dx import read_jcamp
+from shared.utils.parallel import parallel_map
+from shared.utils.baselines import BASELINE_METHODS, baseline_cache, cached_baseline
 
 import matplotlib.pyplot as plt
 
@@ -92,7 +103,7 @@ class FTIRAnalysisSuite:
     def load_jdx_file(self, file_path):
         """Load JDX file and extract metadata"""
         try:
-            data = jcamp.jcamp_readfile(file_path)
+            data = read_jcamp(file_path)
             self.wavenumbers = np.array(data['x'])
             self.intensities = np.array(data['y'])
             self.metadata = {k: v for k, v in data.items() if k not in ['x', 'y']}
@@ -118,35 +129,13 @@ class FTIRAnalysisSuite:
             return
             
         try:
-            baseline_fitter = pybaselines.Baseline(self.wavenumbers)
+            self.baseline = cached_baseline(self.wavenumbers, self.intensities, method, **kwargs)
             
             if method == 'als':
-                self.baseline, params = baseline_fitter.asls(
-                    self.intensities, 
-                    lam=kwargs.get('lambda', 1e4),
-                    p=kwargs.get('p', 0.01)
-                )
                 print(f"✅ Applied ALS baseline correction (λ={kwargs.get('lambda', 1e4):.0e})")
-                
             elif method == 'arpls':
-                self.baseline, params = baseline_fitter.arpls(
-                    self.intensities,
-                    lam=kwargs.get('lambda', 1e5)
-                )
                 print(f"✅ Applied ARPLS baseline correction")
-                
-            elif method == 'whittaker':
-                self.baseline, params = baseline_fitter.whittaker(
-                    self.intensities,
-                    lam=kwargs.get('lambda', 1e3)
-                )
-                print(f"✅ Applied Whittaker baseline correction")
-                
             elif method == 'polynomial':
-                self.baseline, params = baseline_fitter.poly(
-                    self.intensities,
-                    poly_order=kwargs.get('order', 3)
-                )
                 print(f"✅ Applied polynomial baseline correction (order {kwargs.get('order', 3)})")
                 
             self.corrected_intensities = self.intensities - self.baseline
@@ -374,8 +363,8 @@ class FTIRAnalysisSuite:
             
         return fig
         
-    def export_results(self, output_path):
-        """Export comprehensive analysis results"""
+    def export_results(self, output_path, extra=None):
+        """Export comprehensive analysis results (``extra`` adds top-level keys)"""
         results = {
             'timestamp': datetime.now().isoformat(),
             'metadata': self.metadata,
@@ -403,15 +392,290 @@ class FTIRAnalysisSuite:
                     'max': float(param.max) if param.max is not None else None
                 }
                 
+        if extra:
+            results.update(extra)
+            
         with open(output_path, 'w') as f:
             json.dump(results, f, indent=2)
             
         print(f"💾 Exported results to {output_path}")
 
+# Batch processing
+JDX_SUFFIXES = ('.jdx', '.dx')
+BATCH_STAGES = ['load', 'baseline', 'detect', 'fit', 'export', 'plot']
+
+
+def expand_jdx_inputs(inputs):
+    """
+    Resolve files, directories and glob patterns to a sorted list of JDX files.
+
+    Args:
+        inputs: Paths; directories contribute their *.jdx/*.dx files and
+            patterns are expanded with ``glob`` (``**`` is recursive)
+    Returns:
+        list of unique Paths
+    """
+    files = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            files.extend(p for p in path.iterdir() if p.suffix.lower() in JDX_SUFFIXES)
+        elif path.is_file():
+            files.append(path)
+        else:
+            matches = [Path(p) for p in glob.glob(str(item), recursive=True)]
+            files.extend(p for p in matches if p.is_file() and p.suffix.lower() in JDX_SUFFIXES)
+    return sorted(set(p.resolve() for p in files))
+
+
+def batch_output_names(files):
+    """
+    Unique output names for batch files.
+
+    Each file is named by its stem; files sharing a stem (e.g. the same sample
+    name on different measurement days) are prefixed with as many parent
+    directory names as it takes to tell them apart ('day2_BTY_AD'), and
+    files differing only in extension keep it ('THB_dx').
+
+    Args:
+        files: Resolved JDX paths (see expand_jdx_inputs)
+    Returns:
+        dict of {path: name}
+    """
+    files = [Path(f) for f in files]
+    # Files of one directory that differ only in extension ('a.jdx', 'a.dx') keep it
+    same_dir = pd.Series([(f.parent, f.stem) for f in files]).duplicated(keep=False)
+    stems = {f: f"{f.stem}_{f.suffix.lstrip('.')}" if twin else f.stem
+             for f, twin in zip(files, same_dir)}
+
+    depth = dict.fromkeys(files, 0)
+    while True:
+        names = {f: '_'.join(f.parent.parts[len(f.parent.parts) - depth[f]:] + (stems[f],))
+                 for f in files}
+        taken = pd.Series(list(names.values())).value_counts()
+        deeper = [f for f in files
+                  if taken[names[f]] > 1 and depth[f] < len(f.parent.parts) - 1]
+        if not deeper:
+            break
+        for f in deeper:
+            depth[f] += 1
+    return names
+
+
+def _peak_rows(analyzer, peak_positions, sources, detected):
+    """One row per initial peak position, with fit parameters when available."""
+    prominences = {p['wavenumber']: p['prominence'] for p in detected}
+    result = analyzer.fit_result
+    r_squared = None
+    if result is not None:
+        r_squared = float(1 - result.residual.var() / np.var(analyzer.corrected_intensities))
+
+    rows = []
+    for i, (pos, source) in enumerate(zip(peak_positions, sources)):
+        row = {
+            'Peak': i + 1,
+            'Source': source,
+            'Initial_cm-1': float(pos),
+            'Prominence': float(prominences[pos]) if source == 'auto' else None,
+            'Center_cm-1': None,
+            'Center_Err_cm-1': None,
+            'Sigma_cm-1': None,
+            'Height': None,
+            'Area': None,
+            'R_squared': r_squared,
+        }
+        if result is not None and f'peak{i}_center' in result.params:
+            center = result.params[f'peak{i}_center']
+            sigma = result.params[f'peak{i}_sigma'].value
+            height = result.params[f'peak{i}_height'].value
+            row.update({
+                'Center_cm-1': center.value,
+                'Center_Err_cm-1': center.stderr,
+                'Sigma_cm-1': sigma,
+                'Height': height,
+                'Area': height * sigma * np.sqrt(2 * np.pi),  # Gaussian area
+            })
+        rows.append(row)
+    return rows
+
+
+def analyze_file(task):
+    """
+    Run load -> baseline -> peak detection -> fit -> export for one file.
+
+    Designed as a parallel_map worker: output is captured instead of printed,
+    and a failing stage ends this file only.
+
+    Args:
+        task: (file_path, options) where options holds baseline, model,
+            auto_peaks, peaks, max_peaks, output_dir, plot and optionally
+            output_name (default: the file stem)
+    Returns:
+        dict with File, Sample, Status ('ok', 'skipped' when a stage could
+        not run, 'failed'), Failed_Stage, Error, per-stage timings
+        (Time_<stage>_s), peak rows and the captured log
+    """
+    file_path, options = task
+    file_path = Path(file_path)
+    name = options.get('output_name') or file_path.stem
+    summary = {'File': str(file_path), 'Sample': name, 'Status': 'ok',
+               'Failed_Stage': None, 'Error': None, 'N_Peaks': 0, 'Baseline_Cache': None}
+    timings = {stage: None for stage in BATCH_STAGES}
+    peaks = []
+    log = io.StringIO()
+    analyzer = FTIRAnalysisSuite()
+
+    def run_stage(stage, func):
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(log):
+                return func()
+        finally:
+            timings[stage] = time.perf_counter() - start
+
+    stage = 'load'
+    try:
+        if not run_stage('load', lambda: analyzer.load_jdx_file(file_path)):
+            raise RuntimeError(log.getvalue().strip().splitlines()[-1])
+
+        stage = 'baseline'
+        before = baseline_cache().stats()
+        run_stage('baseline', lambda: analyzer.apply_baseline_correction(options['baseline']))
+        after = baseline_cache().stats()
+        summary['Baseline_Cache'] = next((level for level, count in
+                                          [('memory', 'memory_hits'), ('disk', 'disk_hits'), ('computed', 'misses')]
+                                          if after[count] > before[count]), None)
+        if analyzer.baseline is None:
+            raise RuntimeError(log.getvalue().strip().splitlines()[-1])
+
+        stage = 'detect'
+        detected = []
+        if options['auto_peaks']:
+            detected = run_stage('detect', analyzer.detect_peaks_automatically)
+        peak_positions = [p['wavenumber'] for p in detected[:options['max_peaks']]]
+        sources = ['auto'] * len(peak_positions)
+        peak_positions += list(options['peaks'] or [])
+        sources += ['manual'] * (len(peak_positions) - len(sources))
+
+        stage = 'fit'
+        if peak_positions and not LMFIT_AVAILABLE:
+            summary.update({'Status': 'skipped', 'Failed_Stage': 'fit',
+                            'Error': 'lmfit not installed; peaks not fitted'})
+        elif peak_positions:
+            result = run_stage('fit', lambda: analyzer.fit_peaks_with_lmfit(peak_positions, options['model']))
+            if result is None:
+                raise RuntimeError(log.getvalue().strip().splitlines()[-1])
+        peaks = _peak_rows(analyzer, peak_positions, sources, detected)
+        summary['N_Peaks'] = len(peaks)
+
+        stage = 'export'
+        output_prefix = Path(options['output_dir']).resolve() / name
+        run_stage('export', lambda: analyzer.export_results(
+            f"{output_prefix}.json",
+            extra={'source_file': str(file_path), 'peaks': peaks,
+                   'timings_s': {k: v for k, v in timings.items() if v is not None}}))
+
+        stage = 'plot'
+        if options['plot']:
+            fig = run_stage('plot', lambda: analyzer.create_analysis_plot(str(output_prefix)))
+            plt.close(fig)
+
+    except Exception as e:
+        summary.update({'Status': 'failed', 'Failed_Stage': stage,
+                        'Error': str(e).lstrip('❌⚠️ ') or type(e).__name__})
+
+    summary.update({f'Time_{name}_s': value for name, value in timings.items()})
+    return {'summary': summary, 'peaks': peaks, 'log': log.getvalue()}
+
+
+def write_results_table(table, output_path):
+    """
+    Write a results table as Parquet (``.parquet``, needs pyarrow/fastparquet)
+    or CSV; falls back to CSV when no Parquet engine is installed.
+
+    Returns:
+        Path actually written
+    """
+    output_path = Path(output_path)
+    if output_path.suffix.lower() == '.parquet':
+        try:
+            table.to_parquet(output_path, index=False)
+            return output_path
+        except ImportError:
+            output_path = output_path.with_suffix('.csv')
+            print(f"⚠️ No Parquet engine installed, writing {output_path.name} instead")
+    table.to_csv(output_path, index=False)
+    return output_path
+
+
+def run_batch(files, options, table_name='ftir_batch_results.csv', processes=None):
+    """
+    Analyse many JDX files in a process pool.
+
+    Every file gets its own JSON export in ``options['output_dir']``, named
+    by batch_output_names so files sharing a stem do not overwrite each
+    other; the peaks of all files go to one consolidated table and the
+    per-file status and stage timings to ``ftir_batch_summary.csv``. Failed
+    and skipped stages are reported, not raised.
+
+    Args:
+        files: JDX paths (see expand_jdx_inputs)
+        options: As for analyze_file
+        table_name: Consolidated table file name (.parquet or .csv)
+        processes: Worker processes (None for CPU count, 1 for serial)
+    Returns:
+        (peaks DataFrame, summary DataFrame)
+    """
+    output_dir = Path(options['output_dir'])
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"📂 Batch analysing {len(files)} files -> {output_dir}")
+    start = time.perf_counter()
+    names = batch_output_names(files)
+    tasks = [(str(f), {**options, 'output_name': names[Path(f)]}) for f in files]
+    results = parallel_map(analyze_file, tasks, processes=processes)
+    elapsed = time.perf_counter() - start
+
+    summary = pd.DataFrame([r['summary'] for r in results])
+    peaks = pd.DataFrame([{'File': r['summary']['File'], 'Sample': r['summary']['Sample'], **row}
+                          for r in results for row in r['peaks']])
+
+    table_path = write_results_table(peaks, output_dir / table_name)
+    summary.to_csv(output_dir / 'ftir_batch_summary.csv', index=False)
+
+    # Stage timing and failure report
+    n_failed = int((summary['Status'] == 'failed').sum())
+    print(f"\n⏱️ Stage timings over {len(summary)} files (s):")
+    for stage in BATCH_STAGES:
+        times = summary[f'Time_{stage}_s'].dropna()
+        if len(times):
+            print(f"   {stage:<9} total {times.sum():8.3f}  mean {times.mean():7.3f}  max {times.max():7.3f}")
+    print(f"   wall time {elapsed:.2f} s")
+    cache_levels = summary['Baseline_Cache'].value_counts()
+    if cache_levels.sum():
+        hits = cache_levels.get('memory', 0) + cache_levels.get('disk', 0)
+        print(f"   baseline cache {hits / cache_levels.sum():.0%} hits "
+              f"({cache_levels.get('memory', 0)} memory, {cache_levels.get('disk', 0)} disk, "
+              f"{cache_levels.get('computed', 0)} computed)")
+
+    skipped = summary[summary['Status'] == 'skipped']
+    if len(skipped):
+        print(f"\n⚠️ {len(skipped)} of {len(summary)} files have skipped stages:")
+        for _, row in skipped.iterrows():
+            print(f"   {row['Sample']}: {row['Failed_Stage']} - {row['Error']}")
+    if n_failed:
+        print(f"\n❌ {n_failed} of {len(summary)} files failed:")
+        for _, row in summary[summary['Status'] == 'failed'].iterrows():
+            print(f"   {row['Sample']}: {row['Failed_Stage']} - {row['Error']}")
+    print(f"\n✅ {len(summary) - n_failed} files analysed; {len(peaks)} peaks in {table_path}")
+    return peaks, summary
+
+
 def main():
     parser = argparse.ArgumentParser(description="Professional FTIR Analysis Suite")
-    parser.add_argument("input_file", help="JDX file to analyze")
-    parser.add_argument("--baseline", choices=['als', 'arpls', 'whittaker', 'polynomial'], 
+    parser.add_argument("inputs", nargs='+', metavar="input",
+                       help="JDX file(s), directories or glob patterns to analyze")
+    parser.add_argument("--baseline", choices=list(BASELINE_METHODS), 
                        default='als', help="Baseline correction method")
     parser.add_argument("--peaks", nargs='+', type=float, 
                        help="Manual peak positions (cm⁻¹)")
@@ -421,9 +685,37 @@ def main():
                        default='gaussian', help="Peak model type")
     parser.add_argument("--output", help="Output file prefix")
     parser.add_argument("--plot", action='store_true', help="Create analysis plot")
+    parser.add_argument("--batch", action='store_true',
+                       help="Force batch mode (implied by directories, globs or several files)")
+    parser.add_argument("--output-dir", help="Batch output directory")
+    parser.add_argument("--table", default='ftir_batch_results.csv',
+                       help="Batch results table name (.csv or .parquet)")
+    parser.add_argument("--max-peaks", type=int, default=10,
+                       help="Auto-detected peaks fitted per spectrum")
+    parser.add_argument("--processes", type=int, help="Batch worker processes (default: CPU count)")
     
     args = parser.parse_args()
     
+    files = expand_jdx_inputs(args.inputs)
+    if not files:
+        print(f"❌ No JDX files found in {args.inputs}")
+        return 1
+        
+    batch = args.batch or len(files) > 1 or not all(Path(p).is_file() for p in args.inputs)
+    if batch:
+        options = {
+            'baseline': args.baseline,
+            'model': args.model,
+            'auto_peaks': args.auto_peaks,
+            'peaks': args.peaks,
+            'max_peaks': args.max_peaks,
+            'output_dir': args.output_dir or f"ftir_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            'plot': args.plot,
+        }
+        peaks, summary = run_batch(files, options, args.table, args.processes)
+        return 0 if (summary['Status'] == 'ok').all() else 2
+    args.input_file = args.inputs[0]
+    
     # Initialize analyzer
     analyzer = FTIRAnalysisSuite()
     
@@ -439,7 +731,7 @@ def main():
     
     if args.auto_peaks:
         detected = analyzer.detect_peaks_automatically()
-        peak_positions = [p['wavenumber'] for p in detected[:10]]  # Top 10 peaks
+        peak_positions = [p['wavenumber'] for p in detected[:args.max_peaks]]  # Top peaks
         
     if args.peaks:
         peak_positions.extend(args.peaks)
@@ -6,11 +6,18 @@ Uses Bokeh for proper click handling in web browsers
 
 import numpy as np
 import pandas as pd
-import jcamp
 from pathlib import Path
 import json
+import sys
 from datetime import datetime
 
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from shared.utils.jcamp_dx import read_jcamp
+from shared.utils.baselines import cached_baseline
+
 # Bokeh imports for true interactivity
 try:
     from bokeh.plotting import figure, show, save, output_file
@@ -50,7 +57,7 @@ class InteractiveFTIRAnalyzer:
     def load_jdx_file(self, file_path):
         """Load JDX file"""
         try:
-            data = jcamp.jcamp_readfile(file_path)
+            data = read_jcamp(file_path)
             self.wavenumbers = np.array(data['x'])
             self.intensities = np.array(data['y'])
             
@@ -73,20 +80,7 @@ class InteractiveFTIRAnalyzer:
             return
             
         try:
-            baseline_fitter = pybaselines.Baseline(self.wavenumbers)
-            
-            if method == 'als':
-                self.baseline, _ = baseline_fitter.asls(
-                    self.intensities, 
-                    lam=kwargs.get('lambda', 1e4),
-                    p=kwargs.get('p', 0.01)
-                )
-            elif method == 'arpls':
-                self.baseline, _ = baseline_fitter.arpls(
-                    self.intensities,
-                    lam=kwargs.get('lambda', 1e5)
-                )
-                
+            self.baseline = cached_baseline(self.wavenumbers, self.intensities, method, **kwargs)
             self.corrected_intensities = self.intensities - self.baseline
             print(f"✅ Applied {method} baseline correction")
             
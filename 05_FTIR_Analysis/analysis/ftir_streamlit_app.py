@@ -9,12 +9,19 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import jcamp
 from pathlib import Path
 import json
+import sys
 from datetime import datetime
 import matplotlib.pyplot as plt
 
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+from shared.utils.jcamp_dx import read_jcamp
+from shared.utils.baselines import baseline_cache, cached_baseline
+
 # Set publication-quality plot style
 def set_plot_style():
     """Set publication-quality matplotlib style"""
@@ -73,9 +80,9 @@ class FTIRAnalyzer:
         self.baseline = None
         
     def load_jdx_file(self, file_path):
-        """Load JDX file using jcamp library"""
+        """Load JDX file using the shared JCAMP-DX reader"""
         try:
-            data = jcamp.jcamp_readfile(file_path)
+            data = read_jcamp(file_path)
             self.wavenumbers = np.array(data['x'])
             self.intensities = np.array(data['y'])
             
@@ -96,25 +103,7 @@ class FTIRAnalyzer:
             return
             
         try:
-            baseline_fitter = pybaselines.Baseline(self.wavenumbers)
-            
-            if method == 'als':
-                self.baseline, params = baseline_fitter.asls(
-                    self.intensities, 
-                    lam=kwargs.get('lambda', 1e4),
-                    p=kwargs.get('p', 0.01)
-                )
-            elif method == 'arpls':
-                self.baseline, params = baseline_fitter.arpls(
-                    self.intensities,
-                    lam=kwargs.get('lambda', 1e5)
-                )
-            elif method == 'polynomial':
-                self.baseline, params = baseline_fitter.poly(
-                    self.intensities,
-                    poly_order=kwargs.get('order', 3)
-                )
-                
+            self.baseline = cached_baseline(self.wavenumbers, self.intensities, method, **kwargs)
             self.corrected_intensities = self.intensities - self.baseline
             
         except Exception as e:
@@ -227,6 +216,12 @@ def main():
             with st.spinner("Applying baseline correction..."):
                 analyzer.apply_baseline_correction(method, **kwargs)
                 st.success("✅ Baseline correction applied")
+                
+        cache_stats = baseline_cache().stats()
+        if cache_stats['lookups']:
+            st.sidebar.caption(f"Baseline cache: {cache_stats['hit_rate']:.0%} hits "
+                               f"({cache_stats['memory_hits']} memory, {cache_stats['disk_hits']} disk, "
+                               f"{cache_stats['misses']} computed)")
         
         # Peak fitting controls
         st.sidebar.header("🎯 Peak Fitting")
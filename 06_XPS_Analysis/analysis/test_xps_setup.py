@@ -222,6 +222,91 @@ def run_basic_analysis_test():
         return False
 
 
+def test_background_agreement(max_deviation=0.01):
+    """Compare native Shirley backgrounds with the CasaXPS Background columns (asserts)."""
+    print("\n🔍 Testing background algorithms against CasaXPS...")
+
+    import numpy as np
+    import pandas as pd
+
+    analysis_dir = Path(__file__).resolve().parent
+    sys.path.append(str(analysis_dir.parent.parent))
+    from shared.utils.xps_utils import XPS_DEFAULT_MODELS, xps_background
+
+    data_file = analysis_dir.parent / 'data' / 'raw' / 'BTY_AD.xlsx'
+    if not data_file.exists():
+        print(f"  ⚠️  {data_file.name} not found, skipping")
+        return
+
+    sheet = pd.read_excel(data_file, header=None)
+    headers = sheet.iloc[6].astype(str)
+    all_good = True
+
+    for be_col in np.flatnonzero(headers.str.strip() == 'B.E.'):
+        region = str(sheet.iloc[0, be_col + 2]).strip()
+        bg_col = next(c for c in range(be_col, len(headers)) if 'Background' in headers[c])
+        block = sheet.iloc[7:, [be_col, be_col + 1, bg_col]].apply(pd.to_numeric, errors='coerce').dropna()
+        be, raw, casa_bg = block.to_numpy(dtype=float).T
+
+        low, high = XPS_DEFAULT_MODELS[region]['limits']
+        inside = (be >= low) & (be <= high)
+        scale = raw[inside].max() - raw[inside].min()
+
+        deviations = {}
+        for method in ['shirley', 'tougaard', 'linear']:
+            background = xps_background(be[inside], raw[inside], method=method)
+            deviations[method] = np.max(np.abs(background - casa_bg[inside])) / scale
+
+        ok = bool(deviations['shirley'] <= max_deviation)
+        all_good &= ok
+        summary = ", ".join(f"{m} {d:.2%}" for m, d in deviations.items())
+        print(f"  {'✓' if ok else '✗'} {region}: max deviation {summary} of raw range")
+
+    assert all_good, f"Shirley background deviates by more than {max_deviation:.0%} from CasaXPS"
+    print("✅ Shirley backgrounds match CasaXPS")
+
+
+def test_fit_store_identical_spectra():
+    """Reuse a fit store with two samples whose spectra are identical (asserts)."""
+    print("\n🔍 Testing the XPS fit store with identical spectra...")
+
+    import tempfile
+    import numpy as np
+    import pandas as pd
+
+    analysis_dir = Path(__file__).resolve().parent
+    sys.path.append(str(analysis_dir.parent.parent))
+    from shared.utils.xps_fit_store import XPSFitStore, fit_key
+    from shared.utils.xps_utils import XPS_DEFAULT_MODELS, fit_xps_dataset
+
+    be = np.linspace(71.5, 77.5, 121)
+    raw = 200 + 5000 * np.exp(-4 * np.log(2) * ((be - 74.6) / 1.5) ** 2)
+    frame = pd.DataFrame({'B.E.': be, 'raw': raw, 'Background': np.nan,
+                          'Envelope': np.nan, 'Region': 'Al 2p'})
+    models = {'Al 2p': XPS_DEFAULT_MODELS['Al 2p']}
+    frames = {'BTY_UV_H2O': frame, 'THB_UV_H2O': frame.copy()}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'fits.p2r'
+        _, first = fit_xps_dataset(frames, models, processes=1, store=path)
+        _, second = fit_xps_dataset(frames, models, processes=1, store=path)
+        assert len(first) == len(second) == 2, f"parameter rows {len(first)} -> {len(second)}"
+        print("  ✓ stored fits are returned once per sample")
+
+        # Refit only one of the two spectra; the other keeps the shared curves
+        changed = dict(frames, THB_UV_H2O=frame.assign(raw=raw * 1.01))
+        fit_xps_dataset(changed, models, processes=1, store=path)
+        store = XPSFitStore(path)
+        assert len(store) == 2 and len(store.query()) == 2
+        for sample, data in changed.items():
+            key = fit_key(data['B.E.'], data['raw'], models['Al 2p'])[0]
+            result = store.get(sample, 'Al 2p', key)
+            assert result is not None and len(result['parameters']) == 1, sample
+        print("  ✓ refitting one of two identical spectra keeps the other's fit")
+
+    print("✅ Fit store keys fits by sample and region")
+
+
 def main():
     """Run all tests."""
     print("XPS Analysis Setup Test")
@@ -234,14 +319,17 @@ def main():
         ("Shared Utilities", test_shared_utilities),
         ("Directory Structure", test_directory_structure),
         ("Data Files", test_data_files),
+        ("Background Agreement", test_background_agreement),
+        ("Fit Store", test_fit_store_identical_spectra),
     ]
 
     results = []
 
     for test_name, test_func in tests:
         try:
+            # Setup checks return a bool; asserting tests return None when they pass
             result = test_func()
-            results.append((test_name, result))
+            results.append((test_name, result is None or bool(result)))
         except Exception as e:
             print(f"❌ {test_name} test failed with error: {e}")
             results.append((test_name, False))
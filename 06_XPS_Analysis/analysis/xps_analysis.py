@@ -20,8 +20,13 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import matplotlib.ticker as ticker
+import matplotlib.colors as mcolors
+from matplotlib.collections import LineCollection, PolyCollection
 import os
 import sys
+import json
+import argparse
+import inspect
 import warnings
 from pathlib import Path
 
@@ -42,8 +47,27 @@ try:
         background_subtract_normalize,
         get_xps_colors,
         calculate_spectral_metrics,
-        export_spectral_data
+        calculate_spectral_metrics_batch,
+        pad_spectra,
+        export_spectral_data,
+        extract_xps_regions,
+        read_casaxps_export,
+        resample_to_common_grid,
+        XPSDataset,
+        VamasFile,
+        XPS_FIT_COLUMNS,
+        XPS_TREATMENT_LABELS,
+        XPS_TREATMENT_ORDER,
+        discover_xps_datasets,
+        load_xps_samples
     )
+    from shared.utils.cache import hash_arguments
+    from shared.utils.parallel import parallel_map
+    from shared.utils.xps_quantification import quantify_xps, composition_matrix
+    from shared.utils.xps_survey import screen_vamas_surveys
+    from shared.utils.xps_chemical_states import chemical_state_index
+    from shared.utils.xps_monte_carlo import monte_carlo_uncertainty
+    from shared.scripts.data_loading import compact_dataframe, save_results
 
     print("✓ Successfully imported shared utilities")
 except ImportError as e:
@@ -55,157 +79,66 @@ except ImportError as e:
 set_plot_style()
 
 
-def process_xps_file(filepath):
+def process_xps_file(filepath, compact=False, float_rtol=0.0):
     """
-    Process XPS Excel file with comprehensive error handling and validation.
-    
+    Process a CasaXPS export (.xlsx or .csv) with comprehensive error handling and validation.
+
+    The column layout of every region is detected from the header rows, so
+    exports with any set of regions and fit components need no per-file code.
+
     Args:
-        filepath: Path to XPS Excel file
+        filepath: Path to XPS Excel or CSV export
+        compact: Store 'Region' as an ordered categorical, and float columns as
+            float32 where every value round-trips within ``float_rtol``
+        float_rtol: Relative float32 round-trip tolerance for ``compact``; the
+            default 0.0 keeps measured intensities in float64 (float32 keeps
+            about 7 significant digits, so e.g. 1e-6 downcasts them)
         
     Returns:
         DataFrame with validated XPS data or None if processing fails
     """
+    filepath = str(filepath)
     filename = os.path.basename(filepath)
     print(f"\nProcessing {filename}...")
 
-    output_columns = ['B.E.', 'raw', 'fit1', 'fit2', 'fit3', 'fit4', 'fit5', 'fit6', 'Envelope', 'Background', 'Region']
-
     try:
         # Validate file exists and is readable
         if not os.path.exists(filepath):
             print(f"  ❌ ERROR: File not found: {filepath}")
             return None
             
-        if not filepath.endswith(('.xlsx', '.xls')):
-            print(f"  ❌ ERROR: Not an Excel file: {filepath}")
+        if not filepath.endswith(('.xlsx', '.xls', '.csv')):
+            print(f"  ❌ ERROR: Not an Excel or CSV export: {filepath}")
             return None
             
-        excel_data = pd.read_excel(filepath, header=None)
-        print(f"  ✓ Loaded successfully: {excel_data.shape[0]} rows, {excel_data.shape[1]} columns")
+        data_rows, layout = read_casaxps_export(filepath)
+        print(f"  ✓ Loaded successfully: {data_rows.shape[0]} data rows, {data_rows.shape[1]} columns")
         
         # Validate minimum data requirements
-        if excel_data.shape[0] < 10:
-            print(f"  ❌ ERROR: Insufficient data rows (< 10): {excel_data.shape[0]}")
-            return None
-            
-        if excel_data.shape[1] < 20:
-            print(f"  ❌ ERROR: Insufficient data columns (< 20): {excel_data.shape[1]}")
+        if data_rows.shape[0] < 3:
+            print(f"  ❌ ERROR: Insufficient data rows (< 3): {data_rows.shape[0]}")
             return None
 
-        headers = excel_data.iloc[6]
-        c1s_be_col = None
-        if pd.notna(headers[9]) and "B.E." in str(headers[9]):
-            c1s_be_col = 9
-            print(f"  C 1s B.E. found at column 9")
-        elif pd.notna(headers[8]) and "B.E." in str(headers[8]):
-            c1s_be_col = 8
-            print(f"  C 1s B.E. found at column 8")
-        else:
-            print(f"  WARNING: C 1s B.E. column not found!")
-
-        regions_info = []
-
-        # O 1s region
-        regions_info.append({
-            'name': 'O 1s',
-            'be_col': 0,
-            'raw_col': 1,
-            'fit_cols': [2, 3, 4, 5] if pd.notna(headers[5]) and 'O 1s' in str(headers[5]) else [2, 3, 4],
-            'bg_col': 6 if 'Background' in str(headers[6]) else 5,
-            'env_col': 7 if 'Envelope' in str(headers[7]) else 6
-        })
-
-        # C 1s region
-        if c1s_be_col == 9:
-            regions_info.append({
-                'name': 'C 1s',
-                'be_col': 9,
-                'raw_col': 10,
-                'fit_cols': [11, 12, 13, 14],
-                'bg_col': 15,
-                'env_col': 16
-            })
-        elif c1s_be_col == 8:
-            regions_info.append({
-                'name': 'C 1s',
-                'be_col': 8,
-                'raw_col': 9,
-                'fit_cols': [10, 11, 12, 13, 14],
-                'bg_col': 15,
-                'env_col': 16
-            })
-
-        # Al 2p region - dynamically detect fit columns
-        al_fit_cols = [20]
-        # Check if column 21 contains Al 2p fit data (not Background)
-        if pd.notna(headers[21]) and 'Al 2p' in str(headers[21]):
-            al_fit_cols.append(21)
-            al_bg_col = 22
-            al_env_col = 23
-        else:
-            al_bg_col = 21
-            al_env_col = 22
-            
-        regions_info.append({
-            'name': 'Al 2p',
-            'be_col': 18,
-            'raw_col': 19,
-            'fit_cols': al_fit_cols,
-            'bg_col': al_bg_col,
-            'env_col': al_env_col
-        })
-
-        all_data = []
-        data_rows = excel_data.iloc[7:]
-
-        for idx, row in data_rows.iterrows():
-            for region in regions_info:
-                try:
-                    be_value = row.iloc[region['be_col']]
-                    if pd.isna(be_value):
-                        continue
-
-                    be_float = float(be_value)
-
-                    if region['name'] == 'O 1s' and not (520 <= be_float <= 550):
-                        continue
-                    if region['name'] == 'C 1s' and not (270 <= be_float <= 310):
-                        continue
-                    if region['name'] == 'Al 2p' and not (60 <= be_float <= 95):
-                        continue
-
-                    row_data = [be_float]
-
-                    raw_val = row.iloc[region['raw_col']]
-                    row_data.append(float(raw_val) if not pd.isna(raw_val) else np.nan)
-
-                    for i in range(6):
-                        if i < len(region['fit_cols']):
-                            fit_val = row.iloc[region['fit_cols'][i]]
-                            row_data.append(float(fit_val) if not pd.isna(fit_val) else np.nan)
-                        else:
-                            row_data.append(np.nan)
-
-                    env_val = row.iloc[region['env_col']]
-                    row_data.append(float(env_val) if not pd.isna(env_val) else np.nan)
-
-                    bg_val = row.iloc[region['bg_col']]
-                    row_data.append(float(bg_val) if not pd.isna(bg_val) else np.nan)
-
-                    row_data.append(region['name'])
-                    all_data.append(row_data)
+        regions_info = layout['regions']
+        if not regions_info:
+            print(f"  ❌ ERROR: No region blocks found in header row {layout['header_row']}")
+            return None
 
-                except (ValueError, IndexError):
-                    continue
+        for region in regions_info:
+            n_fits = len(region['fit_cols'])
+            print(f"  {region['name']}: B.E. at column {region['be_col']}, {n_fits} fit components")
+            if n_fits > len(XPS_FIT_COLUMNS):
+                print(f"  ⚠️  {region['name']}: only the first {len(XPS_FIT_COLUMNS)} components are kept")
 
-        df = pd.DataFrame(all_data, columns=output_columns)
+        df = extract_xps_regions(data_rows, regions_info)
         print(f"  Processed {len(df)} data points")
 
-        for region in ['O 1s', 'C 1s', 'Al 2p']:
-            region_df = df[df['Region'] == region]
-            if len(region_df) > 0:
-                be_min, be_max = region_df['B.E.'].min(), region_df['B.E.'].max()
-                print(f"    {region}: {len(region_df)} points, B.E. range {be_min:.1f} - {be_max:.1f} eV")
+        region_stats = df.groupby('Region', sort=False)['B.E.'].agg(['size', 'min', 'max'])
+        for region, (n_points, be_min, be_max) in region_stats.iterrows():
+            print(f"    {region}: {int(n_points)} points, B.E. range {be_min:.1f} - {be_max:.1f} eV")
+
+        if compact:
+            df = compact_dataframe(df, float_rtol=float_rtol)
 
         return df
 
@@ -214,51 +147,6 @@ def process_xps_file(filepath):
         return None
 
 
-def get_peak_color_by_position(be_position, region_name):
-    """
-    Assign consistent colors to peaks based on discrete binding energy ranges.
-    
-    Args:
-        be_position: Binding energy position of the peak
-        region_name: XPS region name (e.g., 'O 1s', 'C 1s', 'Al 2p')
-    
-    Returns:
-        Consistent color for peaks in the same chemical environment
-    """
-    viridis_cmap = plt.colormaps['viridis']
-    
-    # Define discrete color assignments for consistent peak identification
-    if region_name == 'O 1s':
-        if be_position < 530:
-            return viridis_cmap(0.2)  # Metal oxide oxygen (low BE)
-        elif be_position < 532:
-            return viridis_cmap(0.5)  # Bridging oxygen
-        else:
-            return viridis_cmap(0.8)  # Organic/hydroxyl oxygen (high BE)
-    
-    elif region_name == 'C 1s':
-        if be_position < 285:
-            return viridis_cmap(0.2)  # Aliphatic carbon (low BE)
-        elif be_position < 287:
-            return viridis_cmap(0.4)  # C-O carbon
-        elif be_position < 289:
-            return viridis_cmap(0.6)  # C=O carbon
-        else:
-            return viridis_cmap(0.8)  # COOH/carbonate carbon (high BE)
-    
-    elif region_name == 'Al 2p':
-        if be_position < 74:
-            return viridis_cmap(0.2)  # Metallic aluminum (low BE)
-        elif be_position < 76:
-            return viridis_cmap(0.5)  # Intermediate oxidation
-        else:
-            return viridis_cmap(0.8)  # Aluminum oxide (high BE)
-    
-    else:
-        # Default color for unknown regions
-        return viridis_cmap(0.5)
-
-
 def normalize_spectrum_preserving_ratios(raw_data, background_data, normalization_factor=None):
     """
     CORRECTED: Preserve quantitative relationships between raw data, envelope, and fitted peaks.
@@ -286,10 +174,155 @@ def normalize_spectrum_preserving_ratios(raw_data, background_data, normalizatio
     return corrected_data
 
 
-def plot_xps_publication_figure_improved(all_dataframes, save_plots=True):
+# Fit component colors by BE rank within a spectrum (1st = lowest BE)
+PEAK_RANK_COLORS = [
+    plt.colormaps['viridis'](0.05),   # 1st peak: Deep purple
+    plt.colormaps['viridis'](0.25),   # 2nd peak: Deep blue
+    plt.colormaps['viridis'](0.45),   # 3rd peak: Deep green
+    plt.colormaps['viridis'](0.65),   # 4th peak: Light green
+    plt.colormaps['viridis'](0.80),   # 5th peak: Light yellow-green
+    plt.colormaps['viridis'](0.95)    # 6th peak: Bright yellow
+]
+
+
+def normalized_components(spectrum, min_height=0.01):
+    """
+    Background-subtract and normalize raw, envelope and all fits in one pass.
+
+    Everything is divided by the maximum of the corrected raw data so the
+    relative intensities of the components are preserved.
+
+    Args:
+        spectrum: XPSSpectrum
+        min_height: Fits whose normalized maximum is below this are dropped
+
+    Returns:
+        dict with 'raw', 'envelope' (n_points,), 'fits' (n_kept, n_points),
+        'fit_index' (column index of each kept fit), 'peak_be' (BE of each
+        kept fit's maximum) and 'rank' (BE order of 'peak_be', 0 = lowest BE)
+    """
+    corrected = np.maximum(np.vstack([spectrum.raw, spectrum.envelope, spectrum.fits])
+                           - spectrum.background, 0)
+    raw_max = corrected[0].max()
+    corrected /= raw_max if raw_max > 0 else 1.0
+
+    fits = corrected[2:]
+    # NaN anywhere in a fit (unused column) makes its max NaN, which fails the test
+    keep = np.flatnonzero(fits.max(axis=1) > min_height)
+    fits = fits[keep]
+    peak_be = spectrum.be[np.argmax(fits, axis=1)]
+    rank = np.empty(len(keep), dtype=int)
+    rank[np.argsort(peak_be, kind='stable')] = np.arange(len(keep))
+
+    return {'raw': corrected[0], 'envelope': corrected[1], 'fits': fits,
+            'fit_index': keep, 'peak_be': peak_be, 'rank': rank}
+
+
+def draw_region_panel(ax, layers, state_index=None):
+    """
+    Draw stacked spectra of one region as collections instead of per-trace calls.
+
+    Fit components become one PolyCollection (lower-BE components in front,
+    matching the old per-fill z-order), envelopes and sample lines one
+    LineCollection, and data points one marker line.
+
+    Args:
+        ax: Matplotlib axes
+        layers: list of (y_offset, sample_color, XPSSpectrum) from bottom to top
+        state_index: ChemicalStateIndex to color fits by chemical state
+            (default: color by BE rank within each spectrum)
+    """
+    polygons, poly_keys, poly_colors, peak_bes = [], [], [], []
+    envelope_segments, sample_segments, sample_line_colors = [], [], []
+    marker_x, marker_y = [], []
+
+    for layer_idx, (y_offset, sample_color, spectrum) in enumerate(layers):
+        be_values = spectrum.be
+        components = normalized_components(spectrum)
+
+        # Closed outline of each fill: the fit curve, then back along the offset baseline
+        outline_x = np.concatenate([be_values, be_values[::-1]])
+        baseline = np.full(len(be_values), float(y_offset))
+        for fit, rank in zip(components['fits'], components['rank']):
+            polygons.append(np.column_stack([outline_x, np.concatenate([fit + y_offset, baseline])]))
+            poly_keys.append((-rank, layer_idx))
+            poly_colors.append(PEAK_RANK_COLORS[rank] if rank < len(PEAK_RANK_COLORS)
+                               else plt.colormaps['viridis'](0.5))
+        peak_bes.append(components['peak_be'])
+
+        raw_y = components['raw'] + y_offset
+        envelope_segments.append(np.column_stack([be_values, components['envelope'] + y_offset]))
+        sample_segments.append(np.column_stack([be_values, raw_y]))
+        sample_line_colors.append(sample_color)
+        marker_x.extend([be_values, [np.nan]])
+        marker_y.extend([raw_y, [np.nan]])
+
+    if polygons and state_index is not None:
+        # Every fit of every sample in the panel assigned in one lookup
+        poly_colors = list(state_index.colors(layers[0][2].region, np.concatenate(peak_bes)))
+
+    if polygons:
+        draw_order = sorted(range(len(polygons)), key=poly_keys.__getitem__)
+        ax.add_collection(PolyCollection([polygons[i] for i in draw_order],
+                                         facecolors=[poly_colors[i] for i in draw_order],
+                                         edgecolors='none', alpha=0.6, zorder=7))
+
+    if envelope_segments:
+        # Envelope line - more visible; sample-colored line connecting the points above it
+        ax.add_collection(LineCollection(
+            envelope_segments + sample_segments,
+            colors=[mcolors.to_rgba('red', 0.8)] * len(envelope_segments)
+            + [mcolors.to_rgba(c, 0.6) for c in sample_line_colors],
+            linewidths=[1.5] * len(envelope_segments) + [0.5] * len(sample_segments),
+            zorder=5))
+
+        # Plot ALL experimental data points with better visibility
+        ax.plot(np.concatenate(marker_x), np.concatenate(marker_y), 'o',
+                color='black', markersize=2.5,
+                alpha=0.9, markeredgecolor='black', markeredgewidth=0,
+                zorder=6, label='_nolegend_')
+
+
+# Monte Carlo replicas per region for fit uncertainties in the summary
+# (0 skips them; opt in with --mc-replicas, each replica refits every region)
+XPS_MC_REPLICAS = 0
+
+# Panel and legend color of each treatment suffix
+XPS_TREATMENT_COLORS = {
+    'AD': color_asdeposited,
+    'UV': color_uvtreated,
+    'H2O': viridis(0.5),
+    'UV_H2O': viridis(0.8),
+}
+
+# Bump when figure output changes in ways the hashed plotting code does not
+# show (shared styles, colors in config.py), so cached figures are re-rendered
+XPS_FIGURE_VERSION = 1
+
+
+def order_samples(sample_names):
+    """Sort ORGANIC_TREATMENT sample names by organic, then by treatment order"""
+    def sort_key(name):
+        organic, _, treatment = name.partition('_')
+        rank = (XPS_TREATMENT_ORDER.index(treatment) if treatment in XPS_TREATMENT_ORDER
+                else len(XPS_TREATMENT_ORDER))
+        return organic, rank, treatment
+    return sorted(sample_names, key=sort_key)
+
+
+def plot_xps_publication_figure_improved(all_dataframes, save_plots=True, sample_order=None,
+                                         sample_labels=None,
+                                         figure_name="XPS_publication_figure_final",
+                                         show=True, include_legend=True, color_by='rank'):
     """
     Create IMPROVED publication-quality XPS figure.
 
+    Accepts a dict of {sample_name: DataFrame} or an XPSDataset. Samples are
+    stacked in treatment order (AD, UV, H2O, UV_H2O) unless sample_order is
+    given; labels default to the treatment names. Fit components are colored
+    by BE rank within each spectrum (color_by='rank') or by chemical state
+    from the XPS_CHEMICAL_STATES table (color_by='state').
+
     IMPROVEMENTS:
     - Full page width (21cm for publication)
     - Fixed normalization (per-sample)
@@ -300,11 +333,15 @@ def plot_xps_publication_figure_improved(all_dataframes, save_plots=True):
     """
 
     # Use shared project styling (already set via set_plot_style())
+    dataset = XPSDataset.coerce(all_dataframes)
 
     # Sample information
-    sample_order = ['BTY_AD', 'BTY_UV', 'BTY_H2O']
-    sample_labels = ['As Deposited', 'UV Treated', 'Water Exposed']
+    if sample_order is None:
+        sample_order = order_samples(dataset.samples)
+    if sample_labels is None:
+        sample_labels = [XPS_TREATMENT_LABELS.get(name.partition('_')[2], name) for name in sample_order]
     regions = ['O 1s', 'C 1s', 'Al 2p']
+    state_index = chemical_state_index() if color_by == 'state' else None
     panel_labels = ['(a)', '(b)', '(c)']
 
     # Create compressed figure for display and processing
@@ -315,8 +352,10 @@ def plot_xps_publication_figure_improved(all_dataframes, save_plots=True):
     # Use project's viridis color scheme
     viridis_cmap = plt.colormaps['viridis']
     
-    # Sample colors using viridis scheme
-    sample_colors = [color_asdeposited, color_uvtreated, viridis(0.5)]  # As deposited, UV treated, Water
+    # Sample colors by treatment (as in the legend); unknown treatments get extra viridis shades
+    extra_colors = iter([viridis(v) for v in np.linspace(0.6, 0.95, len(sample_order))])
+    sample_colors = [XPS_TREATMENT_COLORS.get(name.partition('_')[2]) or next(extra_colors)
+                     for name in sample_order]
 
     # Clean spacing for publication
     offset_step = 1.5  # Clear separation between samples
@@ -325,140 +364,12 @@ def plot_xps_publication_figure_improved(all_dataframes, save_plots=True):
     for col_idx, region in enumerate(regions):
         ax = axes[col_idx]
 
-        # Process each sample independently
-        for sample_idx, sample_key in enumerate(sample_order):
-            if sample_key in all_dataframes:
-                df = all_dataframes[sample_key]
-                region_df = df[df['Region'] == region].sort_values('B.E.').copy()
-
-                if len(region_df) > 0:
-                    # Extract data
-                    be_values = region_df['B.E.'].values
-                    raw_data = region_df['raw'].values
-                    background_data = region_df['Background'].values
-                    envelope_data = region_df['Envelope'].values
-
-                    # CORRECTED: Calculate single normalization factor from raw data to preserve ratios
-                    corrected_raw = normalize_spectrum_preserving_ratios(raw_data, background_data)
-                    # Use max of corrected raw data as normalization factor
-                    norm_factor = np.max(corrected_raw) if np.max(corrected_raw) > 0 else 1.0
-                    
-                    # Apply same normalization to all components
-                    normalized_raw = corrected_raw / norm_factor
-                    normalized_envelope = normalize_spectrum_preserving_ratios(envelope_data, background_data, norm_factor)
-
-                    # Calculate offset
-                    y_offset = sample_idx * offset_step
-
-                    # Plot fit components with order-based colors for ALL regions for uniformity
-                    fit_plotted = False
-                    fit_peaks = []  # Store peak positions for ordering
-                    
-                    # First pass: collect all fit peaks and sort by binding energy
-                    for i, fit_col in enumerate(['fit1', 'fit2', 'fit3', 'fit4', 'fit5', 'fit6']):
-                        if region_df[fit_col].notna().any():
-                            fit_data = region_df[fit_col].values
-                            normalized_fit = normalize_spectrum_preserving_ratios(fit_data, background_data, norm_factor)
-                            if np.max(normalized_fit) > 0.01:  # Only include significant peaks
-                                max_idx = np.argmax(normalized_fit)
-                                peak_be = be_values[max_idx]
-                                fit_peaks.append((peak_be, i, fit_col, normalized_fit))
-                    
-                    # Sort by binding energy (lowest to highest) for all regions
-                    fit_peaks.sort(key=lambda x: x[0])
-                    
-                    # Simple fixed color scheme - 1st peak = color 1, 2nd peak = color 2, etc.
-                    viridis_cmap = plt.colormaps['viridis']
-                    peak_colors = [
-                        viridis_cmap(0.05),   # 1st peak: Deep purple
-                        viridis_cmap(0.25),   # 2nd peak: Deep blue  
-                        viridis_cmap(0.45),   # 3rd peak: Deep green
-                        viridis_cmap(0.65),   # 4th peak: Light green
-                        viridis_cmap(0.80),   # 5th peak: Light yellow-green
-                        viridis_cmap(0.95)    # 6th peak: Bright yellow
-                    ]
-                    
-                    # Second pass: plot with order-based colors
-                    for i, fit_col in enumerate(['fit1', 'fit2', 'fit3', 'fit4', 'fit5', 'fit6']):
-                        if region_df[fit_col].notna().any():
-                            fit_data = region_df[fit_col].values
-                            # Use same normalization factor to preserve relative intensities
-                            normalized_fit = normalize_spectrum_preserving_ratios(fit_data, background_data, norm_factor)
-                            
-                            # IMPROVED: More stringent validation for actual peaks
-                            # Check if this is a real peak vs. background/baseline artifact
-                            max_intensity = np.max(normalized_fit)
-                            mean_intensity = np.mean(normalized_fit)
-                            
-                            # Only plot if this looks like an actual peak:
-                            # 1. Peak height > 5% of normalized scale (was 1%)
-                            # 2. Peak is significantly above mean (not just baseline)
-                            # 3. Peak has reasonable width (not just a spike)
-                            peak_threshold = 0.05  # Increased from 0.01
-                            signal_to_noise = max_intensity / (mean_intensity + 1e-6)  # Avoid division by zero
-                            
-                            # Count significant data points above threshold
-                            significant_points = np.sum(normalized_fit > peak_threshold)
-                            min_peak_width = 3  # Minimum number of points for a valid peak
-                            
-                            # Always plot all fit components for consistent appearance
-                            if np.max(normalized_fit) > 0.01:  # Basic check for non-zero data
-                                
-                                fit_y = normalized_fit + y_offset
-                                
-                                # Find peak position for this fit component
-                                max_idx = np.argmax(normalized_fit)
-                                peak_be = be_values[max_idx]
-                                
-                                # Find this peak's order in the sorted list
-                                peak_order = next((idx for idx, (be, orig_i, col, _) in enumerate(fit_peaks) 
-                                                 if orig_i == i), 0)
-                                if peak_order < len(peak_colors):
-                                    peak_color = peak_colors[peak_order]
-                                else:
-                                    # Fallback for more than 6 peaks
-                                    peak_color = viridis_cmap(0.5)
-
-                                # Calculate z-order: higher BE (rightmost) peaks in front
-                                # Reverse the order so rightmost peaks have higher z-order
-                                base_zorder = 10
-                                fill_zorder = base_zorder - peak_order  # Higher BE = higher z-order
-                                line_zorder = fill_zorder + len(fit_peaks)  # Lines always above fills
-
-                                # Fill between baseline and fit curve (no edge lines for clean look)
-                                ax.fill_between(be_values, y_offset, fit_y,
-                                                color=peak_color, alpha=0.6,
-                                                edgecolor='none',
-                                                zorder=fill_zorder)
-                                fit_plotted = True
-                                
-                                # Debug output for problematic cases
-                                if region == 'C 1s' and sample_key == 'BTY_AD':
-                                    print(f"  DEBUG: {fit_col} - max: {max_intensity:.3f}, S/N: {signal_to_noise:.2f}, points: {significant_points}, BE: {peak_be:.1f}")
-                            else:
-                                # Debug output for rejected peaks
-                                if region == 'C 1s' and sample_key == 'BTY_AD':
-                                    print(f"  SKIPPED: {fit_col} - max: {max_intensity:.3f}, S/N: {signal_to_noise:.2f}, points: {significant_points} (below threshold)")
-
-                    # Envelope line - more visible
-                    envelope_y = normalized_envelope + y_offset
-                    ax.plot(be_values, envelope_y, '-',
-                            color='red', linewidth=1.5,
-                            alpha=0.8, zorder=4)
-
-                    # Plot ALL experimental data points with better visibility
-                    raw_y = normalized_raw + y_offset
-                    # Use larger markers with dark edges for better visibility
-                    ax.plot(be_values, raw_y, 'o',
-                            color='black', markersize=2.5,
-                            alpha=0.9, markeredgecolor='black', markeredgewidth=0,
-                            zorder=6, label='_nolegend_')  # Higher z-order to be on top
-                    # Add a colored line connecting the points for clarity
-                    ax.plot(be_values, raw_y, '-',
-                            color=sample_colors[sample_idx], linewidth=0.5,
-                            alpha=0.6, zorder=5)
-
-                    # Don't add labels here - we'll add them after all data is plotted
+        # Draw every sample in this region as one set of collections
+        layers = [(sample_idx * offset_step, sample_colors[sample_idx], dataset.get(sample_key, region))
+                  for sample_idx, sample_key in enumerate(sample_order)]
+        draw_region_panel(ax, [(y_offset, color, spectrum) for y_offset, color, spectrum in layers
+                               if spectrum is not None and len(spectrum) > 0],
+                          state_index=state_index)
 
         # Clean axis formatting
         ax.set_xlabel('Binding Energy (eV)', fontweight='bold')
@@ -474,28 +385,6 @@ def plot_xps_publication_figure_improved(all_dataframes, save_plots=True):
         # Remove y-tick labels for offset data
         ax.set_yticklabels([])
 
-        # Set tight axis limits based on actual peak data
-        all_be_values = []
-        all_intensities = []
-        
-        # Collect all data for this region
-        for sample_key in all_dataframes.keys():
-            df = all_dataframes[sample_key]
-            region_df = df[df['Region'] == region]
-            if len(region_df) > 0:
-                raw_data = region_df['raw'].values
-                background_data = region_df['Background'].values
-                corrected_data = normalize_spectrum_preserving_ratios(raw_data, background_data)
-                
-                # Only include points with significant intensity (>5% of max)
-                max_intensity = np.max(corrected_data)
-                significant_mask = corrected_data > (0.05 * max_intensity)
-                
-                if np.any(significant_mask):
-                    significant_be = region_df['B.E.'].values[significant_mask]
-                    all_be_values.extend(significant_be)
-                    all_intensities.extend(corrected_data[significant_mask])
-
         # Set specific x-axis limits for each region
         if region == 'O 1s':
             ax.set_xlim(536, 528)  # Inverted for XPS convention
@@ -514,7 +403,7 @@ def plot_xps_publication_figure_improved(all_dataframes, save_plots=True):
         
         # Add sample labels - centered in panels, raised by 1
         for sample_idx, (sample_key, sample_label) in enumerate(zip(sample_order, sample_labels)):
-            if sample_key in all_dataframes:
+            if sample_key in dataset:
                 y_position = sample_idx * offset_step + 1.2  # Lowered by 0.5 (was 1.7, now 1.2)
                 # Center labels horizontally within each panel using fixed ranges
                 if region == 'O 1s':
@@ -595,25 +484,31 @@ def plot_xps_publication_figure_improved(all_dataframes, save_plots=True):
         figures_dir = XPS_ROOT / "figures" / "final"
         figures_dir.mkdir(parents=True, exist_ok=True)
         
-        save_figure(fig, "XPS_publication_figure_final",
+        save_figure(fig, figure_name,
                     folder=str(figures_dir),
                     formats=("tiff", "pdf", "png"),
                     dpi=600)
-        save_for_latex(fig, "XPS_publication_figure_final")
+        save_for_latex(fig, figure_name)
         
         # Create separate legend figure
-        create_separate_legend(save_plots)
+        if include_legend:
+            create_separate_legend(save_plots)
 
     # Show plot without blocking script execution
-    plt.show(block=False)
-    plt.pause(0.1)  # Brief pause to ensure plot displays
+    if show:
+        plt.show(block=False)
+        plt.pause(0.1)  # Brief pause to ensure plot displays
     
     return fig, axes
 
 
-def create_separate_legend(save_plots=True):
+def create_separate_legend(save_plots=True, treatments=None):
     """
     Create a separate legend figure for the XPS plots.
+
+    Args:
+        save_plots: Save the legend next to the figures and for LaTeX
+        treatments: Treatment suffixes to list (default: XPS_TREATMENT_ORDER)
     """
     # Create small figure for legend only
     legend_fig, legend_ax = plt.subplots(figsize=(6, 3))
@@ -642,12 +537,9 @@ def create_separate_legend(save_plots=True):
                                         label=''))
     
     # Sample treatments
-    legend_elements.append(plt.Line2D([0], [0], color=color_asdeposited, linewidth=3,
-                                      label='As Deposited'))
-    legend_elements.append(plt.Line2D([0], [0], color=color_uvtreated, linewidth=3,
-                                      label='UV Treated'))
-    legend_elements.append(plt.Line2D([0], [0], color=viridis_cmap(0.5), linewidth=3,
-                                      label='Water Exposed'))
+    for treatment in treatments or XPS_TREATMENT_ORDER:
+        legend_elements.append(plt.Line2D([0], [0], color=XPS_TREATMENT_COLORS[treatment],
+                                          linewidth=3, label=XPS_TREATMENT_LABELS[treatment]))
     
     # Create legend
     legend_ax.legend(handles=legend_elements, loc='center', frameon=False,
@@ -668,45 +560,43 @@ def create_separate_legend(save_plots=True):
     return legend_fig
 
 
-def generate_summary_report(all_dataframes):
-    """Generate summary report - same as before"""
+def generate_summary_report(all_dataframes, n_replicas=0, counts_per_cps=None):
+    """
+    Generate summary report from a dict of sample frames or an XPSDataset.
+
+    Args:
+        all_dataframes: dict of {sample_name: DataFrame} or an XPSDataset
+        n_replicas: Poisson replicas per region for Monte Carlo confidence
+            intervals of the refitted components (0 skips them; runtime
+            grows linearly with the replica count)
+        counts_per_cps: dict of {region: counts per CPS} (dwell time x scans)
+            setting the counting noise of the replicas; the intervals are
+            skipped without it, since the exports are in CPS
+    """
     print("\n" + "=" * 60)
     print("GENERATING SUMMARY REPORT")
     print("=" * 60)
 
-    all_metrics = []
-
-    for sample_name, df in all_dataframes.items():
-        for region in df['Region'].unique():
-            region_df = df[df['Region'] == region]
-
-            if len(region_df) > 10:
-                be_values = region_df['B.E.'].values
-                raw_data = region_df['raw'].values
-                background_data = region_df['Background'].values
-
-                try:
-                    normalized_data = normalize_spectrum_preserving_ratios(raw_data, background_data)
-
-                    max_idx = np.argmax(normalized_data)
-                    peak_position = be_values[max_idx]
-                    peak_intensity = normalized_data[max_idx]
-                    peak_area = np.trapezoid(normalized_data, be_values)
-
-                    all_metrics.append({
-                        'Sample': sample_name,
-                        'Region': region,
-                        'Peak_Position_eV': peak_position,
-                        'Peak_Intensity': peak_intensity,
-                        'Peak_Area': abs(peak_area),
-                        'Data_Points': len(region_df)
-                    })
-
-                except Exception as e:
-                    print(f"Warning: Could not analyze {sample_name} {region}: {str(e)}")
+    # Background-corrected spectra stacked (NaN-padded) for one batched metrics pass
+    spectra = [spectrum for spectrum in XPSDataset.coerce(all_dataframes) if len(spectrum) > 10]
+    all_metrics = None
+    if spectra:
+        corrected = [normalize_spectrum_preserving_ratios(spectrum.raw, spectrum.background)
+                     for spectrum in spectra]
+        metrics = calculate_spectral_metrics_batch(pad_spectra([spectrum.be for spectrum in spectra]),
+                                                   pad_spectra(corrected))
+        all_metrics = pd.DataFrame({
+            'Sample': [spectrum.sample for spectrum in spectra],
+            'Region': [spectrum.region for spectrum in spectra],
+            'Peak_Position_eV': metrics['peak_position'],
+            'Peak_Intensity': metrics['peak_intensity'],
+            'Peak_Area': np.abs(metrics['peak_area']),
+            'FWHM_eV': metrics['fwhm'],
+            'Data_Points': [len(spectrum) for spectrum in spectra]
+        })
 
-    if all_metrics:
-        summary_df = pd.DataFrame(all_metrics)
+    if all_metrics is not None:
+        summary_df = all_metrics
 
         print("\nPeak Position Summary (eV):")
         print("-" * 40)
@@ -731,6 +621,26 @@ def generate_summary_report(all_dataframes):
         summary_df.to_csv(output_path, index=False)
         print(f"\n✓ Summary metrics saved to {output_path}")
 
+        if n_replicas > 0 and not counts_per_cps:
+            print("\n⚠️  No acquisition dwell time/scans available; skipping Monte Carlo uncertainties")
+        elif n_replicas > 0:
+            print(f"\nComponent uncertainties ({n_replicas} Poisson replicas, 95% CI):")
+            print("-" * 40)
+            print("Counting noise from dwell time x scans (counts per CPS): "
+                  + ", ".join(f"{region} {factor:.2f}" for region, factor in counts_per_cps.items()))
+            uncertainty = monte_carlo_uncertainty(all_dataframes, counts_per_cps,
+                                                  n_replicas=n_replicas,
+                                                  store=processed_dir / "xps_fits.p2r")
+            if not uncertainty.empty:
+                for quantity in ('Position_eV', 'Area_Fraction'):
+                    rows = uncertainty[uncertainty['Quantity'] == quantity]
+                    print(f"\n{quantity}:")
+                    print(rows.set_index(['Sample', 'Region', 'Component'])[
+                        ['Value', 'Std', 'CI_Low', 'CI_High']].round(4))
+                uncertainty_path = processed_dir / "xps_fit_uncertainty.csv"
+                uncertainty.to_csv(uncertainty_path, index=False)
+                print(f"\n✓ Monte Carlo uncertainties saved to {uncertainty_path}")
+
         return summary_df
     else:
         print("No valid metrics calculated")
@@ -757,8 +667,40 @@ def save_for_latex(fig, filename, include_pdf=True):
     print(f"✅ LaTeX figure saved: {filename}.tiff")
     return saved_files
 
+def figure_code_hash():
+    """Hash of the figure code and version, so edits to either re-render cached figures."""
+    functions = [plot_xps_publication_figure_improved, draw_region_panel, normalized_components,
+                 normalize_spectrum_preserving_ratios, order_samples, save_for_latex]
+    return hash_arguments(XPS_FIGURE_VERSION, [inspect.getsource(func) for func in functions],
+                          {key: mcolors.to_hex(color) for key, color in XPS_TREATMENT_COLORS.items()})
+
+
+def _plot_organic_task(task):
+    """Process-pool worker: render and save the figure for one organic."""
+    organic, frames, figure_name, data_hash, options = task
+    plt.switch_backend('Agg')
+    try:
+        fig, _ = plot_xps_publication_figure_improved(frames, save_plots=True,
+                                                      figure_name=figure_name,
+                                                      show=False, include_legend=False,
+                                                      **options)
+        plt.close(fig)
+        return figure_name, data_hash, None
+    except Exception as e:
+        return figure_name, data_hash, str(e)
+
+
 def main():
     """Main function for publication-quality XPS analysis"""
+    parser = argparse.ArgumentParser(description="Publication-quality XPS analysis")
+    parser.add_argument("--mc-replicas", type=int, default=XPS_MC_REPLICAS,
+                        help="Monte Carlo replicas per region for fit uncertainties (default: skip)")
+    parser.add_argument("--color-by", choices=['rank', 'state'], default='rank',
+                        help="Color fit components by BE rank or chemical state")
+    parser.add_argument("--force", action='store_true',
+                        help="Re-render every figure even if its data and code are unchanged")
+    args = parser.parse_args()
+
     print("XPS Analysis Script - PUBLICATION QUALITY")
     print("=" * 55)
     print("Publication-standard improvements:")
@@ -772,60 +714,57 @@ def main():
     print(f"\nRunning from: {Path.cwd()}")
     print(f"XPS root directory: {XPS_ROOT}")
 
-    # Check data directory - use processed directory with Excel files
-    data_dir = XPS_ROOT / "data" / "processed"
-    if not data_dir.exists():
-        print(f"✗ Data directory not found: {data_dir}")
-        return
-
-    print(f"✓ Data directory found: {data_dir}")
+    # Search order: processed exports, raw exports, then long-format workbooks here
+    search_dirs = [XPS_ROOT / "data" / "processed", XPS_ROOT / "data" / "raw", SCRIPT_DIR]
 
-    # Define expected files
-    input_filenames = ['BTY_AD.xlsx', 'BTY_UV.xlsx', 'BTY_H2O.xlsx']
-    input_files = [data_dir / filename for filename in input_filenames]
-
-    # Check files
-    existing_files = []
-    print("\n📁 Checking for data files:")
+    print("\n📁 Discovering XPS datasets:")
     print("-" * 40)
+    entries = discover_xps_datasets(search_dirs)
+    for entry in entries:
+        source = Path(entry['path']).name + (f"[{entry['sheet']}]" if entry['sheet'] else "")
+        print(f"✓ {entry['sample']}: {source}")
 
-    for filepath, filename in zip(input_files, input_filenames):
-        if filepath.exists():
-            existing_files.append(str(filepath))
-            print(f"✓ Found: {filename}")
-        else:
-            print(f"✗ Not found: {filename}")
-
-    if not existing_files:
+    if not entries:
         print("\n⚠️  No data files found!")
         return
 
-    print(f"\n🔄 Processing {len(existing_files)} files...")
-    
-    # Process files
-    all_dataframes = {}
-    for filepath in existing_files:
-        key = Path(filepath).stem
-        df = process_xps_file(filepath)
-        if df is not None:
-            all_dataframes[key] = df
+    print(f"\n🔄 Loading {len(entries)} datasets in parallel...")
+    all_dataframes = load_xps_samples(entries)
 
     if not all_dataframes:
         print("❌ No valid data could be processed")
         return
 
+    all_dataframes = {name: all_dataframes[name] for name in order_samples(all_dataframes)}
     print(f"\n✅ Successfully loaded {len(all_dataframes)} datasets")
 
+    # Element screen of every survey acquisition before looking at the fits;
+    # the same files give the counts per CPS for the fit uncertainties
+    counts_per_cps = {}
+    for vms_path in sorted((XPS_ROOT / "data" / "raw").glob("*.vms")):
+        for region, factor in VamasFile(vms_path).counts_per_cps().items():
+            counts_per_cps[region] = min(factor, counts_per_cps.get(region, factor))
+        print(f"\n🔎 Survey element screen: {vms_path.name}")
+        peaks, candidates = screen_vamas_surveys(vms_path)
+        if candidates is not None:
+            print(candidates.pivot_table(index='Survey', columns='Element', values='Score',
+                                         sort=False).round(2).fillna('-'))
+            screen_path = XPS_ROOT / "data" / "processed" / f"{vms_path.stem}_survey_screen.csv"
+            screen_path.parent.mkdir(parents=True, exist_ok=True)
+            candidates.to_csv(screen_path, index=False)
+            print(f"✓ Survey candidates saved to {screen_path}")
+
+    # Index every (sample, region) once for the summary and the figure
+    dataset = XPSDataset.from_frames(all_dataframes)
+
     # Show data summary
     print("\n📊 Data Summary:")
     print("-" * 40)
-    for sample_name, df in all_dataframes.items():
-        regions = df['Region'].unique()
+    for sample_name in dataset.samples:
         print(f"{sample_name}:")
-        for region in regions:
-            region_df = df[df['Region'] == region]
-            be_range = f"{region_df['B.E.'].min():.1f}-{region_df['B.E.'].max():.1f}"
-            print(f"  {region}: {len(region_df)} points, BE range: {be_range} eV")
+        for spectrum in dataset.spectra(sample_name):
+            be_range = f"{spectrum.be[0]:.1f}-{spectrum.be[-1]:.1f}"
+            print(f"  {spectrum.region}: {len(spectrum)} points, BE range: {be_range} eV")
 
     # Create directories using absolute paths
     figures_dir = XPS_ROOT / "figures" / "final"
@@ -833,18 +772,61 @@ def main():
     figures_dir.mkdir(parents=True, exist_ok=True)
     processed_dir.mkdir(parents=True, exist_ok=True)
 
-    # Create IMPROVED publication figure
-    print(f"\n🎨 Creating IMPROVED publication figure...")
-    try:
-        fig, axes = plot_xps_publication_figure_improved(all_dataframes, save_plots=True)
-        plt.show()
-        print("✅ IMPROVED publication figure created and saved!")
-        print("   📁 Saved to: 06_XPS_Analysis/figures/final/")
-        print("   🎯 Full page width, proper normalization, professional styling")
-    except Exception as e:
-        print(f"❌ Error creating figure: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    # One publication figure per organic, rendered in parallel
+    print(f"\n🎨 Creating publication figures per organic...")
+    manifest_path = figures_dir / "xps_figure_manifest.json"
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    # A figure is re-rendered when its data, the plotting code or the plot options change
+    options = {'color_by': args.color_by}
+    code_hash = figure_code_hash()
+    tasks = []
+    for organic in dict.fromkeys(name.partition('_')[0] for name in all_dataframes):
+        frames = {name: df for name, df in all_dataframes.items() if name.startswith(organic + "_")}
+        figure_name = f"{organic}_XPS_publication_figure_final"
+        data_hash = hash_arguments(frames, code_hash, options)
+        if (not args.force and manifest.get(figure_name) == data_hash
+                and (figures_dir / f"{figure_name}.pdf").exists()):
+            print(f"✓ {figure_name}: data and figure code unchanged, keeping existing figure")
+            continue
+        tasks.append((organic, frames, figure_name, data_hash, options))
+
+    for figure_name, data_hash, error in parallel_map(_plot_organic_task, tasks):
+        if error is None:
+            manifest[figure_name] = data_hash
+            print(f"✅ {figure_name} saved to 06_XPS_Analysis/figures/final/")
+        else:
+            print(f"❌ Error creating {figure_name}: {error}")
+    manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+    if tasks:
+        treatments = [t for t in XPS_TREATMENT_ORDER
+                      if any(name.partition('_')[2] == t for name in all_dataframes)]
+        legend_fig = create_separate_legend(save_plots=True, treatments=treatments)
+        plt.close(legend_fig)
+
+    # Combined summary across every organic and treatment
+    generate_summary_report(dataset, n_replicas=args.mc_replicas, counts_per_cps=counts_per_cps)
+
+    # Atomic composition from background-subtracted areas and RSFs
+    print(f"\n🧮 Quantifying atomic composition...")
+    components, composition = quantify_xps(dataset, counts_per_cps=counts_per_cps or 1.0)
+    if not composition.empty:
+        print(composition_matrix(composition).round(2))
+        print("\nComponent share of each region by chemical state (%):")
+        print(components.pivot_table(index='Sample', columns=['Region', 'Chemical_State'],
+                                     values='Region_%', aggfunc='sum', sort=False).round(1))
+        composition.to_csv(processed_dir / "xps_composition.csv", index=False)
+        components.to_csv(processed_dir / "xps_component_areas.csv", index=False)
+        print(f"✓ Composition tables saved to {processed_dir}")
+
+    # C 1s charge-referenced spectra on shared BE grids (sample x region x energy)
+    grid = resample_to_common_grid(dataset, shifts='C 1s', normalize='max')
+    grid_path = processed_dir / "xps_common_grid.p2r"
+    save_results(grid_path, arrays={'energy': grid['energy'], 'intensity': grid['intensity']},
+                 metadata={key: grid[key] for key in ('samples', 'regions', 'shifts')})
+    shift_text = ", ".join(f"{sample} {shift:+.2f} eV" for sample, shift in grid['shifts'].items())
+    print(f"✓ Charge-corrected grid ({shift_text}) saved to {grid_path}")
 
 
 if __name__ == "__main__":
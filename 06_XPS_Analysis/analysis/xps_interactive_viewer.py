@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Interactive XPS Fit Viewer
+==========================
+
+Bokeh server app for checking fits without regenerating the publication
+figure: toggle samples, regions and fit components, and inspect the fit
+residuals below the stacked spectra.
+
+Every (sample, region) is normalized once at startup with the same
+background subtraction as the publication figure. Interactions then only
+change renderer visibility and offsets, or send the ColumnDataSource
+columns that actually changed (e.g. switching between normalized and
+counts intensities leaves the B.E. column untouched).
+
+Usage:
+    python xps_interactive_viewer.py           # starts a server and opens the browser
+    bokeh serve --show xps_interactive_viewer.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent.parent
+sys.path.append(str(PROJECT_ROOT))
+sys.path.append(str(SCRIPT_DIR))
+
+try:
+    from bokeh.io import curdoc
+    from bokeh.layouts import column, row
+    from bokeh.models import (CheckboxGroup, ColumnDataSource, DataRange1d, Div, Dodge,
+                              HoverTool, RadioButtonGroup, Select, Span)
+    from bokeh.plotting import figure
+    BOKEH_AVAILABLE = True
+except ImportError:
+    BOKEH_AVAILABLE = False
+
+from matplotlib.colors import to_hex
+
+from xps_analysis import XPS_ROOT, PEAK_RANK_COLORS, normalized_components, order_samples
+from shared.utils.config import viridis
+from shared.utils.xps_utils import (XPSDataset, XPS_TREATMENT_LABELS, discover_xps_datasets,
+                                    load_xps_samples)
+
+VIEWER_REGIONS = ['O 1s', 'C 1s', 'Al 2p']
+VIEWER_SCALES = ['normalized', 'counts']
+VIEWER_LAYERS = ['Data', 'Envelope', 'Components', 'Residuals']
+OFFSET_STEP = 1.5  # In units of the tallest spectrum of the region
+
+
+def precompute_viewer_data(dataset, samples, regions):
+    """
+    Normalized and counts arrays of every (sample, region), computed once.
+
+    Fits are ordered by BE rank (fit0 = lowest BE) and padded with NaN
+    columns to the largest fit count, so every view has the same columns.
+
+    Args:
+        dataset: XPSDataset
+        samples: Sample names
+        regions: Region names
+
+    Returns:
+        (views, n_fits): views maps (sample, region) to
+        {'be': array, 'normalized': {column: array}, 'counts': {column: array},
+        'peak': {scale: tallest value}}; n_fits is the fit column count
+    """
+    views = {}
+    for sample in samples:
+        for region in regions:
+            spectrum = dataset.get(sample, region)
+            if spectrum is None or len(spectrum) == 0:
+                continue
+            components = normalized_components(spectrum)
+            fits = np.empty_like(components['fits'])
+            fits[components['rank']] = components['fits']
+            counts_scale = np.maximum(spectrum.raw - spectrum.background, 0).max()
+            counts_scale = counts_scale if counts_scale > 0 else 1.0
+
+            normalized = {'raw': components['raw'], 'envelope': components['envelope'],
+                          'residual': components['raw'] - components['envelope']}
+            normalized.update({f'fit{i}': fit for i, fit in enumerate(fits)})
+            views[sample, region] = {
+                'be': np.asarray(spectrum.be, dtype=np.float64),
+                'normalized': normalized,
+                'counts': {name: values * counts_scale for name, values in normalized.items()},
+            }
+
+    n_fits = max((sum(name.startswith('fit') for name in view['normalized'])
+                  for view in views.values()), default=0)
+    nan_columns = {}
+    for view in views.values():
+        n_points = len(view['be'])
+        if n_points not in nan_columns:
+            nan_columns[n_points] = np.full(n_points, np.nan)
+            nan_columns[n_points].flags.writeable = False
+        for scale in VIEWER_SCALES:
+            for i in range(n_fits):
+                # One shared NaN column per length, so absent fits are never resent
+                view[scale].setdefault(f'fit{i}', nan_columns[n_points])
+        view['peak'] = {scale: np.nanmax(view[scale]['raw']) for scale in VIEWER_SCALES}
+        view['zero'] = np.zeros(n_points)
+    return views, n_fits
+
+
+class XPSViewer:
+    """
+    Stacked-spectrum and residual plots with sample, region and layer controls.
+
+    Each sample has one ColumnDataSource; its columns are swapped in place
+    from the precomputed views, and only columns whose arrays differ from
+    the ones already shown are sent to the browser.
+    """
+
+    def __init__(self, dataset, samples=None, regions=None):
+        self.dataset = XPSDataset.coerce(dataset)
+        self.samples = samples or order_samples(self.dataset.samples)
+        available = {region for sample in self.samples for region in self.dataset.regions(sample)}
+        self.regions = [region for region in (regions or VIEWER_REGIONS) if region in available]
+        self.views, self.n_fits = precompute_viewer_data(self.dataset, self.samples, self.regions)
+        self.region = self.regions[0] if self.regions else None
+        self.scale = VIEWER_SCALES[0]
+        self._shown = [{} for _ in self.samples]
+        self._empty = {name: np.zeros(0) for name in
+                       ['x', 'zero', 'raw', 'envelope', 'residual']
+                       + [f'fit{i}' for i in range(self.n_fits)]}
+        self.n_columns_sent = 0
+
+        colors = [viridis(v) for v in np.linspace(0.1, 0.9, max(len(self.samples), 1))]
+        self.sample_colors = [to_hex(c) for c in colors]
+        self.fit_colors = [to_hex(PEAK_RANK_COLORS[min(i, len(PEAK_RANK_COLORS) - 1)])
+                           for i in range(self.n_fits)]
+
+        self.sources = [ColumnDataSource(data=self._columns(i)) for i in range(len(self.samples))]
+        self.dodges = [Dodge(value=0.0) for _ in self.samples]
+        self.renderers = {layer: [[] for _ in self.samples] for layer in VIEWER_LAYERS}
+        self.layout = self._build()
+        self._restack()
+
+    def _columns(self, index):
+        """Columns of one sample for the current region and scale (changed ones only)."""
+        view = self.views.get((self.samples[index], self.region))
+        wanted = self._empty if view is None else {'x': view['be'], 'zero': view['zero'],
+                                                   **view[self.scale]}
+        shown = self._shown[index]
+        changed = {name: values for name, values in wanted.items() if shown.get(name) is not values}
+        shown.update(changed)
+        return changed
+
+    def _build(self):
+        self.spectra_plot = figure(
+            width=900, height=600, tools="pan,wheel_zoom,box_zoom,reset,save",
+            x_range=DataRange1d(flipped=True, only_visible=True),
+            y_range=DataRange1d(only_visible=True),
+            x_axis_label="Binding Energy (eV)", y_axis_label="Intensity (A.U.)")
+        self.residual_plot = figure(
+            width=900, height=200, tools="pan,wheel_zoom,box_zoom,reset",
+            x_range=self.spectra_plot.x_range, y_range=DataRange1d(only_visible=True),
+            x_axis_label="Binding Energy (eV)", y_axis_label="Residual")
+        self.residual_plot.add_layout(Span(location=0, dimension='width',
+                                           line_color='gray', line_dash='dashed'))
+
+        for i, sample in enumerate(self.samples):
+            source, dodge = self.sources[i], self.dodges[i]
+            offset = lambda name: {'field': name, 'transform': dodge}
+            for j in range(self.n_fits):
+                self.renderers['Components'][i].append(self.spectra_plot.varea(
+                    x='x', y1=offset('zero'), y2=offset(f'fit{j}'), source=source,
+                    fill_color=self.fit_colors[j], fill_alpha=0.6))
+            self.renderers['Envelope'][i].append(self.spectra_plot.line(
+                x='x', y=offset('envelope'), source=source, line_color='red',
+                line_alpha=0.8, line_width=1.5))
+            data_line = self.spectra_plot.line(
+                x='x', y=offset('raw'), source=source, line_color=self.sample_colors[i],
+                line_alpha=0.6, line_width=0.5, name=sample)
+            self.renderers['Data'][i] += [data_line, self.spectra_plot.scatter(
+                x='x', y=offset('raw'), source=source, size=3, color='black', alpha=0.9)]
+            self.renderers['Residuals'][i].append(self.residual_plot.line(
+                x='x', y='residual', source=source, line_color=self.sample_colors[i],
+                line_width=1, name=sample))
+
+        self.spectra_plot.add_tools(HoverTool(
+            renderers=[r for renderers in self.renderers['Data'] for r in renderers[:1]],
+            tooltips=[("Sample", "$name"), ("B.E.", "@x{0.00} eV"), ("Raw", "@raw{0.000}"),
+                      ("Envelope", "@envelope{0.000}"), ("Residual", "@residual{0.000}")]))
+
+        self.region_select = Select(title="Region:", value=self.region or '',
+                                    options=self.regions)
+        self.scale_buttons = RadioButtonGroup(labels=['Normalized', 'Counts'], active=0)
+        treatment_of = lambda sample: XPS_TREATMENT_LABELS.get(sample.partition('_')[2], '')
+        self.sample_boxes = CheckboxGroup(labels=[f"{sample} ({treatment_of(sample)})"
+                                                  for sample in self.samples],
+                                          active=list(range(len(self.samples))))
+        self.layer_boxes = CheckboxGroup(labels=VIEWER_LAYERS, active=list(range(len(VIEWER_LAYERS))))
+        self.status = Div(text="", width=250)
+
+        self.region_select.on_change('value', lambda attr, old, new: self.set_region(new))
+        self.scale_buttons.on_change('active', lambda attr, old, new:
+                                     self.set_scale(VIEWER_SCALES[new]))
+        self.sample_boxes.on_change('active', lambda attr, old, new: self._restack())
+        self.layer_boxes.on_change('active', lambda attr, old, new: self._restack())
+
+        controls = column(self.region_select, Div(text="<b>Intensity</b>"), self.scale_buttons,
+                          Div(text="<b>Samples</b>"), self.sample_boxes,
+                          Div(text="<b>Layers</b>"), self.layer_boxes, self.status)
+        return row(column(self.spectra_plot, self.residual_plot), controls)
+
+    def _refresh_sources(self):
+        for i, source in enumerate(self.sources):
+            changed = self._columns(i)
+            if changed:
+                self.n_columns_sent += len(changed)
+                if len(changed) == len(source.data):
+                    source.data = changed
+                else:
+                    source.data.update(changed)
+
+    def _restack(self):
+        """Visibility and offsets only; no column data is sent."""
+        visible_samples = set(self.sample_boxes.active)
+        visible_layers = {VIEWER_LAYERS[i] for i in self.layer_boxes.active}
+        step = OFFSET_STEP * max((self.views[sample, self.region]['peak'][self.scale]
+                                  for sample in self.samples if (sample, self.region) in self.views),
+                                 default=1.0)
+        level = 0
+        for i, sample in enumerate(self.samples):
+            shown = i in visible_samples and (sample, self.region) in self.views
+            self.dodges[i].value = level * step
+            level += shown
+            for layer in VIEWER_LAYERS:
+                for renderer in self.renderers[layer][i]:
+                    renderer.visible = shown and layer in visible_layers
+        self.status.text = (f"<b>{self.region}</b>: {level} of {len(self.samples)} samples, "
+                            f"{self.n_columns_sent} columns sent")
+
+    def set_region(self, region):
+        self.region = region
+        self._refresh_sources()
+        self._restack()
+
+    def set_scale(self, scale):
+        self.scale = scale
+        self._refresh_sources()
+        self._restack()
+
+
+def load_viewer_dataset():
+    """Discover and load every sample the same way as xps_analysis.main."""
+    search_dirs = [XPS_ROOT / "data" / "processed", XPS_ROOT / "data" / "raw", SCRIPT_DIR]
+    entries = discover_xps_datasets(search_dirs)
+    if not entries:
+        print("⚠️  No XPS data files found")
+        return None
+    all_dataframes = load_xps_samples(entries)
+    if not all_dataframes:
+        print("❌ No valid data could be processed")
+        return None
+    return XPSDataset.from_frames(all_dataframes)
+
+
+def make_document(doc):
+    """Bokeh server entry point."""
+    dataset = load_viewer_dataset()
+    if dataset is None:
+        doc.add_root(Div(text="<b>No XPS data found</b>"))
+        return
+    viewer = XPSViewer(dataset)
+    doc.add_root(viewer.layout)
+    doc.title = "XPS Fit Viewer"
+
+
+def main():
+    """Start a local Bokeh server with the viewer and open it in the browser."""
+    if not BOKEH_AVAILABLE:
+        print("❌ Bokeh not available. Install with: pip install bokeh")
+        return
+
+    from bokeh.server.server import Server
+
+    server = Server({'/xps': make_document}, port=5006)
+    server.start()
+    print("✅ XPS viewer running at http://localhost:5006/xps (Ctrl+C to stop)")
+    server.io_loop.add_callback(server.show, "/xps")
+    server.io_loop.start()
+
+
+if __name__ == "__main__":
+    main()
+elif __name__.startswith('bokeh_app_') and BOKEH_AVAILABLE:
+    make_document(curdoc())
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for shared data-processing utilities.
+
+Each benchmark builds synthetic data shaped like our spectra, times the
+current implementation against the baseline it replaces, and prints a
+short table.
+
+Usage:
+    python shared/scripts/benchmarks.py            # run all benchmarks
+    python shared/scripts/benchmarks.py results_io # run one benchmark
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add project root to path for imports
+project_root = Path(__file__).parent.parent.parent
+sys.path.append(str(project_root))
+
+
+def best_time(func, repeat=5):
+    """Return the best wall-clock time of ``repeat`` calls to ``func`` (seconds)."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def print_row(label, baseline_s, new_s):
+    speedup = baseline_s / new_s if new_s > 0 else np.inf
+    print(f"  {label:<32} {baseline_s * 1e3:>10.2f} ms {new_s * 1e3:>10.2f} ms {speedup:>8.1f}x")
+
+
+def print_header(title, baseline_label, new_label):
+    print(f"\n{title}")
+    print("-" * 72)
+    print(f"  {'case':<32} {baseline_label:>13} {new_label:>13} {'speedup':>9}")
+
+
+def synthetic_spectra(n_spectra, n_points, seed=0):
+    """Gaussian peaks on a sloped background, on a shared binding-energy axis."""
+    rng = np.random.default_rng(seed)
+    axis = np.linspace(520.0, 550.0, n_points)
+    centers = rng.uniform(528, 536, size=(n_spectra, 1))
+    widths = rng.uniform(0.8, 1.6, size=(n_spectra, 1))
+    peaks = 5000 * np.exp(-0.5 * ((axis - centers) / widths) ** 2)
+    background = 800 + 10 * (axis - axis[0])
+    spectra = rng.poisson(peaks + background).astype(np.float64)
+    return axis, spectra
+
+
+def bench_results_io():
+    """
+    save_results/load_results versus pickle for spectral payloads.
+
+    Full saves and loads are I/O bound and land at or below pickle speed
+    (saves include the atomic rename); the container wins on partial and
+    memory-mapped reads.
+    """
+    from shared.scripts.data_loading import save_pickle, load_pickle, save_results, load_results
+
+    print_header("Results container vs pickle", "pickle", "save_results")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for n_spectra, n_points in [(10, 2000), (100, 4000), (500, 8000)]:
+            axis, spectra = synthetic_spectra(n_spectra, n_points)
+            summary = pd.DataFrame({
+                'Sample': [f"S{i}" for i in range(n_spectra)],
+                'Peak_Position_eV': axis[np.argmax(spectra, axis=1)],
+            })
+            payload = {'arrays': {'axis': axis, 'spectra': spectra},
+                       'metadata': {'n_spectra': n_spectra}, 'dataframes': {'summary': summary}}
+            pkl_path = tmp / 'payload.pkl'
+            res_path = tmp / 'payload.p2r'
+
+            label = f"{n_spectra} x {n_points}"
+            print_row(label + " save",
+                      best_time(lambda: save_pickle(payload, pkl_path)),
+                      best_time(lambda: save_results(res_path, **payload)))
+
+            pickle_load_s = best_time(lambda: load_pickle(pkl_path))
+            print_row(label + " load", pickle_load_s, best_time(lambda: load_results(res_path)))
+            print_row(label + " load one array (mmap)", pickle_load_s,
+                      best_time(lambda: load_results(res_path, arrays=['spectra'],
+                                                     dataframes=[], mmap=True)))
+
+
+def _block_peaks_pickled(args):
+    spectra, rows = args
+    return np.argmax(spectra[rows], axis=1)
+
+
+def _block_peaks_shared(rows, spectra):
+    return np.argmax(spectra[rows], axis=1)
+
+
+def bench_shared_memory():
+    """parallel_map with shared-memory arrays versus pickling the array per task."""
+    from concurrent.futures import ProcessPoolExecutor
+    from shared.utils.parallel import parallel_map
+
+    processes, n_tasks = 4, 32
+    print_header(f"Process-pool transfer, {processes} workers, {n_tasks} tasks",
+                 "pickled", "shared mem")
+    for n_spectra, n_points in [(64, 2000), (256, 8000), (512, 16000)]:
+        _, spectra = synthetic_spectra(n_spectra, n_points)
+        blocks = np.array_split(np.arange(n_spectra), n_tasks)
+
+        def run_pickled():
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                list(pool.map(_block_peaks_pickled, [(spectra, rows) for rows in blocks]))
+
+        def run_shared():
+            parallel_map(_block_peaks_shared, blocks, shared={'spectra': spectra},
+                         processes=processes)
+
+        label = f"{n_spectra} x {n_points} ({spectra.nbytes / 1e6:.0f} MB)"
+        print_row(label, best_time(run_pickled, repeat=3), best_time(run_shared, repeat=3))
+
+
+def synthetic_casaxps_frame(n_points=240, seed=0):
+    """
+    Header-less frame in the CasaXPS export layout of BTY_AD.xlsx: seven header
+    rows, then O 1s (cols 0-6), C 1s (cols 8-16) and Al 2p (cols 18-22) blocks.
+    """
+    rng = np.random.default_rng(seed)
+    layout = [
+        ('O 1s', 0, np.linspace(545.5, 525.5, n_points), [531.0, 532.0, 533.5], 1),
+        ('C 1s', 8, np.linspace(302.5, 278.5, n_points), [284.8, 286.3, 287.5, 289.0, 290.3], 1),
+        ('Al 2p', 18, np.linspace(88.5, 62.5, n_points), [74.6], 0),
+    ]
+    frame = np.full((7 + n_points, 23), None, dtype=object)
+    for name, col, be, centers, gap in layout:
+        n_fit = len(centers)
+        frame[6, col:col + n_fit + 4] = (['B.E.', f'{name}/CPS'] + [f'{name}/{name}'] * n_fit
+                                         + ['Background', 'Envelope'])
+        background = 500 + 5 * (be - be.min())
+        fits = [background + rng.uniform(500, 5000) * np.exp(-0.5 * ((be - c) / 0.8) ** 2)
+                for c in centers]
+        envelope = background + sum(f - background for f in fits)
+        raw = rng.poisson(envelope).astype(float)
+        block = np.column_stack([be, raw] + fits + [background, envelope])
+        frame[7:, col:col + n_fit + 4] = block
+    return pd.DataFrame(frame)
+
+
+def _legacy_extract_xps_regions(data_rows, regions_info):
+    """Row-by-row parser that process_xps_file used before vectorization."""
+    output_columns = ['B.E.', 'raw', 'fit1', 'fit2', 'fit3', 'fit4', 'fit5', 'fit6',
+                      'Envelope', 'Background', 'Region']
+    all_data = []
+    for idx, row in data_rows.iterrows():
+        for region in regions_info:
+            try:
+                be_value = row.iloc[region['be_col']]
+                if pd.isna(be_value):
+                    continue
+                be_float = float(be_value)
+                if region['name'] == 'O 1s' and not (520 <= be_float <= 550):
+                    continue
+                if region['name'] == 'C 1s' and not (270 <= be_float <= 310):
+                    continue
+                if region['name'] == 'Al 2p' and not (60 <= be_float <= 95):
+                    continue
+                row_data = [be_float]
+                raw_val = row.iloc[region['raw_col']]
+                row_data.append(float(raw_val) if not pd.isna(raw_val) else np.nan)
+                for i in range(6):
+                    if i < len(region['fit_cols']):
+                        fit_val = row.iloc[region['fit_cols'][i]]
+                        row_data.append(float(fit_val) if not pd.isna(fit_val) else np.nan)
+                    else:
+                        row_data.append(np.nan)
+                env_val = row.iloc[region['env_col']]
+                row_data.append(float(env_val) if not pd.isna(env_val) else np.nan)
+                bg_val = row.iloc[region['bg_col']]
+                row_data.append(float(bg_val) if not pd.isna(bg_val) else np.nan)
+                row_data.append(region['name'])
+                all_data.append(row_data)
+            except (ValueError, IndexError):
+                continue
+    return pd.DataFrame(all_data, columns=output_columns)
+
+
+SYNTHETIC_REGIONS_INFO = [
+    {'name': 'O 1s', 'be_col': 0, 'raw_col': 1, 'fit_cols': [2, 3, 4], 'bg_col': 5, 'env_col': 6},
+    {'name': 'C 1s', 'be_col': 8, 'raw_col': 9, 'fit_cols': [10, 11, 12, 13, 14],
+     'bg_col': 15, 'env_col': 16},
+    {'name': 'Al 2p', 'be_col': 18, 'raw_col': 19, 'fit_cols': [20], 'bg_col': 21, 'env_col': 22},
+]
+
+
+def bench_xps_parser():
+    """Vectorized extract_xps_regions versus the row-by-row loop on 100 workbooks."""
+    from shared.utils.xps_utils import extract_xps_regions
+
+    n_samples = 100
+    print_header(f"CasaXPS export parsing, {n_samples} synthetic workbooks", "iterrows", "vectorized")
+    for n_points in [240, 1000]:
+        frames = [synthetic_casaxps_frame(n_points, seed=i).iloc[7:] for i in range(n_samples)]
+
+        identical = all(
+            _legacy_extract_xps_regions(f, SYNTHETIC_REGIONS_INFO).equals(
+                extract_xps_regions(f, SYNTHETIC_REGIONS_INFO))
+            for f in frames[:5])
+
+        legacy_s = best_time(lambda: [_legacy_extract_xps_regions(f, SYNTHETIC_REGIONS_INFO)
+                                      for f in frames], repeat=1)
+        new_s = best_time(lambda: [extract_xps_regions(f, SYNTHETIC_REGIONS_INFO) for f in frames],
+                          repeat=3)
+        print_row(f"{n_points} points/region (identical={identical})", legacy_s, new_s)
+
+
+def _naive_shirley(x, y, n_avg=3, max_iter=50, tol=1e-6):
+    """Textbook Shirley: re-integrates the signal below every point, O(n^2) per iteration."""
+    low, high = y[:n_avg].mean(), y[-n_avg:].mean()
+    background = np.full_like(y, low)
+    for _ in range(max_iter):
+        signal = y - background
+        areas = np.array([np.trapezoid(signal[:i + 1], x[:i + 1]) for i in range(len(x))])
+        updated = low + (high - low) * areas / areas[-1]
+        converged = np.max(np.abs(updated - background)) <= tol * abs(high - low)
+        background = updated
+        if converged:
+            break
+    return background
+
+
+def _naive_tougaard(x, y, C=1643.0, n_avg=3):
+    """Point-by-point loss integral with the universal cross-section, O(n^2)."""
+    low, high = y[:n_avg].mean(), y[-n_avg:].mean()
+    signal = y - low
+    dx = x[1] - x[0]
+    loss = np.zeros_like(y)
+    for i in range(1, len(x)):
+        T = x[i] - x[:i]
+        loss[i] = np.sum(T / (C + T ** 2) ** 2 * signal[:i]) * dx
+    return low + (high - low) / loss[-1] * loss
+
+
+def bench_backgrounds():
+    """Stacked cumulative-sum Shirley/FFT Tougaard versus per-spectrum naive loops."""
+    from shared.utils.xps_utils import shirley_background, tougaard_background
+
+    print_header("XPS backgrounds on a common axis", "naive loop", "stacked")
+    for n_spectra, n_points in [(1, 500), (20, 500), (100, 1000)]:
+        axis, spectra = synthetic_spectra(n_spectra, n_points)
+        for name, naive, fast in [('Shirley', _naive_shirley, shirley_background),
+                                  ('Tougaard', _naive_tougaard, tougaard_background)]:
+            reference = np.array([naive(axis, y) for y in spectra])
+            deviation = np.max(np.abs(fast(axis, spectra) - reference))
+            naive_s = best_time(lambda: [naive(axis, y) for y in spectra], repeat=1)
+            fast_s = best_time(lambda: fast(axis, spectra))
+            print_row(f"{name} {n_spectra} x {n_points} (max diff {deviation:.1e})", naive_s, fast_s)
+
+
+def _loop_spectral_metrics(axis, intensities):
+    """Per-spectrum metrics with the thresholded FWHM used before batching."""
+    results = []
+    for y in intensities:
+        peak_idx = np.argmax(y)
+        area = np.trapezoid(y, axis)
+        above = np.where(y >= y[peak_idx] / 2)[0]
+        results.append((axis[peak_idx], y[peak_idx], area,
+                        axis[above[-1]] - axis[above[0]] if len(above) > 1 else np.nan,
+                        np.trapezoid(axis * y, axis) / area if area > 0 else np.nan))
+    return results
+
+
+def bench_spectral_metrics():
+    """Batched peak metrics with interpolated FWHM versus a per-spectrum loop."""
+    from shared.utils.xps_utils import calculate_spectral_metrics_batch
+
+    print_header("Spectral metrics on a common axis", "loop", "batched")
+    for n_spectra, n_points in [(9, 250), (200, 500), (2000, 1000)]:
+        axis, spectra = synthetic_spectra(n_spectra, n_points)
+        corrected = spectra - spectra[:, :1]
+        loop_s = best_time(lambda: _loop_spectral_metrics(axis, corrected))
+        batch_s = best_time(lambda: calculate_spectral_metrics_batch(axis, corrected))
+        print_row(f"{n_spectra} x {n_points}", loop_s, batch_s)
+
+
+def _legacy_region_panel(ax, layers):
+    """Per-trace drawing the XPS figure used before collections: two normalization
+    passes over the fits and one fill_between/plot call per trace."""
+    import matplotlib.pyplot as plt
+
+    viridis_cmap = plt.colormaps['viridis']
+    peak_colors = [viridis_cmap(v) for v in (0.05, 0.25, 0.45, 0.65, 0.80, 0.95)]
+    for y_offset, sample_color, spectrum in layers:
+        be, background = spectrum.be, spectrum.background
+        corrected_raw = np.maximum(spectrum.raw - background, 0)
+        norm = np.max(corrected_raw) if np.max(corrected_raw) > 0 else 1.0
+        fit_peaks = []
+        for i in range(len(spectrum.fits)):
+            normalized_fit = np.maximum(spectrum.fits[i] - background, 0) / norm
+            if np.max(normalized_fit) > 0.01:
+                fit_peaks.append((be[np.argmax(normalized_fit)], i))
+        fit_peaks.sort(key=lambda x: x[0])
+        for i in range(len(spectrum.fits)):
+            normalized_fit = np.maximum(spectrum.fits[i] - background, 0) / norm
+            if np.max(normalized_fit) > 0.01:
+                order = next((k for k, (_, orig_i) in enumerate(fit_peaks) if orig_i == i), 0)
+                ax.fill_between(be, y_offset, normalized_fit + y_offset, color=peak_colors[order],
+                                alpha=0.6, edgecolor='none', zorder=10 - order)
+        envelope = np.maximum(spectrum.envelope - background, 0) / norm
+        ax.plot(be, envelope + y_offset, '-', color='red', linewidth=1.5, alpha=0.8, zorder=4)
+        ax.plot(be, corrected_raw / norm + y_offset, 'o', color='black', markersize=2.5, zorder=6)
+        ax.plot(be, corrected_raw / norm + y_offset, '-', color=sample_color, linewidth=0.5,
+                alpha=0.6, zorder=5)
+
+
+def bench_xps_figure():
+    """Collection-based XPS figure panels versus one artist per trace (build + save)."""
+    import io
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from shared.utils.xps_utils import XPSDataset, extract_xps_regions
+
+    sys.path.append(str(project_root / "06_XPS_Analysis" / "analysis"))
+    from xps_analysis import draw_region_panel
+
+    print_header("XPS publication figure, 3 region panels", "per trace", "collections")
+    for n_samples in [3, 30]:
+        dataset = XPSDataset.from_frames({
+            f"S{i}": extract_xps_regions(synthetic_casaxps_frame(240, seed=i).iloc[7:],
+                                         SYNTHETIC_REGIONS_INFO)
+            for i in range(n_samples)})
+
+        def build_and_save(draw):
+            fig, axes = plt.subplots(1, 3, figsize=(9, 4))
+            for ax, region in zip(axes, ['O 1s', 'C 1s', 'Al 2p']):
+                draw(ax, [(1.5 * i, 'C0', dataset.get(sample, region))
+                          for i, sample in enumerate(dataset.samples)])
+                ax.set_ylim(-0.1, 1.5 * n_samples + 0.5)
+                ax.autoscale(axis='x')
+            fig.savefig(io.BytesIO(), format='png', dpi=300)
+            plt.close(fig)
+
+        print_row(f"{n_samples} samples",
+                  best_time(lambda: build_and_save(_legacy_region_panel), repeat=3),
+                  best_time(lambda: build_and_save(draw_region_panel), repeat=3))
+
+
+def _asdf_token(value, positive, negative):
+    digits = str(abs(int(value)))
+    return (negative if value < 0 else positive)[int(digits[0])] + digits[1:]
+
+
+def synthetic_jcamp(n_points, form='difdup', per_line=10, seed=0):
+    """
+    JCAMP-DX text of a smooth FTIR-like spectrum in AFFN or DIFDUP form.
+
+    DIFDUP lines start with an SQZ value, continue in DIF form with DUP runs,
+    and repeat their last value at the start of the next line (y-check).
+    """
+    rng = np.random.default_rng(seed)
+    x = np.linspace(600.0, 4000.0, n_points)
+    y = 1e8 * (np.exp(-((x - 1650) / 40) ** 2) + 0.5 * np.exp(-((x - 2950) / 60) ** 2))
+    y = np.round(y + rng.normal(0, 2e4, n_points)).astype(np.int64)
+    y[n_points // 3:n_points // 3 + 12] = y[n_points // 3]
+
+    header = ["##TITLE=synthetic", "##JCAMP-DX=5.01", "##DATATYPE=INFRARED SPECTRUM",
+              "##XUNITS=1/CM", "##YUNITS=ABSORBANCE", f"##FIRSTX={x[0]}", f"##LASTX={x[-1]}",
+              "##XFACTOR=1.0", "##YFACTOR=1.0E-09", f"##NPOINTS={n_points}",
+              "##XYDATA=(X++(Y..Y))"]
+    lines, start = [], 0
+    while start < n_points:
+        chunk = y[start:start + per_line]
+        prefix = f"{x[start]:.3f}"
+        if form == 'affn':
+            lines.append(prefix + ''.join(f" {v:d}" for v in chunk))
+            start += len(chunk)
+            continue
+        tokens = [_asdf_token(chunk[0], '@ABCDEFGHI', '@abcdefghi')]
+        steps = np.diff(chunk)
+        i = 0
+        while i < len(steps):
+            run = 1
+            while i + run < len(steps) and steps[i + run] == steps[i]:
+                run += 1
+            tokens.append(_asdf_token(steps[i], '%JKLMNOPQR', '%jklmnopqr'))
+            if run > 1:
+                tokens.append('STUVWXYZs'[int(str(run)[0]) - 1] + str(run)[1:])
+            i += run
+        lines.append(prefix + ''.join(tokens))
+        last_line = start + len(chunk) >= n_points
+        start += len(chunk) if last_line or len(chunk) == 1 else len(chunk) - 1
+    return '\n'.join(header + lines + ["##END="]) + '\n'
+
+
+def bench_jcamp():
+    """Native vectorized JCAMP-DX decoding versus the jcamp package's line parser."""
+    import jcamp
+    from shared.utils.jcamp_dx import read_jcamp
+
+    print_header("JCAMP-DX reading", "jcamp", "jcamp_dx")
+    with tempfile.TemporaryDirectory() as tmp:
+        for form in ['affn', 'difdup']:
+            for n_points in [1000, 7053, 65536]:
+                path = Path(tmp) / f"{form}_{n_points}.jdx"
+                path.write_text(synthetic_jcamp(n_points, form))
+                reference = jcamp.readfile(str(path))
+                native = read_jcamp(path, use_cache=False)
+                assert np.array_equal(reference['y'], native['y'])
+                print_row(f"{form.upper()} {n_points} points",
+                          best_time(lambda: jcamp.readfile(str(path)), repeat=3),
+                          best_time(lambda: read_jcamp(path, use_cache=False)))
+        read_jcamp(path)
+        print_row("DIFDUP 65536 points, cached",
+                  best_time(lambda: jcamp.readfile(str(path)), repeat=3),
+                  best_time(lambda: read_jcamp(path)))
+
+
+def synthetic_ftir(n_spectra, n_points, seed=0):
+    """Absorbance-like spectra: curved baselines, Gaussian bands and noise."""
+    rng = np.random.default_rng(seed)
+    wavenumbers = np.linspace(400.0, 4000.0, n_points)
+    scaled = (wavenumbers[None, :] - 2200.0) / 1800.0
+    background = (rng.uniform(0, 0.5, (n_spectra, 1)) + rng.uniform(-0.2, 0.2, (n_spectra, 1)) * scaled
+                  + rng.uniform(0, 0.3, (n_spectra, 1)) * scaled ** 2)
+    centers = rng.uniform(600, 3800, (n_spectra, 12, 1))
+    widths = rng.uniform(5, 40, (n_spectra, 12, 1))
+    heights = rng.uniform(0.05, 1.0, (n_spectra, 12, 1))
+    bands = (heights * np.exp(-0.5 * ((wavenumbers - centers) / widths) ** 2)).sum(axis=1)
+    return wavenumbers, background + bands + rng.normal(0, 0.005, (n_spectra, n_points))
+
+
+def bench_baselines():
+    """Batched ASLS baselines versus one pybaselines call per spectrum."""
+    import pybaselines
+    from shared.utils.baselines import PenalizedBaselines
+
+    print_header("Penalised least-squares baselines", "pybaselines", "batched")
+    cases = [('asls', 128, 7053, {'lam': 1e4, 'p': 0.01}),
+             ('asls', 512, 1024, {'lam': 1e4, 'p': 0.01}),
+             ('asls', 128, 7053, {'lam': 1e4, 'p': 0.01, 'max_iter': 0})]
+    for method, n_spectra, n_points, params in cases:
+        wavenumbers, spectra = synthetic_ftir(n_spectra, n_points)
+        lam = params['lam']
+        options = {k: v for k, v in params.items() if k != 'lam'}
+
+        def per_spectrum():
+            return np.vstack([getattr(pybaselines.Baseline(wavenumbers), method)(y, **params)[0]
+                              for y in spectra])
+
+        def batched():
+            return getattr(PenalizedBaselines(n_points, lam), method)(spectra, **options)[0]
+
+        reference, result = per_spectrum(), batched()
+        assert np.abs(reference - result).max() <= 1e-6 * np.abs(reference).max()
+        label = f"{method} {n_spectra}x{n_points}" + (" 1 solve" if 'max_iter' in params else "")
+        print_row(label, best_time(per_spectrum, repeat=3), best_time(batched, repeat=3))
+
+
+BENCHMARKS = {
+    'results_io': bench_results_io,
+    'shared_memory': bench_shared_memory,
+    'xps_parser': bench_xps_parser,
+    'backgrounds': bench_backgrounds,
+    'spectral_metrics': bench_spectral_metrics,
+    'xps_figure': bench_xps_figure,
+    'jcamp': bench_jcamp,
+    'baselines': bench_baselines,
+}
+
+
+def main(argv=None):
+    names = (argv if argv is not None else sys.argv[1:]) or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}")
+        print(f"Available: {', '.join(BENCHMARKS)}")
+        return 1
+    for name in names:
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,312 @@
+import json
+import os
+import tempfile
+
+import numpy as np
 import pandas as pd
 
-def load_csv(filepath):
+# Label columns that share a category order with shared/utils/config.py
+CATEGORICAL_ORDER_KEYS = {
+    'Organic': 'organics',
+    'Solvent': 'solvent_order',
+    'Inorganic': 'inorganics',
+    'Metal': 'inorganics',
+    'Region': 'xps_regions',
+}
+
+
+def memory_usage_mb(df):
+    """
+    Total memory footprint of a DataFrame in megabytes (including string contents).
+    Args:
+        df: pandas DataFrame
+    Returns:
+        float: Memory usage in MB
+    """
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def _category_orders():
+    """Look up the configured category orders for the known label columns."""
+    from shared.utils import config
+    return {col: getattr(config, key) for col, key in CATEGORICAL_ORDER_KEYS.items()
+            if hasattr(config, key)}
+
+
+def compact_dataframe(df, downcast_floats=True, categorical=True, float_rtol=0.0,
+                      float_columns=None, max_category_ratio=0.5, verbose=True):
+    """
+    Shrink a DataFrame by downcasting numeric columns and encoding label columns
+    as categoricals.
+
+    Float64 columns are converted to float32 only when every value survives the
+    round trip within ``float_rtol`` (by default exactly, e.g. whole numbers or
+    half-steps); columns named in ``float_columns`` are converted regardless,
+    keeping about 7 significant digits. Known label columns (Organic, Solvent,
+    Inorganic, Metal, Region) become ordered categoricals using the orders in
+    shared/utils/config.py when all of their values are in that order; other
+    string columns become plain categoricals when they have few distinct values.
+    Nullable extension floats and object columns that do not hold strings
+    (e.g. tz-aware timestamps) are left unchanged.
+
+    Args:
+        df: pandas DataFrame
+        downcast_floats: Downcast float64 columns to float32 where precision allows
+        categorical: Convert string label columns to categoricals
+        float_rtol: Relative tolerance for the float32 round trip
+        float_columns: Float columns to downcast to float32 without the check
+        max_category_ratio: Maximum unique/total ratio for generic string columns
+        verbose: Print memory usage before and after, and the columns left as they are
+    Returns:
+        Compacted copy of the DataFrame
+    """
+    before_mb = memory_usage_mb(df)
+    out = df.copy()
+    orders = _category_orders() if categorical else {}
+    float_columns = set(float_columns or ())
+    kept = []
+
+    for col in out.columns:
+        series = out[col]
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+
+        if downcast_floats and series.dtype == np.float64:
+            values = series.to_numpy()
+            as_f32 = values.astype(np.float32)
+            if col in float_columns or np.allclose(as_f32, values, rtol=float_rtol, atol=0.0,
+                                                   equal_nan=True):
+                out[col] = as_f32
+
+        elif pd.api.types.is_float_dtype(series):
+            if series.dtype != np.float32:
+                kept.append(col)
+
+        elif pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            out[col] = pd.to_numeric(series, downcast='integer')
+
+        elif categorical and (series.dtype == object or pd.api.types.is_string_dtype(series)):
+            if pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+                kept.append(col)
+                continue
+            observed = pd.unique(series.dropna())
+            order = orders.get(col)
+            if order is not None and set(observed) <= set(order):
+                out[col] = pd.Categorical(series, categories=order, ordered=True)
+            elif len(series) and len(observed) / len(series) <= max_category_ratio:
+                out[col] = series.astype('category')
+
+    if verbose:
+        after_mb = memory_usage_mb(out)
+        saved = 100 * (1 - after_mb / before_mb) if before_mb > 0 else 0.0
+        print(f"  Memory: {before_mb:.2f} MB -> {after_mb:.2f} MB ({saved:.0f}% smaller)")
+        if kept:
+            print(f"  ⚠️  Left unchanged (nullable or non-string values): {', '.join(map(str, kept))}")
+
+    return out
+
+
+def load_csv(filepath, compact=False, **compact_kwargs):
     """
     Load a CSV file into a pandas DataFrame.
     Args:
         filepath: Path to CSV file
+        compact: Downcast floats and encode label columns (see compact_dataframe)
+        **compact_kwargs: Options passed to compact_dataframe
     Returns:
         pandas DataFrame
     """
-    return pd.read_csv(filepath)
+    df = pd.read_csv(filepath)
+    return compact_dataframe(df, **compact_kwargs) if compact else df
 
-def load_excel(filepath, sheet_name=0):
+def iter_csv_chunks(filepath, columns=None, chunksize=100_000, dtype=np.float64,
+                    predicate=None, predicate_columns=None):
+    """
+    Stream a numeric CSV file as NumPy chunks without loading the whole file.
+
+    Only ``chunksize`` rows are held in memory at a time, so full-wafer line scans
+    and long time series can be reduced with RunningStats, StreamingHistogram or
+    Decimator one chunk at a time.
+
+    Args:
+        filepath: Path to CSV file
+        columns: Column names to read (default: all columns)
+        chunksize: Number of rows per chunk
+        dtype: NumPy dtype for the yielded arrays
+        predicate: Optional callable taking the chunk dict and returning a boolean
+            mask of rows to keep, e.g. ``lambda c: c['intensity'] > 0``
+        predicate_columns: Extra columns read only for the predicate and dropped
+            from the yielded chunk
+    Yields:
+        dict mapping column name to a 1-D NumPy array for each chunk
+    """
+    usecols = None
+    if columns is not None:
+        usecols = list(columns) + [c for c in (predicate_columns or []) if c not in columns]
+
+    reader = pd.read_csv(filepath, usecols=usecols, chunksize=chunksize)
+    with reader:
+        for frame in reader:
+            chunk = {col: frame[col].to_numpy(dtype=dtype) for col in frame.columns}
+
+            if predicate is not None:
+                mask = np.asarray(predicate(chunk), dtype=bool)
+                if not mask.any():
+                    continue
+                chunk = {col: values[mask] for col, values in chunk.items()}
+
+            if columns is not None:
+                chunk = {col: chunk[col] for col in columns}
+            yield chunk
+
+
+class RunningStats:
+    """
+    Running count, min, max, mean and standard deviation over streamed chunks.
+
+    Chunks are merged with Chan's parallel update, so the result matches a
+    single pass over the full column. NaN values are ignored.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        n = values.size
+        if n == 0:
+            return self
+
+        chunk_mean = values.mean()
+        chunk_m2 = np.sum((values - chunk_mean) ** 2)
+        total = self.count + n
+        delta = chunk_mean - self.mean
+
+        self.mean += delta * n / total
+        self._m2 += chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        return self
+
+    @property
+    def std(self):
+        return np.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def as_dict(self):
+        return {'count': self.count, 'min': self.min, 'max': self.max,
+                'mean': self.mean if self.count else np.nan, 'std': self.std}
+
+
+class StreamingHistogram:
+    """
+    Fixed-bin histogram accumulated over streamed chunks.
+
+    The bin edges must be known up front, e.g. from a RunningStats pass or
+    from the instrument range.
+    """
+
+    def __init__(self, bins, range):
+        self.counts, self.edges = np.histogram([], bins=bins, range=range)
+
+    def update(self, values):
+        counts, _ = np.histogram(values, bins=self.edges)
+        self.counts += counts
+        return self
+
+
+class Decimator:
+    """
+    Reduce a streamed signal by a fixed factor for plotting or export.
+
+    Leftover samples that do not fill a whole block are carried into the next
+    chunk, so the output does not depend on the chunk size.
+
+    Args:
+        factor: Number of input samples per output block
+        method: 'mean' (block average), 'stride' (every n-th sample) or
+            'minmax' (block min and max, keeps peaks visible in plots)
+    """
+
+    def __init__(self, factor, method='mean'):
+        if factor < 1:
+            raise ValueError("factor must be >= 1")
+        if method not in ('mean', 'stride', 'minmax'):
+            raise ValueError(f"Unknown decimation method: {method}")
+        self.factor = int(factor)
+        self.method = method
+        self._carry = np.empty(0)
+        self._parts = []
+
+    def _reduce(self, blocks):
+        if self.method == 'mean':
+            return blocks.mean(axis=1)
+        if self.method == 'stride':
+            return blocks[:, 0]
+        return np.column_stack([blocks.min(axis=1), blocks.max(axis=1)]).ravel()
+
+    def update(self, values):
+        values = np.concatenate([self._carry, np.asarray(values, dtype=np.float64)])
+        n_full = values.size // self.factor * self.factor
+        if n_full:
+            self._parts.append(self._reduce(values[:n_full].reshape(-1, self.factor)))
+        self._carry = values[n_full:]
+        return self
+
+    def result(self):
+        """Return the decimated signal, including a final partial block."""
+        parts = list(self._parts)
+        if self._carry.size:
+            parts.append(self._reduce(self._carry.reshape(1, -1)))
+        return np.concatenate(parts) if parts else np.empty(0)
+
+
+def aggregate_csv(filepath, aggregators, chunksize=100_000, predicate=None,
+                  predicate_columns=None):
+    """
+    Feed streamed CSV columns into incremental aggregators.
+
+    Args:
+        filepath: Path to CSV file
+        aggregators: dict mapping column name to an aggregator (or list of
+            aggregators) with an ``update(values)`` method
+        chunksize: Number of rows per chunk
+        predicate: Optional row filter (see iter_csv_chunks)
+        predicate_columns: Extra columns needed only by the predicate
+    Returns:
+        The aggregators dict, updated in place
+    """
+    for chunk in iter_csv_chunks(filepath, columns=list(aggregators), chunksize=chunksize,
+                                 predicate=predicate, predicate_columns=predicate_columns):
+        for col, aggs in aggregators.items():
+            for agg in (aggs if isinstance(aggs, (list, tuple)) else [aggs]):
+                agg.update(chunk[col])
+    return aggregators
+
+def load_excel(filepath, sheet_name=0, compact=False, **compact_kwargs):
     """
     Load an Excel file into a pandas DataFrame.
     Args:
         filepath: Path to Excel file
         sheet_name: Sheet name or index (default is first sheet)
+        compact: Downcast floats and encode label columns (see compact_dataframe)
+        **compact_kwargs: Options passed to compact_dataframe
     Returns:
         pandas DataFrame
     """
-    return pd.read_excel(filepath, sheet_name=sheet_name)
+    df = pd.read_excel(filepath, sheet_name=sheet_name)
+    return compact_dataframe(df, **compact_kwargs) if compact else df
 
 def load_pickle(filepath):
     """
     Load a pickle file (for serialized Python objects like dicts, DataFrames).
+    Only load pickles you created yourself; prefer load_results for analysis output.
     Args:
         filepath: Path to pickle file
     Returns:
@@ -43,3 +326,237 @@ def save_pickle(obj, filepath):
     import pickle
     with open(filepath, 'wb') as f:
         pickle.dump(obj, f)
+
+
+# --- Analysis results container -------------------------------------------------
+#
+# Layout: 8-byte magic, little-endian uint64 header length, UTF-8 JSON header,
+# then raw array buffers, each aligned to RESULTS_ALIGNMENT bytes. The header
+# records schema version, metadata and dtype/shape/offset of every array, so a
+# single array can be read (or memory-mapped) without touching the others, and
+# nothing in the file is ever executed on load.
+#
+# Full saves and loads are I/O bound and run at about pickle speed (saves are
+# somewhat slower because the file is written beside the target and renamed
+# into place); the speedup is in partial and memory-mapped reads, whose cost
+# does not grow with the arrays left untouched.
+
+RESULTS_MAGIC = b'P2RESLT\x00'
+RESULTS_SCHEMA_VERSION = 1
+RESULTS_ALIGNMENT = 64
+
+
+def _json_default(obj):
+    """Convert NumPy scalars and paths in metadata to plain JSON values."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, os.PathLike):
+        return os.fspath(obj)
+    raise TypeError(f"Metadata value of type {type(obj).__name__} is not JSON serializable")
+
+
+def _encode_column(name, series):
+    """Split a DataFrame column into a plain array plus JSON-able column info."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), {
+            'kind': 'categorical',
+            'categories': series.cat.categories.tolist(),
+            'ordered': bool(series.cat.ordered),
+        }
+
+    values = series.to_numpy()
+    if values.dtype == object or pd.api.types.is_string_dtype(series):
+        if pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+            raise TypeError(f"Column '{name}' holds non-string objects and cannot be stored "
+                            f"safely; convert it to a numeric, string or categorical dtype")
+        codes, uniques = pd.factorize(series)
+        return codes, {'kind': 'string', 'categories': [str(u) for u in uniques]}
+
+    return values, {'kind': 'array'}
+
+
+def _decode_column(values, info):
+    """Rebuild a DataFrame column from its stored array and column info."""
+    if info['kind'] == 'categorical':
+        return pd.Categorical.from_codes(values, categories=info['categories'],
+                                         ordered=info['ordered'])
+    if info['kind'] == 'string':
+        categories = np.array(info['categories'] + [None], dtype=object)
+        return categories[values]
+    return values
+
+
+def save_results(filepath, arrays=None, metadata=None, dataframes=None):
+    """
+    Save analysis results (NumPy arrays, JSON metadata, DataFrames) to a single
+    versioned container file.
+
+    The file is written to a temporary name and renamed into place, so readers
+    on shared drives never see a partial file. Saving costs about as much as
+    pickle; use the container where results are read back in parts (single
+    arrays or memory-mapped), or must be loaded safely from shared drives.
+
+    Args:
+        filepath: Path to output file (conventionally ``.p2r``)
+        arrays: dict of {name: numpy array}; object arrays are not allowed
+        metadata: JSON-serializable dict (NumPy scalars are converted)
+        dataframes: dict of {name: DataFrame}; string columns are stored as codes,
+            other object columns and duplicate column names raise
+    """
+    arrays = dict(arrays or {})
+    dataframes = dict(dataframes or {})
+
+    buffers = {}
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        if array.dtype.hasobject:
+            raise TypeError(f"Array '{name}' has object dtype and cannot be stored safely")
+        buffers[name] = array
+
+    frames_info = {}
+    for frame_name, df in dataframes.items():
+        columns = []
+        has_index = not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1
+        source = df.reset_index() if has_index else df
+        duplicated = source.columns[source.columns.duplicated()].tolist()
+        if duplicated:
+            raise ValueError(f"DataFrame '{frame_name}' has duplicate column names: {duplicated}")
+        for i, col in enumerate(source.columns):
+            values, info = _encode_column(col, source[col])
+            key = f"__df__/{frame_name}/{i}"
+            buffers[key] = values
+            info.update({'name': col, 'array': key})
+            columns.append(info)
+        frames_info[frame_name] = {
+            'columns': columns,
+            'index_names': list(df.index.names) if has_index else None,
+        }
+
+    entries = {}
+    offset = 0
+    for name, array in buffers.items():
+        if not array.flags.c_contiguous:
+            array = np.ascontiguousarray(array)
+            buffers[name] = array
+        entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape),
+                         'offset': offset, 'nbytes': array.nbytes}
+        offset += -(-array.nbytes // RESULTS_ALIGNMENT) * RESULTS_ALIGNMENT
+
+    header = {
+        'schema_version': RESULTS_SCHEMA_VERSION,
+        'metadata': metadata or {},
+        'arrays': {name: entries[name] for name in arrays},
+        'dataframes': frames_info,
+        'dataframe_arrays': {name: entry for name, entry in entries.items() if name not in arrays},
+    }
+    header_bytes = json.dumps(header, default=_json_default).encode('utf-8')
+    data_start = len(RESULTS_MAGIC) + 8 + len(header_bytes)
+    padding = -data_start % RESULTS_ALIGNMENT
+
+    # Unique temp file per writer, so threads of one process never share it
+    directory, filename = os.path.split(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{filename}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(RESULTS_MAGIC)
+            f.write(len(header_bytes).to_bytes(8, 'little'))
+            f.write(header_bytes)
+            f.write(b'\x00' * padding)
+            for name, array in buffers.items():
+                f.seek(data_start + padding + entries[name]['offset'])
+                f.write(array.data)
+            f.truncate(data_start + padding + offset)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_results_header(filepath):
+    """
+    Read only the JSON header of a results file.
+    Args:
+        filepath: Path to results file
+    Returns:
+        dict with 'schema_version', 'metadata', 'arrays', 'dataframes' and
+        the byte position where array data starts ('data_start')
+    """
+    with open(filepath, 'rb') as f:
+        magic = f.read(len(RESULTS_MAGIC))
+        if magic != RESULTS_MAGIC:
+            raise ValueError(f"Not an analysis results file: {filepath}")
+        header_len = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(header_len).decode('utf-8'))
+
+    version = header.get('schema_version')
+    if version is None or version > RESULTS_SCHEMA_VERSION:
+        raise ValueError(f"Unsupported results schema version {version} in {filepath} "
+                         f"(this code reads up to {RESULTS_SCHEMA_VERSION})")
+
+    data_start = len(RESULTS_MAGIC) + 8 + header_len
+    header['data_start'] = data_start + (-data_start % RESULTS_ALIGNMENT)
+    return header
+
+
+def _read_array(f, filepath, entry, data_start, mmap):
+    dtype = np.dtype(entry['dtype'])
+    shape = tuple(entry['shape'])
+    position = data_start + entry['offset']
+    if mmap and entry['nbytes'] > 0:
+        return np.memmap(filepath, dtype=dtype, mode='r', offset=position, shape=shape)
+    array = np.empty(shape, dtype=dtype)
+    if array.size:
+        f.seek(position)
+        f.readinto(memoryview(array.reshape(-1)).cast('B'))
+    return array
+
+
+def load_results(filepath, arrays=None, dataframes=None, mmap=False):
+    """
+    Load analysis results saved with save_results.
+
+    Loading everything costs about as much as pickle; selecting arrays or
+    DataFrames reads only those, and ``mmap=True`` maps arrays without
+    reading them.
+
+    Args:
+        filepath: Path to results file
+        arrays: Names of arrays to load (default: all; [] loads none)
+        dataframes: Names of DataFrames to load (default: all; [] loads none)
+        mmap: Memory-map arrays read-only instead of reading them into memory
+    Returns:
+        dict with 'metadata', 'arrays' and 'dataframes'
+    """
+    header = load_results_header(filepath)
+    data_start = header['data_start']
+    array_names = list(header['arrays']) if arrays is None else list(arrays)
+    frame_names = list(header['dataframes']) if dataframes is None else list(dataframes)
+
+    missing = [n for n in array_names if n not in header['arrays']]
+    missing += [n for n in frame_names if n not in header['dataframes']]
+    if missing:
+        raise KeyError(f"Not found in {filepath}: {missing}")
+
+    result = {'metadata': header['metadata'], 'arrays': {}, 'dataframes': {}}
+    with open(filepath, 'rb') as f:
+        for name in array_names:
+            result['arrays'][name] = _read_array(f, filepath, header['arrays'][name], data_start, mmap)
+
+        for name in frame_names:
+            info = header['dataframes'][name]
+            data = {}
+            for col in info['columns']:
+                entry = header['dataframe_arrays'][col['array']]
+                values = _read_array(f, filepath, entry, data_start, mmap)
+                data[col['name']] = _decode_column(values, col)
+            df = pd.DataFrame(data, columns=[col['name'] for col in info['columns']])
+            if info['index_names'] is not None:
+                n_index = len(info['index_names'])
+                df = df.set_index(list(df.columns[:n_index]))
+                df.index.names = info['index_names']
+            result['dataframes'][name] = df
+
+    return result
@@ -53,7 +53,7 @@ class LaTeXIntegrator:
             "05_FTIR_Analysis/figures/final/Fig3b_FTIR_Subpanels.pdf": "Figures/Fig3b_FTIR_Subpanels.pdf",
             
             # XPS analysis - need to map from new analysis
-            "06_XPS_Analysis/figures/final/XPS_publication_figure_final.pdf": "Figures/BTY_XPS_Final_Publication.pdf",
+            "06_XPS_Analysis/figures/final/BTY_XPS_publication_figure_final.pdf": "Figures/BTY_XPS_Final_Publication.pdf",
             
             # E-beam studies
             "figures/final/dose_matrix_mockup_clean.pdf": "Figures/dose_matrix_mockup_clean.pdf",
@@ -15,6 +15,7 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
 from shared.scripts.latex_integration import LaTeXIntegrator
+from shared.utils.config import organics
 
 def update_xps_figures():
     """Update XPS figure mappings and sync to LaTeX."""
@@ -36,9 +37,11 @@ def update_xps_figures():
     # Update figure mapping for XPS analysis
     xps_updates = {}
     
-    # Map the main XPS publication figure
-    if (xps_figures_dir / "XPS_publication_figure_final.pdf").exists():
-        xps_updates["XPS_publication_figure_final.pdf"] = "BTY_XPS_Final_Publication.pdf"
+    # Per-organic figures written by xps_analysis.py (ORGANIC_XPS_publication_figure_final.pdf)
+    for organic in organics:
+        source = f"{organic}_XPS_publication_figure_final.pdf"
+        if (xps_figures_dir / source).exists():
+            xps_updates[source] = f"{organic}_XPS_Final_Publication.pdf"
     
     # Look for THB XPS figure
     thb_candidates = [
@@ -48,6 +51,8 @@ def update_xps_figures():
     ]
     
     for candidate in thb_candidates:
+        if "THB_XPS_Final_Publication.pdf" in xps_updates.values():
+            break
         if (xps_figures_dir / candidate).exists():
             xps_updates[candidate] = "THB_XPS_Final_Publication.pdf"
             break
@@ -14,9 +14,56 @@ from .xps_utils import (
     background_subtract_normalize,
     get_xps_colors,
     calculate_spectral_metrics,
-    export_spectral_data
+    calculate_spectral_metrics_batch,
+    pad_spectra,
+    export_spectral_data,
+    extract_xps_regions,
+    detect_casaxps_layout,
+    read_casaxps_export,
+    charge_correction_shifts,
+    resample_to_common_grid,
+    difference_spectra,
+    discover_xps_datasets,
+    load_xps_samples,
+    XPSDataset,
+    XPSSpectrum,
+    VamasFile,
+    XPS_TREATMENT_LABELS,
+    XPS_TREATMENT_ORDER,
+    shirley_background,
+    tougaard_background,
+    linear_background,
+    fit_xps_region,
+    fit_xps_dataset
 )
 
+# XPS quantification
+from .xps_quantification import XPS_RSF, quantify_xps, composition_matrix, load_rsf_table
+
+# XPS chemical-state assignment
+from .xps_chemical_states import XPS_CHEMICAL_STATES, ChemicalStateIndex, chemical_state_index
+
+# XPS fit-result store
+from .xps_fit_store import XPSFitStore
+
+# XPS Monte Carlo fit uncertainties
+from .xps_monte_carlo import monte_carlo_uncertainty
+
+# XPS survey screening
+from .xps_survey import survey_reference_table, identify_survey_elements, screen_vamas_surveys
+
+# JCAMP-DX reading
+from .jcamp_dx import JCAMPSpectrum, parse_jcamp, read_jcamp
+
+# Cached and batched baseline correction
+from .baselines import BaselineCache, baseline_cache, cached_baseline, PenalizedBaselines, batch_baselines
+
+# Parallel processing helpers
+from .parallel import SharedArray, publish_arrays, parallel_map
+
+# Disk-backed memoization
+from .cache import disk_cache, hash_arguments, set_cache_enabled, cache_disabled
+
 __all__ = [
     # Existing utilities
     'set_plot_style',
@@ -30,5 +77,61 @@ __all__ = [
     'background_subtract_normalize',
     'get_xps_colors',
     'calculate_spectral_metrics',
-    'export_spectral_data'
+    'calculate_spectral_metrics_batch',
+    'pad_spectra',
+    'export_spectral_data',
+    'extract_xps_regions',
+    'detect_casaxps_layout',
+    'read_casaxps_export',
+    'charge_correction_shifts',
+    'resample_to_common_grid',
+    'difference_spectra',
+    'discover_xps_datasets',
+    'load_xps_samples',
+    'XPSDataset',
+    'XPSSpectrum',
+    'VamasFile',
+    'XPS_TREATMENT_LABELS',
+    'XPS_TREATMENT_ORDER',
+    'shirley_background',
+    'tougaard_background',
+    'linear_background',
+    'fit_xps_region',
+    'fit_xps_dataset',
+    # XPS quantification
+    'XPS_RSF',
+    'quantify_xps',
+    'composition_matrix',
+    'load_rsf_table',
+    # XPS fit-result store
+    'XPSFitStore',
+    # XPS chemical-state assignment
+    'XPS_CHEMICAL_STATES',
+    'ChemicalStateIndex',
+    'chemical_state_index',
+    # XPS Monte Carlo fit uncertainties
+    'monte_carlo_uncertainty',
+    # XPS survey screening
+    'survey_reference_table',
+    'identify_survey_elements',
+    'screen_vamas_surveys',
+    # JCAMP-DX reading
+    'JCAMPSpectrum',
+    'parse_jcamp',
+    'read_jcamp',
+    # Cached and batched baseline correction
+    'BaselineCache',
+    'baseline_cache',
+    'cached_baseline',
+    'PenalizedBaselines',
+    'batch_baselines',
+    # Parallel processing
+    'SharedArray',
+    'publish_arrays',
+    'parallel_map',
+    # Caching
+    'disk_cache',
+    'hash_arguments',
+    'set_cache_enabled',
+    'cache_disabled'
 ]
\ No newline at end of file
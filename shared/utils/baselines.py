@@ -0,0 +1,392 @@
+# shared/utils/baselines.py
+"""
+Cached and batched FTIR baseline correction.
+
+Baselines are keyed by the content of the spectrum (wavenumbers and
+intensities), the method and its resolved parameters, and kept in two
+levels: an in-memory LRU for repeated calls in one process (Streamlit
+reruns, slider moves) and a DiskCache shared between the CLI, the web apps
+and notebooks. Parameters irrelevant to a method are dropped before hashing,
+so ``als`` with and without an ``order`` argument share one entry.
+
+Spectra on a common wavenumber grid can also be corrected together with
+batch_baselines: ASLS builds the difference penalty once per grid and
+lambda, shares one banded Cholesky factorization for the first (unweighted)
+iteration and updates the weights of all spectra in vectorized steps. The
+gain is modest (about 1.1-1.2x, 2-3x for a single solve), so the FTIR
+analysers keep one cached baseline per file, which parallelises over files.
+
+Usage:
+    from shared.utils.baselines import cached_baseline, baseline_cache, batch_baselines
+
+    baseline = cached_baseline(wavenumbers, intensities, 'als', **{'lambda': 1e5, 'p': 0.01})
+    baseline_cache().stats()
+    baselines = batch_baselines(wavenumbers, intensity_matrix, 'als', **{'lambda': 1e5})
+"""
+
+import functools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.linalg import lapack
+
+from .cache import DEFAULT_CACHE_DIR, DiskCache, cache_enabled, hash_arguments
+
+# method: (pybaselines method, {pybaselines argument: (caller keyword, default)})
+BASELINE_METHODS = {
+    'als': ('asls', {'lam': ('lambda', 1e4), 'p': ('p', 0.01)}),
+    'arpls': ('arpls', {'lam': ('lambda', 1e5)}),
+    'polynomial': ('poly', {'poly_order': ('order', 3)}),
+}
+
+BASELINE_CACHE_VERSION = 1
+
+
+def baseline_parameters(method, **kwargs):
+    """
+    Resolve caller keywords ('lambda', 'p', 'order') to pybaselines arguments.
+
+    Args:
+        method: Key of BASELINE_METHODS
+        **kwargs: Caller keywords; missing ones take the method defaults
+    Returns:
+        (pybaselines method name, dict of arguments)
+    """
+    if method not in BASELINE_METHODS:
+        raise ValueError(f"Unknown baseline method '{method}' "
+                         f"(choose from {', '.join(BASELINE_METHODS)})")
+    name, arguments = BASELINE_METHODS[method]
+    params = {}
+    for argument, (keyword, default) in arguments.items():
+        value = kwargs.get(keyword, default)
+        params[argument] = int(value) if argument == 'poly_order' else float(value)
+    return name, params
+
+
+def compute_baseline(wavenumbers, intensities, method='als', **kwargs):
+    """Uncached pybaselines baseline of one spectrum."""
+    import pybaselines
+
+    name, params = baseline_parameters(method, **kwargs)
+    fitter = pybaselines.Baseline(np.asarray(wavenumbers, dtype=np.float64))
+    baseline, _ = getattr(fitter, name)(np.asarray(intensities, dtype=np.float64), **params)
+    return np.asarray(baseline, dtype=np.float64)
+
+
+class BaselineCache:
+    """
+    Two-level baseline cache: in-memory LRU in front of a DiskCache.
+
+    Safe to share between threads (concurrent Streamlit sessions): the
+    memory level and the counters are guarded by a lock, which is not held
+    while a baseline is computed or read from disk.
+
+    Args:
+        max_entries: Baselines kept in memory (0 disables the memory level)
+        cache_dir: Disk cache directory (None disables the disk level)
+        max_size_mb: LRU size cap of the disk level
+    """
+
+    def __init__(self, max_entries=128, cache_dir=DEFAULT_CACHE_DIR / 'ftir_baselines',
+                 max_size_mb=200):
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.disk = DiskCache(cache_dir, max_size_mb=max_size_mb) if cache_dir else None
+        self.counts = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    def key(self, wavenumbers, intensities, method, **kwargs):
+        name, params = baseline_parameters(method, **kwargs)
+        return hash_arguments('baseline', BASELINE_CACHE_VERSION,
+                              np.asarray(wavenumbers, dtype=np.float64),
+                              np.asarray(intensities, dtype=np.float64), name, params)
+
+    def _remember(self, key, baseline):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self.memory[key] = baseline
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def get(self, wavenumbers, intensities, method='als', **kwargs):
+        """
+        Baseline of one spectrum, computed only on a miss in both levels.
+
+        Args:
+            wavenumbers, intensities: Spectrum arrays
+            method: Key of BASELINE_METHODS
+            **kwargs: 'lambda', 'p' and/or 'order'
+        Returns:
+            (source, baseline) with source 'memory', 'disk' or 'computed';
+            the baseline array is read-only
+        """
+        if not cache_enabled():
+            return 'computed', compute_baseline(wavenumbers, intensities, method, **kwargs)
+
+        key = self.key(wavenumbers, intensities, method, **kwargs)
+        with self._lock:
+            baseline = self.memory.get(key)
+            if baseline is not None:
+                self.memory.move_to_end(key)
+                self.counts['memory_hits'] += 1
+                return 'memory', baseline
+
+        if self.disk is not None:
+            found, baseline = self.disk.get(key)
+            if found:
+                baseline.setflags(write=False)
+                self._remember(key, baseline)
+                self._count('disk_hits')
+                return 'disk', baseline
+
+        baseline = compute_baseline(wavenumbers, intensities, method, **kwargs)
+        baseline.setflags(write=False)
+        self._count('misses')
+        self._store(key, baseline)
+        return 'computed', baseline
+
+    def _store(self, key, baseline):
+        if self.disk is not None:
+            self.disk.set(key, baseline)
+        self._remember(key, baseline)
+
+    def put(self, wavenumbers, intensities, baseline, method='als', **kwargs):
+        """Store a baseline computed elsewhere (e.g. by batch_baselines)."""
+        if not cache_enabled():
+            return
+        baseline = np.array(baseline, dtype=np.float64)
+        baseline.setflags(write=False)
+        self._store(self.key(wavenumbers, intensities, method, **kwargs), baseline)
+
+    def stats(self):
+        """Hit counts per level and the overall hit rate."""
+        with self._lock:
+            stats = dict(self.counts)
+            stats['memory_entries'] = len(self.memory)
+        stats['lookups'] = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        hits = stats['memory_hits'] + stats['disk_hits']
+        stats['hit_rate'] = hits / stats['lookups'] if stats['lookups'] else 0.0
+        return stats
+
+    def clear(self, disk=False):
+        """Empty the memory level (and the disk level when ``disk`` is True)."""
+        with self._lock:
+            self.memory.clear()
+        if disk and self.disk is not None:
+            self.disk.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def baseline_cache():
+    """Process-wide BaselineCache shared by the FTIR analysers."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = BaselineCache()
+    return _default_cache
+
+
+def cached_baseline(wavenumbers, intensities, method='als', cache=None, **kwargs):
+    """
+    Baseline of one spectrum through the two-level cache.
+
+    Args:
+        wavenumbers, intensities: Spectrum arrays
+        method: 'als', 'arpls' or 'polynomial'
+        cache: BaselineCache (default: baseline_cache())
+        **kwargs: 'lambda', 'p' and/or 'order' as in apply_baseline_correction
+    Returns:
+        Read-only baseline array
+    """
+    cache = cache or baseline_cache()
+    return cache.get(wavenumbers, intensities, method, **kwargs)[1]
+
+
+# Batched penalised least-squares baselines
+_MIN_FLOAT = np.finfo(float).eps
+
+
+def difference_penalty(n_points, lam, diff_order=2):
+    """
+    ``lam * D.T @ D`` in LAPACK lower banded storage.
+
+    Args:
+        n_points: Spectrum length
+        lam: Smoothing parameter
+        diff_order: Order of the difference matrix D
+    Returns:
+        (diff_order + 1, n_points) array; row k holds the k-th subdiagonal,
+        left-aligned (the last k entries are zero)
+    """
+    if n_points <= diff_order:
+        raise ValueError(f"Need more than {diff_order} points for an order-{diff_order} penalty")
+    coefficients = np.diff(np.eye(diff_order + 1), diff_order, axis=0)[0]
+    bands = np.zeros((diff_order + 1, n_points))
+    for k in range(diff_order + 1):
+        # sum over the rows of D that touch both column j and column j + k
+        products = coefficients[:diff_order + 1 - k] * coefficients[k:]
+        for offset, value in enumerate(products):
+            bands[k, offset:n_points - diff_order + offset] += value
+    return lam * bands
+
+
+class PenalizedBaselines:
+    """
+    ASLS baselines for many spectra on one grid.
+
+    The penalty bands are built once. While all weights are equal (the
+    first iteration) one banded Cholesky factorization is shared by every
+    spectrum; afterwards each still unconverged spectrum is one LAPACK
+    ``pbsv`` call on reused buffers, and the weights of all spectra are
+    updated together. Iteration and convergence follow pybaselines, per
+    spectrum. Against one pybaselines call per spectrum this measured about
+    1.1-1.2x for full ASLS runs and 2-3x for a single solve, since the
+    per-spectrum LAPACK solves dominate; batched arPLS measured no faster,
+    so it is not offered.
+
+    Args:
+        n_points: Spectrum length
+        lam: Smoothing parameter
+        diff_order: Order of the difference penalty
+        block_points: Spectra are iterated in blocks of about this many
+            points, so the per-iteration arrays stay in cache
+    """
+
+    def __init__(self, n_points, lam, diff_order=2, block_points=1 << 16):
+        self.n_points = n_points
+        self.lam = lam
+        self.diff_order = diff_order
+        self.block_points = block_points
+        self.penalty = difference_penalty(n_points, lam, diff_order)
+
+    def solve(self, weights, data):
+        """
+        Solve ``(diag(w) + lam D'D) z = w y`` for every row.
+
+        Args:
+            weights, data: (n_spectra, n_points) arrays
+        Returns:
+            (n_spectra, n_points) solutions
+        """
+        rhs = weights * data
+        if (weights == weights[:1]).all():
+            bands = self.penalty.copy()
+            bands[0] += weights[0]
+            factor, info = lapack.dpbtrf(bands, lower=1, overwrite_ab=1)
+            if info != 0:
+                raise np.linalg.LinAlgError(f"Banded Cholesky factorization failed (info={info})")
+            solution, info = lapack.dpbtrs(factor, rhs.T, lower=1)
+            return solution.T
+
+        # One small system per spectrum: the buffers stay in cache, which
+        # measured faster than a single block-diagonal system for all rows
+        bands = np.empty_like(self.penalty)
+        for i in range(len(rhs)):
+            bands[:] = self.penalty
+            bands[0] += weights[i]
+            _, rhs[i], info = lapack.dpbsv(bands, rhs[i], lower=1, overwrite_ab=1, overwrite_b=1)
+            if info != 0:
+                raise np.linalg.LinAlgError(f"Banded Cholesky solve failed (info={info})")
+        return rhs
+
+    def _iterate(self, data, reweight, max_iter, tol):
+        """Run the reweighting loop over cache-sized blocks of spectra."""
+        data = np.atleast_2d(np.asarray(data, dtype=np.float64))
+        if data.shape[1] != self.n_points:
+            raise ValueError(f"Expected spectra of {self.n_points} points, got {data.shape[1]}")
+        baselines = np.empty_like(data)
+        iterations = np.zeros(len(data), dtype=int)
+        block = max(1, self.block_points // self.n_points)
+        for start in range(0, len(data), block):
+            stop = start + block
+            baselines[start:stop], iterations[start:stop] = self._iterate_block(
+                data[start:stop], reweight, max_iter, tol)
+        return baselines, iterations
+
+    def _iterate_block(self, data, reweight, max_iter, tol):
+        """Reweighting loop for one block; ``reweight`` returns (weights, exit_early)."""
+        baselines = np.empty_like(data)
+        iterations = np.zeros(len(data), dtype=int)
+        # Unconverged spectra, compacted: row indices, data and weights
+        rows = np.arange(len(data))
+        y = data
+        weights = np.ones_like(data)
+
+        for i in range(max_iter + 1):
+            z = self.solve(weights, y)
+            new_weights, exit_early = reweight(y, z)
+            difference = (np.linalg.norm(new_weights - weights, axis=1)
+                          / np.maximum(np.linalg.norm(weights, axis=1), _MIN_FLOAT))
+            done = exit_early | (difference < tol)
+
+            baselines[rows] = z
+            iterations[rows] = i + 1
+            if done.all():
+                break
+            if done.any():
+                rows, y, new_weights = rows[~done], y[~done], new_weights[~done]
+            weights = new_weights
+        return baselines, iterations
+
+    def asls(self, data, p=1e-2, max_iter=50, tol=1e-3):
+        """
+        Asymmetric least squares baselines.
+
+        Args:
+            data: (n_spectra, n_points) intensities (or one spectrum)
+            p: Weight of points above the baseline
+            max_iter, tol: Iteration limit and relative weight-change tolerance
+        Returns:
+            (baselines, iterations) with one row / entry per spectrum
+        """
+        if not 0 < p < 1:
+            raise ValueError('p must be between 0 and 1')
+
+        def reweight(y, z):
+            return np.where(y > z, p, 1 - p), np.zeros(len(y), dtype=bool)
+
+        return self._iterate(data, reweight, max_iter, tol)
+
+
+@functools.lru_cache(maxsize=16)
+def penalized_baselines(n_points, lam, diff_order=2):
+    """PenalizedBaselines for one grid length and lambda (built once per process)."""
+    return PenalizedBaselines(n_points, lam, diff_order)
+
+
+def batch_baselines(wavenumbers, intensities, method='als', **kwargs):
+    """
+    Baselines of many spectra on one wavenumber grid.
+
+    Matches cached_baseline/pybaselines for 'als' to solver precision, with a
+    modest speedup (see PenalizedBaselines); 'arpls' and 'polynomial' run one
+    pybaselines call per spectrum, which measured as fast.
+
+    Args:
+        wavenumbers: Shared ascending grid, shape (n_points,)
+        intensities: (n_spectra, n_points) array
+        method: Key of BASELINE_METHODS
+        **kwargs: 'lambda', 'p' and/or 'order' as in apply_baseline_correction
+    Returns:
+        (n_spectra, n_points) baselines
+    """
+    wavenumbers = np.asarray(wavenumbers, dtype=np.float64)
+    intensities = np.atleast_2d(np.asarray(intensities, dtype=np.float64))
+    if intensities.shape[1] != len(wavenumbers):
+        raise ValueError(f"Spectra have {intensities.shape[1]} points but the grid has {len(wavenumbers)}")
+    name, params = baseline_parameters(method, **kwargs)
+    if name != 'asls':
+        return np.vstack([compute_baseline(wavenumbers, y, method, **kwargs) for y in intensities])
+
+    engine = penalized_baselines(len(wavenumbers), params.pop('lam'))
+    return getattr(engine, name)(intensities, **params)[0]
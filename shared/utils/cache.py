@@ -0,0 +1,315 @@
+# shared/utils/cache.py
+"""
+Disk-backed memoization for expensive analysis steps.
+
+Results are keyed by a content hash of the function arguments (NumPy arrays
+and DataFrames are hashed by value), stored as one file per entry, and shared
+between scripts, notebooks and the Streamlit app. Writes go through an atomic
+rename so concurrent processes never read a partial entry.
+
+Usage:
+    from shared.utils.cache import disk_cache
+
+    @disk_cache(max_size_mb=200, ttl=7 * 24 * 3600)
+    def fit_baseline(wavenumbers, intensities, lam=1e5, p=0.01):
+        ...
+
+Set PAPER2_CACHE_DISABLE=1 (or call set_cache_enabled(False)) to bypass all
+caches, e.g. when benchmarking.
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = Path(os.environ.get('PAPER2_CACHE_DIR', Path.home() / '.cache' / 'paper2'))
+
+_enabled = os.environ.get('PAPER2_CACHE_DISABLE', '').lower() not in ('1', 'true', 'yes')
+
+
+def set_cache_enabled(enabled):
+    """Globally enable or disable every disk_cache (disabled calls run uncached)."""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def cache_enabled():
+    return _enabled
+
+
+@contextmanager
+def cache_disabled():
+    """Temporarily bypass all disk caches inside a ``with`` block."""
+    previous = _enabled
+    set_cache_enabled(False)
+    try:
+        yield
+    finally:
+        set_cache_enabled(previous)
+
+
+def _update_hash(h, obj):
+    """Feed a stable, type-tagged representation of ``obj`` into hash ``h``."""
+    if isinstance(obj, np.ndarray):
+        array = np.ascontiguousarray(obj)
+        h.update(f"ndarray:{array.dtype.str}:{array.shape}:".encode())
+        if array.dtype.hasobject:
+            _update_hash(h, array.tolist())
+        else:
+            h.update(array.data)
+    elif isinstance(obj, pd.DataFrame):
+        h.update(b"DataFrame:")
+        _update_hash(h, [str(c) for c in obj.columns])
+        _update_hash(h, [str(t) for t in obj.dtypes])
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().data)
+    elif isinstance(obj, pd.Series):
+        h.update(f"Series:{obj.name}:{obj.dtype}:".encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().data)
+    elif isinstance(obj, dict):
+        h.update(f"dict:{len(obj)}:".encode())
+        for key in sorted(obj, key=repr):
+            _update_hash(h, key)
+            _update_hash(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}:{len(obj)}:".encode())
+        for item in obj:
+            _update_hash(h, item)
+    elif isinstance(obj, (set, frozenset)):
+        _update_hash(h, sorted(obj, key=repr))
+    elif isinstance(obj, os.PathLike):
+        h.update(f"path:{os.fspath(obj)}".encode())
+    elif obj is None or isinstance(obj, (bool, int, float, complex, str, bytes, np.generic)):
+        h.update(f"{type(obj).__name__}:{obj!r};".encode())
+    else:
+        h.update(f"pickle:{type(obj).__qualname__}:".encode())
+        h.update(pickle.dumps(obj, protocol=4))
+
+
+def hash_arguments(*args, **kwargs):
+    """
+    Content hash of positional and keyword arguments.
+
+    Args:
+        *args, **kwargs: Values to hash (arrays and DataFrames by content)
+    Returns:
+        str: Hex digest
+    """
+    h = hashlib.blake2b(digest_size=20)
+    _update_hash(h, list(args))
+    _update_hash(h, kwargs)
+    return h.hexdigest()
+
+
+class DiskCache:
+    """
+    One cache directory with an LRU size cap and optional time-to-live.
+
+    Entries are pickled ``{'created': timestamp, 'value': result}`` files named
+    by key. The file's modification time is pinned to ``created``, so lookups
+    and eviction expire entries on the same clock; a hit refreshes only the
+    access time, and eviction removes the least recently used entries until
+    the directory fits ``max_size_mb``.
+    """
+
+    def __init__(self, directory, max_size_mb=500, ttl=None):
+        self.directory = Path(directory)
+        self.max_bytes = int(max_size_mb * 1024 ** 2) if max_size_mb else None
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    def _path(self, key):
+        return self.directory / f"{key}.pkl"
+
+    def get(self, key):
+        """Return (found, value) for ``key``."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            created, value = entry['created'], entry['value']
+        except FileNotFoundError:
+            self.stats['misses'] += 1
+            return False, None
+        except Exception:
+            # Truncated or corrupt entries (or ones pickled by incompatible
+            # code) can fail in many ways; drop them and recompute
+            self._remove(path)
+            self.stats['misses'] += 1
+            return False, None
+
+        if self.ttl is not None and time.time() - created > self.ttl:
+            self._remove(path)
+            self.stats['misses'] += 1
+            return False, None
+
+        try:
+            # Record the use in atime; mtime stays the creation time for the TTL
+            os.utime(path, (time.time(), created))
+        except FileNotFoundError:
+            pass
+        self.stats['hits'] += 1
+        return True, value
+
+    def set(self, key, value):
+        """Store ``value`` under ``key`` atomically, then enforce the size cap."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        # Unique temp file per writer, so threads and processes storing the
+        # same key never write into each other's file
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{path.name}.", suffix='.tmp',
+                                        dir=self.directory)
+        created = time.time()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump({'created': created, 'value': value}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.utime(tmp_path, (created, created))
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(Path(tmp_path))
+            raise
+        self.stats['writes'] += 1
+        self.evict()
+
+    def _remove(self, path):
+        try:
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def _lock(self):
+        """Non-blocking lock file; yields False if another process holds it."""
+        lock_path = self.directory / '.evict.lock'
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # Treat locks older than a minute as left behind by a crashed process
+            try:
+                stale = time.time() - lock_path.stat().st_mtime > 60
+            except FileNotFoundError:
+                stale = False
+            if stale:
+                self._remove(lock_path)
+            yield False
+            return
+        try:
+            os.close(fd)
+            yield True
+        finally:
+            self._remove(lock_path)
+
+    def evict(self):
+        """
+        Delete expired entries, then least recently used ones over the size cap.
+
+        Temp files left behind by writers that crashed mid-``set`` are removed
+        once they are an hour old.
+        """
+        if not self.directory.is_dir():
+            return
+        with self._lock() as acquired:
+            if not acquired:
+                return
+            now = time.time()
+            for path in self.directory.glob('*.tmp'):
+                try:
+                    orphaned = now - path.stat().st_mtime > 3600
+                except FileNotFoundError:
+                    continue
+                if orphaned:
+                    self._remove(path)
+
+            if self.max_bytes is None and self.ttl is None:
+                return
+            entries = []
+            for path in self.directory.glob('*.pkl'):
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                # Least recently used first; mtime is the creation time
+                entries.append((st.st_atime, st.st_mtime, st.st_size, path))
+            entries.sort()
+
+            total = sum(size for _, _, size, _ in entries)
+            for _, mtime, size, path in entries:
+                expired = self.ttl is not None and now - mtime > self.ttl
+                if not expired and (self.max_bytes is None or total <= self.max_bytes):
+                    continue
+                if self._remove(path):
+                    total -= size
+                    self.stats['evictions'] += 1
+
+    def clear(self):
+        """Delete every entry in this cache directory."""
+        for path in self.directory.glob('*.pkl'):
+            self._remove(path)
+
+    def size_bytes(self):
+        return sum(p.stat().st_size for p in self.directory.glob('*.pkl'))
+
+
+def disk_cache(name=None, cache_dir=None, max_size_mb=500, ttl=None, version=0):
+    """
+    Memoize a function on disk, keyed by the content of its arguments.
+
+    Positional and keyword arguments are bound to the signature (defaults
+    included) before hashing, so ``f(x, 5)`` and ``f(x, lam=5)`` share an entry.
+    The wrapped function gains ``cache_stats()``, ``cache_clear()`` and a
+    ``cache`` attribute.
+
+    Args:
+        name: Cache sub-directory (default: module.qualname of the function)
+        cache_dir: Root cache directory (default: PAPER2_CACHE_DIR or ~/.cache/paper2)
+        max_size_mb: LRU size cap for this function's entries (None for no cap)
+        ttl: Entry lifetime in seconds (None for no expiry)
+        version: Bump to invalidate old entries after changing the function
+    Returns:
+        Decorator
+    """
+    def decorator(func):
+        cache_name = name or f"{func.__module__}.{func.__qualname__}"
+        cache = DiskCache(Path(cache_dir or DEFAULT_CACHE_DIR) / cache_name,
+                          max_size_mb=max_size_mb, ttl=ttl)
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = hash_arguments(cache_name, version, **bound.arguments)
+
+            found, value = cache.get(key)
+            if found:
+                return value
+
+            value = func(*args, **kwargs)
+            cache.set(key, value)
+            return value
+
+        def cache_stats():
+            stats = dict(cache.stats)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            return stats
+
+        wrapper.cache = cache
+        wrapper.cache_stats = cache_stats
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
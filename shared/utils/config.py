@@ -22,6 +22,9 @@ solvent_order = [
 # --- Inorganics used in summary / axis titles ---
 inorganics = ['Al', 'Zn']  # Based on TMA and DEZ precursors
 
+# --- XPS core-level regions, in plotting order ---
+xps_regions = ['O 1s', 'C 1s', 'Al 2p', 'Zn 2p', 'N 1s']
+
 # For heatmap
 cmap_choice = cm.viridis  # actual matplotlib colormap
 
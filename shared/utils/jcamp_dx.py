@@ -0,0 +1,385 @@
+# shared/utils/jcamp_dx.py
+"""
+Native JCAMP-DX reader for FTIR spectra.
+
+Decodes (X++(Y..Y)) tables in AFFN and in the compressed ASDF forms (SQZ,
+DIF, DUP, with DIF y-checks) as whole-array NumPy operations instead of a
+character loop, and (XY..XY) point tables. Header labels are only parsed
+into a dict when first accessed; decoding itself reads just the few
+labels it needs (FIRSTX, LASTX, NPOINTS, XFACTOR, YFACTOR).
+
+Parsed spectra are cached in memory by a content hash of the file (a
+thread-safe LRU, shared by concurrent Streamlit sessions), so re-reading an
+unchanged file (from any path) skips decoding. The result
+behaves like the dict returned by ``jcamp.jcamp_readfile``: ``data['x']``,
+``data['y']`` and lower-case header labels.
+
+Usage:
+    from shared.utils.jcamp_dx import read_jcamp
+
+    data = read_jcamp('../data/raw/250721/Alucone_ad_powder.JDX')
+    wavenumbers, absorbance = data['x'], data['y']
+    data['resolution'], data.header['xunits']
+"""
+
+import functools
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+
+from .cache import cache_enabled
+
+# ASDF pseudo-digits: SQZ starts an absolute value, DIF a difference from the
+# previous value, DUP repeats the previous token (count includes the original)
+SQZ_DIGITS = {'@': 0, **{c: i + 1 for i, c in enumerate('ABCDEFGHI')},
+              **{c: -(i + 1) for i, c in enumerate('abcdefghi')}}
+DIF_DIGITS = {'%': 0, **{c: i + 1 for i, c in enumerate('JKLMNOPQR')},
+              **{c: -(i + 1) for i, c in enumerate('jklmnopqr')}}
+DUP_DIGITS = {c: i + 1 for i, c in enumerate('STUVWXYZs')}
+
+_ABS, _DIF, _DUP = 0, 1, 2
+
+# Byte lookup tables: kind of the token a byte starts (-1 if none), value of
+# a pseudo-digit's leading digit, and whether the byte makes the token negative
+_ASDF_KIND = np.full(256, -1, dtype=np.int8)
+_AFFN_KIND = np.full(256, -1, dtype=np.int8)
+_LEAD = np.zeros(256, dtype=np.float64)
+_HAS_LEAD = np.zeros(256, dtype=bool)
+_NEGATIVE = np.zeros(256, dtype=bool)
+for _table, _kind in ((SQZ_DIGITS, _ABS), (DIF_DIGITS, _DIF), (DUP_DIGITS, _DUP)):
+    for _char, _value in _table.items():
+        _ASDF_KIND[ord(_char)] = _kind
+        _LEAD[ord(_char)] = abs(_value)
+        _HAS_LEAD[ord(_char)] = True
+        _NEGATIVE[ord(_char)] = _value < 0
+for _char in '+-?':
+    _ASDF_KIND[ord(_char)] = _AFFN_KIND[ord(_char)] = _ABS
+_NEGATIVE[ord('-')] = True
+_IS_DIGIT = np.zeros(256, dtype=bool)
+_IS_DIGIT[ord('0'):ord('9') + 1] = True
+_IS_NUMBER = _IS_DIGIT.copy()
+_IS_NUMBER[ord('.')] = True
+_DIGIT_VALUE = _LEAD.copy()
+_DIGIT_VALUE[ord('0'):ord('9') + 1] = np.arange(10)
+# Pseudo-digits that cannot be part of an AFFN number (E/e may be exponents)
+_ASDF_ONLY = _HAS_LEAD.copy()
+_ASDF_ONLY[[ord('E'), ord('e')]] = False
+_POW10 = 10.0 ** np.arange(23)
+
+_AFFN_SIGN = re.compile(r'(?<![Ee])([+-])')
+_LABEL_PATTERN = r'^##{}=[ \t]*(.*)$'
+
+JCAMP_CACHE_SIZE = 64
+_parsed_cache = OrderedDict()
+_parsed_cache_lock = threading.Lock()
+
+
+def _label_value(text):
+    """Header value as int, float (also with a decimal comma) or stripped string."""
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    for candidate in (text, text.replace(',', '.', 1)):
+        try:
+            return float(candidate)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_jcamp_header(header_text):
+    """
+    Parse ##LABEL=value lines into a dict with lower-case labels.
+
+    Lines without a label continue the previous value; $$ comments are dropped.
+
+    Args:
+        header_text: Text before the data table
+    Returns:
+        dict of {label: int, float or str}
+    """
+    header = {}
+    label = None
+    for line in header_text.splitlines():
+        if not line.strip() or line.startswith('$$'):
+            continue
+        if line.startswith('##'):
+            label, _, value = line[2:].partition('=')
+            label = label.strip().lower()
+            header[label] = _label_value(value.split('$$')[0])
+        elif label is not None:
+            header[label] = f"{header[label]}\n{line.strip()}"
+    return header
+
+
+def _find_label(header_text, label, default=None):
+    """One header value without parsing the rest of the header."""
+    match = re.search(_LABEL_PATTERN.format(re.escape(label)), header_text, re.IGNORECASE | re.MULTILINE)
+    return _label_value(match.group(1).split('$$')[0]) if match else default
+
+
+def _tokenize_exponents(text, drop_first):
+    """AFFN tokens that may use exponent notation, parsed by np.fromstring."""
+    text = _AFFN_SIGN.sub(r' \1', text).translate(str.maketrans(',;', '  '))
+    codes = np.frombuffer(text.encode('ascii', 'replace'), dtype=np.uint8)
+    is_space = (codes == ord(' ')) | (codes == ord('\n')) | (codes == ord('\t')) | (codes == ord('\r'))
+    starts = np.flatnonzero(~is_space & np.r_[True, is_space[:-1]])
+    values = np.fromstring(text, sep=' ')
+    if len(values) != len(starts):
+        raise ValueError(f"Could not tokenize the data table ({len(values)} values, "
+                         f"{len(starts)} tokens)")
+    token_line = np.cumsum(codes == ord('\n'), dtype=np.int32)[starts]
+    keep = ~_first_of_line(token_line) if drop_first else slice(None)
+    return values[keep], np.full(len(values), _ABS, dtype=np.int8)[keep], token_line[keep]
+
+
+def _first_of_line(token_line):
+    first = np.ones(len(token_line), dtype=bool)
+    first[1:] = token_line[1:] != token_line[:-1]
+    return first
+
+
+def _tokenize(table, drop_first=False):
+    """
+    Values, kinds and line numbers of the tokens in a data table.
+
+    The whole table is handled as one byte array: lookup tables give each
+    byte's role, a token starts at a sign, a pseudo-digit or a number after
+    a separator, and the digits of all tokens are summed into values with
+    one weighted np.bincount (exact for integers below 2**53, and
+    correctly rounded for decimals).
+
+    Args:
+        table: Data table text
+        drop_first: Leave out the first token of every line (the abscissa
+            of an (X++(Y..Y)) table)
+    """
+    codes = np.frombuffer(table.encode('ascii', 'replace'), dtype=np.uint8)
+    asdf = bool(_ASDF_ONLY[codes].any())
+    if not asdf and b'E' in table.upper().encode('ascii', 'replace'):
+        return _tokenize_exponents(table, drop_first)
+
+    kind = (_ASDF_KIND if asdf else _AFFN_KIND)[codes]
+    is_number = _IS_NUMBER[codes]
+    is_start = kind >= 0
+    is_start[0] |= is_number[0]
+    is_start[1:] |= is_number[1:] & ~(is_number[:-1] | is_start[:-1])
+    starts = np.flatnonzero(is_start)
+    n_tokens = len(starts)
+    token_line = np.searchsorted(np.flatnonzero(codes == ord('\n')), starts)
+    token_id = np.cumsum(is_start, dtype=np.int32) - 1
+
+    # Leading pseudo-digit plus decimal digits, weighted by their place value
+    is_member = (_IS_DIGIT | _HAS_LEAD) if asdf else _IS_DIGIT
+    members = np.flatnonzero(is_member[codes])
+    tid = token_id[members]
+    n_digits = np.bincount(tid, minlength=n_tokens)
+    place = np.minimum((np.cumsum(n_digits) - 1)[tid] - np.arange(len(members)), len(_POW10) - 1)
+    values = np.bincount(tid, weights=_DIGIT_VALUE[codes[members]] * _POW10[place],
+                         minlength=n_tokens)
+
+    points = np.flatnonzero(codes == ord('.'))
+    if len(points):
+        point_at = np.full(n_tokens, len(codes))
+        point_at[token_id[points]] = points
+        decimals = np.bincount(tid[members > point_at[tid]], minlength=n_tokens)
+        values /= _POW10[np.minimum(decimals, len(_POW10) - 1)]
+
+    start_codes = codes[starts]
+    values[_NEGATIVE[start_codes]] *= -1
+    values[start_codes == ord('?')] = np.nan
+    token_kind = kind[starts]
+    token_kind[token_kind < 0] = _ABS
+    if drop_first:
+        # Abscissae of (X++(Y..Y)) lines are only checks
+        keep = ~_first_of_line(token_line)
+        return values[keep], token_kind[keep], token_line[keep]
+    return values, token_kind, token_line
+
+
+def _decode_ordinates(table):
+    """
+    Ordinates of an (X++(Y..Y)) table in AFFN or ASDF form.
+
+    The first token of every line (the abscissa) is dropped. DUP counts
+    become np.repeat counts, DIF runs a cumulative sum from the last
+    absolute value, and the y-check value that repeats the last ordinate of
+    a line ending in DIF form is dropped.
+    """
+    values, token_kind, token_line = _tokenize(table, drop_first=True)
+    if not (token_kind != _ABS).any():
+        return values
+
+    # Y-check: a line whose last ordinate is in DIF form repeats it at the start of the next line
+    line_start = _first_of_line(token_line)
+    line_end = np.roll(line_start, -1)
+    last_kind = np.where(token_kind == _DUP, np.roll(token_kind, 1), token_kind)[line_end]
+    check_lines = token_line[line_end][:-1][last_kind[:-1] == _DIF] + 1
+    is_check = line_start & np.isin(token_line, check_lines)
+
+    # DUP: repeat the preceding token (value and kind) count times in total
+    is_dup = token_kind == _DUP
+    repeats = np.ones(len(values), dtype=np.int64)
+    repeats[np.flatnonzero(is_dup) - 1] = values[is_dup].astype(np.int64)
+    keep = ~is_dup
+    values, token_kind, is_check, repeats = values[keep], token_kind[keep], is_check[keep], repeats[keep]
+    first_copy = np.zeros(int(repeats.sum()), dtype=bool)
+    first_copy[np.cumsum(repeats) - repeats] = True
+    values = np.repeat(values, repeats)
+    token_kind = np.repeat(token_kind, repeats)
+    is_check = np.repeat(is_check, repeats) & first_copy
+
+    # DIF: running sum of differences since the last absolute value
+    index = np.arange(len(values))
+    last_abs = np.maximum.accumulate(np.where(token_kind == _ABS, index, 0))
+    running = np.cumsum(np.where(token_kind == _DIF, values, 0.0))
+    y = values[last_abs] + running - running[last_abs]
+    return y[~is_check]
+
+
+def _decode_table(data_kind, table, header_text):
+    xfactor = _find_label(header_text, 'XFACTOR', 1.0)
+    yfactor = _find_label(header_text, 'YFACTOR', 1.0)
+
+    if data_kind.replace(' ', '').upper().startswith('(X++(Y..Y))'):
+        y = _decode_ordinates(table)
+        firstx = _find_label(header_text, 'FIRSTX')
+        lastx = _find_label(header_text, 'LASTX')
+        npoints = _find_label(header_text, 'NPOINTS')
+        if npoints is not None and npoints != len(y):
+            # The x axis is spread over the decoded values, so a short or long
+            # table would silently shift every wavenumber
+            raise ValueError(f"NPOINTS={npoints} but {len(y)} values were decoded; "
+                             f"the data table is truncated or malformed")
+        if isinstance(firstx, (int, float)) and isinstance(lastx, (int, float)):
+            # FIRSTX/LASTX are already in real units; the table abscissae are only checks
+            x = np.linspace(firstx, lastx, len(y))
+        else:
+            x = np.arange(len(y), dtype=np.float64)
+    else:
+        # (XY..XY) point table: alternating x, y values
+        values = _tokenize(table)[0]
+        x, y = values[0::2] * xfactor, values[1::2]
+    return x, y * yfactor
+
+
+def _split_blocks(text):
+    """(header text, data label, data label value, table text) of the first data table."""
+    match = re.search(r'^##(XYDATA|XYPOINTS|PEAK ?TABLE)=[ \t]*(.*)$', text,
+                      re.IGNORECASE | re.MULTILINE)
+    if match is None:
+        raise ValueError("No ##XYDATA, ##XYPOINTS or ##PEAKTABLE table found")
+    end = text.find('\n##', match.end())
+    table = text[match.end():len(text) if end < 0 else end]
+    if '$$' in table:
+        table = '\n'.join(line.split('$$')[0] for line in table.splitlines())
+    return (text[:match.start()], match.group(1).lower(),
+            match.group(2).split('$$')[0].strip(), table)
+
+
+class JCAMPSpectrum(Mapping):
+    """
+    Decoded JCAMP-DX spectrum with a lazily parsed header.
+
+    Indexing with 'x' or 'y' returns the (read-only) data arrays; any other
+    key is looked up case-insensitively in the header, so it can stand in
+    for the dict returned by ``jcamp.jcamp_readfile``.
+    """
+
+    def __init__(self, x, y, header_text, data_label='xydata', data_kind='(X++(Y..Y))',
+                 content_hash=None):
+        self.x = x
+        self.y = y
+        self.header_text = header_text
+        self.data_label = data_label
+        self.data_kind = data_kind
+        self.content_hash = content_hash
+
+    @functools.cached_property
+    def header(self):
+        header = parse_jcamp_header(self.header_text)
+        header[self.data_label] = self.data_kind
+        return header
+
+    def __getitem__(self, key):
+        if key == 'x':
+            return self.x
+        if key == 'y':
+            return self.y
+        return self.header[key.lower()]
+
+    def __iter__(self):
+        yield from self.header
+        yield 'x'
+        yield 'y'
+
+    def __len__(self):
+        return len(self.header) + 2
+
+    def __repr__(self):
+        title = self.header.get('title', '')
+        return f"JCAMPSpectrum({title!r}, {len(self.y)} points)"
+
+
+def parse_jcamp(text, content_hash=None):
+    """
+    Decode JCAMP-DX text.
+
+    Args:
+        text: File contents
+        content_hash: Optional hash stored on the result
+    Returns:
+        JCAMPSpectrum
+    Raises:
+        ValueError: No data table, or NPOINTS disagrees with the decoded values
+    """
+    header_text, data_label, data_kind, table = _split_blocks(text)
+    x, y = _decode_table(data_kind, table, header_text)
+    x.flags.writeable = False
+    y.flags.writeable = False
+    return JCAMPSpectrum(x, y, header_text, data_label, data_kind, content_hash)
+
+
+def read_jcamp(file_path, use_cache=True):
+    """
+    Read a JCAMP-DX file, reusing the decoded result of identical content.
+
+    Args:
+        file_path: Path to a .jdx/.dx file
+        use_cache: Look up and store the decoded spectrum by content hash
+            (also off when caches are disabled globally)
+    Returns:
+        JCAMPSpectrum (the arrays are shared between hits; copy before editing)
+    Raises:
+        ValueError: As for parse_jcamp
+    """
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    content_hash = hashlib.blake2b(raw, digest_size=16).hexdigest()
+    use_cache = use_cache and cache_enabled()
+
+    if use_cache:
+        with _parsed_cache_lock:
+            spectrum = _parsed_cache.get(content_hash)
+            if spectrum is not None:
+                _parsed_cache.move_to_end(content_hash)
+                return spectrum
+
+    # Decode outside the lock; concurrent readers of one new file may both decode it
+    spectrum = parse_jcamp(raw.decode('utf-8', 'ignore'), content_hash)
+    if use_cache:
+        with _parsed_cache_lock:
+            _parsed_cache[content_hash] = spectrum
+            while len(_parsed_cache) > JCAMP_CACHE_SIZE:
+                _parsed_cache.popitem(last=False)
+    return spectrum
+
+
+def clear_jcamp_cache():
+    """Forget every cached spectrum."""
+    with _parsed_cache_lock:
+        _parsed_cache.clear()
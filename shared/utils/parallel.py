@@ -0,0 +1,171 @@
+# shared/utils/parallel.py
+"""
+Process-pool helpers that share large NumPy arrays through shared memory.
+
+Arrays are published once into ``multiprocessing.shared_memory`` blocks and
+workers receive small picklable handles instead of the array data, so spectra
+stacks and image tiles are not re-pickled for every task.
+"""
+
+import atexit
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Blocks created by this process, unlinked at interpreter exit if still alive
+_OWNED_BLOCKS = {}
+
+# Blocks attached by a pool worker, keyed by array name
+_WORKER_BLOCKS = {}
+_WORKER_ARRAYS = {}
+
+
+class SharedArray:
+    """
+    Lightweight, picklable handle to an array stored in shared memory.
+
+    Only the block name, shape and dtype cross process boundaries; call
+    ``attach()`` in the worker to get a zero-copy NumPy view.
+    """
+
+    __slots__ = ('shm_name', 'shape', 'dtype')
+
+    def __init__(self, shm_name, shape, dtype):
+        self.shm_name = shm_name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).str
+
+    def __getstate__(self):
+        return (self.shm_name, self.shape, self.dtype)
+
+    def __setstate__(self, state):
+        self.shm_name, self.shape, self.dtype = state
+
+    def __repr__(self):
+        return f"SharedArray({self.shm_name!r}, shape={self.shape}, dtype={self.dtype!r})"
+
+    def attach(self):
+        """
+        Attach to the shared block.
+
+        Returns:
+            (SharedMemory, ndarray) - keep the SharedMemory object alive while
+            the array is in use and ``close()`` it afterwards
+        """
+        shm = _open_block(self.shm_name)
+        array = np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=shm.buf)
+        return shm, array
+
+
+def _open_block(name):
+    """Attach to an existing block without handing it to the resource tracker."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _release_block(shm, unlink):
+    try:
+        shm.close()
+        if unlink:
+            shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _cleanup_owned_blocks():
+    for shm in list(_OWNED_BLOCKS.values()):
+        _release_block(shm, unlink=True)
+    _OWNED_BLOCKS.clear()
+
+
+atexit.register(_cleanup_owned_blocks)
+
+
+@contextmanager
+def publish_arrays(arrays):
+    """
+    Copy arrays into shared memory for the lifetime of a ``with`` block.
+
+    Blocks are unlinked when the block exits, including on exceptions. If the
+    interpreter exits first they are removed by an atexit hook, and if the
+    process is killed the multiprocessing resource tracker removes them.
+
+    Args:
+        arrays: dict of {name: array-like}
+    Yields:
+        dict of {name: SharedArray} handles to pass to workers
+    """
+    handles = {}
+    blocks = []
+    try:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            _OWNED_BLOCKS[shm.name] = shm
+            blocks.append(shm)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            handles[name] = SharedArray(shm.name, array.shape, array.dtype)
+        yield handles
+    finally:
+        for shm in blocks:
+            _OWNED_BLOCKS.pop(shm.name, None)
+            _release_block(shm, unlink=True)
+
+
+def _init_worker(handles):
+    """Pool initializer: attach every shared array once per worker process."""
+    for name, handle in handles.items():
+        shm, array = handle.attach()
+        array.flags.writeable = False
+        _WORKER_BLOCKS[name] = shm
+        _WORKER_ARRAYS[name] = array
+    atexit.register(_close_worker_blocks)
+
+
+def _close_worker_blocks():
+    _WORKER_ARRAYS.clear()
+    for shm in _WORKER_BLOCKS.values():
+        _release_block(shm, unlink=False)
+    _WORKER_BLOCKS.clear()
+
+
+def _call_with_shared(func, item):
+    return func(item, **_WORKER_ARRAYS)
+
+
+def parallel_map(func, items, shared=None, processes=None, chunksize=1):
+    """
+    Map ``func`` over ``items`` in a process pool with shared input arrays.
+
+    Each worker attaches to the shared arrays once, then every task is called
+    as ``func(item, **arrays)`` with read-only NumPy views. ``func`` must be a
+    module-level function so it can be pickled.
+
+    Args:
+        func: Callable ``func(item, **arrays)``
+        items: Iterable of task arguments (e.g. sample indices or file paths)
+        shared: dict of {name: array} to publish in shared memory
+        processes: Number of worker processes (default: CPU count); 1 runs serially
+        chunksize: Tasks sent to a worker per round trip
+    Returns:
+        list of results in the order of ``items``
+    """
+    items = list(items)
+    shared = shared or {}
+
+    if processes == 1 or len(items) <= 1:
+        arrays = {name: np.asarray(array) for name, array in shared.items()}
+        return [func(item, **arrays) for item in items]
+
+    processes = processes or os.cpu_count() or 1
+    with publish_arrays(shared) as handles:
+        with ProcessPoolExecutor(max_workers=min(processes, len(items)),
+                                 initializer=_init_worker, initargs=(handles,)) as pool:
+            return list(pool.map(partial(_call_with_shared, func), items, chunksize=chunksize))
+
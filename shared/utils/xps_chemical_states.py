@@ -0,0 +1,196 @@
+# shared/utils/xps_chemical_states.py
+"""
+Chemical-state assignment of fitted XPS components by binding energy.
+
+The chemical-state table (region, BE interval, state, colour) is plain data:
+new regions such as Zn 2p or N 1s are added as rows here or in a CSV/Excel
+table, not as code. The table is compiled once into sorted interval arrays
+per region, so every component of every sample in a region is assigned by
+one np.searchsorted call.
+
+Intervals are half-open [BE_Low, BE_High); use -inf/inf for open ends.
+Positions outside every interval of their region (or in a region without
+rows) are 'Unassigned'.
+
+Usage:
+    from shared.utils.xps_chemical_states import chemical_state_index
+
+    index = chemical_state_index()
+    index.states('C 1s', [284.8, 286.4, 288.9])
+    components = index.annotate(components, position_column='Centroid_eV')
+"""
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+# (region, BE low, BE high, chemical state, colour) - colours follow the
+# viridis positions of the original per-region assignments
+XPS_CHEMICAL_STATES = [
+    ('O 1s', -np.inf, 530.0, 'Metal oxide O', '#414487'),
+    ('O 1s', 530.0, 532.0, 'Bridging O', '#21918c'),
+    ('O 1s', 532.0, np.inf, 'Organic/hydroxyl O', '#7ad151'),
+    ('C 1s', -np.inf, 285.0, 'C-C/C-H', '#414487'),
+    ('C 1s', 285.0, 287.0, 'C-O', '#2a788e'),
+    ('C 1s', 287.0, 289.0, 'C=O', '#22a884'),
+    ('C 1s', 289.0, np.inf, 'O-C=O/carbonate', '#7ad151'),
+    ('Al 2p', -np.inf, 74.0, 'Metallic Al', '#414487'),
+    ('Al 2p', 74.0, 76.0, 'Intermediate Al oxide', '#21918c'),
+    ('Al 2p', 76.0, np.inf, 'Al oxide', '#7ad151'),
+    ('N 1s', -np.inf, 398.5, 'Imine/pyridinic N', '#414487'),
+    ('N 1s', 398.5, 400.5, 'Amine/amide N', '#21918c'),
+    ('N 1s', 400.5, np.inf, 'Protonated N', '#7ad151'),
+    ('Zn 2p', -np.inf, 1022.5, 'ZnO', '#414487'),
+    ('Zn 2p', 1022.5, np.inf, 'Zn(OH)2', '#7ad151'),
+]
+
+CHEMICAL_STATE_COLUMNS = ['Region', 'BE_Low', 'BE_High', 'State', 'Color']
+
+# State and colour of positions no interval covers
+XPS_UNASSIGNED_STATE = ('Unassigned', '#21918c')
+
+
+def load_chemical_state_table(filepath, sheet_name=0):
+    """
+    Load a chemical-state table from an Excel or CSV file.
+
+    Args:
+        filepath: Table with Region, BE_Low, BE_High, State and Color columns
+            (blank BE_Low/BE_High mean an open end)
+        sheet_name: Excel sheet to read
+    Returns:
+        DataFrame with CHEMICAL_STATE_COLUMNS
+    """
+    filepath = str(filepath)
+    if filepath.endswith('.csv'):
+        table = pd.read_csv(filepath)
+    else:
+        table = pd.read_excel(filepath, sheet_name=sheet_name)
+    missing = [column for column in CHEMICAL_STATE_COLUMNS if column not in table.columns]
+    if missing:
+        raise ValueError(f"Chemical-state table {filepath} is missing columns {missing}")
+    table = table[CHEMICAL_STATE_COLUMNS].copy()
+    table['BE_Low'] = pd.to_numeric(table['BE_Low'], errors='coerce').fillna(-np.inf)
+    table['BE_High'] = pd.to_numeric(table['BE_High'], errors='coerce').fillna(np.inf)
+    return table
+
+
+class ChemicalStateIndex:
+    """
+    Chemical-state table compiled to sorted interval arrays per region.
+
+    Args:
+        table: Rows of (region, BE low, BE high, state, colour), a DataFrame
+            with CHEMICAL_STATE_COLUMNS, or a path for load_chemical_state_table
+            (default: XPS_CHEMICAL_STATES)
+    """
+
+    def __init__(self, table=None):
+        if table is None:
+            table = XPS_CHEMICAL_STATES
+        if isinstance(table, pd.DataFrame):
+            table = table[CHEMICAL_STATE_COLUMNS]
+        elif isinstance(table, (str, bytes)) or hasattr(table, '__fspath__'):
+            table = load_chemical_state_table(table)
+        else:
+            table = pd.DataFrame(list(table), columns=CHEMICAL_STATE_COLUMNS)
+        table = table.astype({'BE_Low': np.float64, 'BE_High': np.float64})
+        self.table = table.sort_values(['Region', 'BE_Low'], kind='stable').reset_index(drop=True)
+
+        self._intervals = {}
+        for region, rows in self.table.groupby('Region', sort=False):
+            low = rows['BE_Low'].to_numpy()
+            high = rows['BE_High'].to_numpy()
+            if (high <= low).any():
+                raise ValueError(f"Empty chemical-state interval in {region}")
+            if (low[1:] < high[:-1]).any():
+                raise ValueError(f"Overlapping chemical-state intervals in {region}")
+            self._intervals[region] = (low, high, rows['State'].to_numpy(dtype=object),
+                                       rows['Color'].to_numpy(dtype=object))
+
+    @property
+    def regions(self):
+        return list(self._intervals)
+
+    def lookup(self, region, positions):
+        """
+        Interval index of every position (-1 where unassigned).
+
+        Args:
+            region: Region name
+            positions: Binding energies (eV), any shape
+        Returns:
+            int array with the shape of ``positions``
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        intervals = self._intervals.get(region)
+        if intervals is None:
+            return np.full(positions.shape, -1, dtype=np.intp)
+        low, high = intervals[:2]
+        idx = np.searchsorted(low, positions, side='right') - 1
+        inside = (idx >= 0) & (positions < high[np.maximum(idx, 0)])
+        return np.where(inside, idx, -1)
+
+    def _take(self, region, positions, column, default):
+        idx = self.lookup(region, positions)
+        intervals = self._intervals.get(region)
+        values = np.full(idx.shape, default, dtype=object)
+        if intervals is not None:
+            inside = idx >= 0
+            values[inside] = intervals[column][idx[inside]]
+        return values
+
+    def states(self, region, positions):
+        """Chemical-state labels of the positions in one region."""
+        return self._take(region, positions, 2, XPS_UNASSIGNED_STATE[0])
+
+    def colors(self, region, positions):
+        """Plot colours of the positions in one region."""
+        return self._take(region, positions, 3, XPS_UNASSIGNED_STATE[1])
+
+    def annotate(self, table, position_column='Position_eV', region_column='Region'):
+        """
+        Add Chemical_State and State_Color columns to a component table.
+
+        Rows are grouped by region, so each region costs one searchsorted.
+
+        Args:
+            table: DataFrame with one row per component
+            position_column: Column holding the component BE
+            region_column: Column holding the region name
+        Returns:
+            Copy of ``table`` with the two new columns
+        """
+        table = table.copy()
+        states = np.full(len(table), XPS_UNASSIGNED_STATE[0], dtype=object)
+        colors = np.full(len(table), XPS_UNASSIGNED_STATE[1], dtype=object)
+        positions = table[position_column].to_numpy(dtype=np.float64)
+        for region, rows in table.groupby(region_column, sort=False).indices.items():
+            idx = self.lookup(region, positions[rows])
+            intervals = self._intervals.get(region)
+            if intervals is None:
+                continue
+            inside = idx >= 0
+            states[rows[inside]] = intervals[2][idx[inside]]
+            colors[rows[inside]] = intervals[3][idx[inside]]
+        table['Chemical_State'] = states
+        table['State_Color'] = colors
+        return table
+
+
+@functools.lru_cache(maxsize=1)
+def _default_index():
+    return ChemicalStateIndex()
+
+
+def chemical_state_index(table=None):
+    """
+    Compiled chemical-state index (the default table is compiled once).
+
+    Args:
+        table: As for ChemicalStateIndex
+    Returns:
+        ChemicalStateIndex
+    """
+    return _default_index() if table is None else ChemicalStateIndex(table)
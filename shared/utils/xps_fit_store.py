@@ -0,0 +1,233 @@
+# shared/utils/xps_fit_store.py
+"""
+Persistent store of XPS peak-fit results.
+
+Each fit belongs to one (sample, region) and carries a content hash of the
+input spectrum (BE and raw arrays) and of the model definition (components,
+background method and weighting), so a stored fit is reused exactly when
+neither has changed. Samples with identical spectra share one set of
+stored curves but keep their own fit and component rows.
+Results live in one .p2r results container (see shared/scripts/data_loading):
+
+    fits        one row per (sample, region): keys, background parameters,
+                residual statistics and where its curves start
+    components  one row per fitted component: position, FWHM, amplitude,
+                area and their uncertainties
+    curves      every fit's BE, raw, background and component curves
+                concatenated into one float array (memory-mapped on load)
+
+Usage:
+    from shared.utils.xps_fit_store import XPSFitStore
+    from shared.utils.xps_utils import fit_xps_dataset
+
+    store = XPSFitStore('data/processed/xps_fits.p2r')
+    fitted, parameters = fit_xps_dataset(all_dataframes, store=store)  # refits changed spectra only
+    store.query(region='C 1s', component='C 1s A')
+"""
+
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cache import hash_arguments
+
+FIT_STORE_VERSION = 1
+
+_FIT_COLUMNS = ['Key', 'Sample', 'Region', 'Data_Hash', 'Model_Hash', 'Success',
+                'Background_Method', 'Background_Low', 'Background_High',
+                'Limit_Low', 'Limit_High', 'chi2', 'reduced_chi2', 'residual_rms',
+                'n_points', 'n_parameters', 'nfev', 'N_Points', 'N_Components',
+                'Curve_Offset', 'Fitted_At']
+
+_STATISTICS = ['chi2', 'reduced_chi2', 'residual_rms', 'n_points', 'n_parameters', 'nfev']
+
+
+def fit_key(be_values, raw_values, model, background='shirley', weights=None):
+    """
+    Content hashes identifying one fit.
+
+    Args:
+        be_values, raw_values: Input spectrum
+        model, background, weights: As passed to fit_xps_region
+
+    Returns:
+        (key, data_hash, model_hash)
+    """
+    data_hash = hash_arguments(np.asarray(be_values, dtype=np.float64),
+                               np.asarray(raw_values, dtype=np.float64))
+    model_hash = hash_arguments(model, background, weights, FIT_STORE_VERSION)
+    return hash_arguments(data_hash, model_hash), data_hash, model_hash
+
+
+def _append_rows(table, rows):
+    return pd.concat([table, rows], ignore_index=True) if len(table) else rows.reset_index(drop=True)
+
+
+class XPSFitStore:
+    """
+    Fit results per (sample, region), validated by data and model hash.
+
+    Storing a new fit for a (sample, region) replaces the old one, so the
+    file only grows with the number of spectra. Changes are kept in memory
+    until ``save()``.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._fits = pd.DataFrame(columns=_FIT_COLUMNS)
+        self._components = pd.DataFrame()
+        self._curves = {}
+        self._dirty = False
+        if self.path.exists():
+            self._load()
+
+    def _load(self):
+        from shared.scripts.data_loading import load_results
+
+        stored = load_results(self.path, mmap=True)
+        if stored['metadata'].get('version') != FIT_STORE_VERSION:
+            print(f"⚠️ Ignoring fit store {self.path.name}: written by another version")
+            return
+        self._fits = stored['dataframes']['fits']
+        self._components = stored['dataframes']['components']
+        curves = stored['arrays']['curves']
+        for row in self._fits.itertuples(index=False):
+            n, k = int(row.N_Points), int(row.N_Components)
+            start = int(row.Curve_Offset)
+            self._curves[row.Key] = curves[start:start + (3 + k) * n].reshape(3 + k, n)
+
+    def __len__(self):
+        return len(self._fits)
+
+    def __contains__(self, key):
+        return key in self._curves
+
+    @property
+    def fits(self):
+        """One row per stored fit (keys, background and residual statistics)."""
+        return self._fits.drop(columns=['Curve_Offset']).copy()
+
+    def query(self, sample=None, region=None, component=None):
+        """
+        Component parameters filtered by sample, region and/or component name.
+
+        Each argument may be a single value or a list of values.
+        """
+        table = self._components
+        for column, value in (('Sample', sample), ('Region', region), ('Component', component)):
+            if value is not None and len(table):
+                values = [value] if isinstance(value, str) else list(value)
+                table = table[table[column].isin(values)]
+        return table.reset_index(drop=True)
+
+    def get(self, sample, region, key):
+        """
+        Rebuild the stored fit of one (sample, region) in the form returned
+        by fit_xps_region.
+
+        Args:
+            sample, region: Spectrum identity
+            key: Content key from fit_key; the stored fit is only returned
+                if it was made from the same data and model
+
+        Returns:
+            result dict, or None if no matching fit is stored
+        """
+        match = ((self._fits['Sample'] == sample) & (self._fits['Region'] == region)
+                 & (self._fits['Key'] == key))
+        curves = self._curves.get(key)
+        if curves is None or not match.any():
+            return None
+        row = self._fits.loc[match].iloc[0]
+        components = np.asarray(curves[3:])
+        background = np.asarray(curves[2])
+        rows = ((self._components['Sample'] == sample) & (self._components['Region'] == region)
+                & (self._components['Key'] == key))
+        parameters = self._components.loc[rows].drop(
+            columns=['Key', 'Sample', 'Region']).reset_index(drop=True)
+        return {
+            'be': np.asarray(curves[0]),
+            'raw': np.asarray(curves[1]),
+            'background': background,
+            'components': components,
+            'envelope': background + components.sum(axis=0),
+            'parameters': parameters,
+            'statistics': {name: row[name] for name in _STATISTICS},
+            'success': bool(row['Success']),
+        }
+
+    def put(self, sample, region, key, result, data_hash='', model_hash='', background='shirley',
+            limits=None):
+        """Store (or replace) the fit for one (sample, region)."""
+        be, bg = result['be'], result['background']
+        inside = np.ones(len(be), dtype=bool) if limits is None else (be >= limits[0]) & (be <= limits[1])
+        inside_be, inside_bg = be[inside], bg[inside]
+        order = np.argsort(inside_be)
+        stats = result['statistics']
+
+        row = {
+            'Key': key, 'Sample': sample, 'Region': region,
+            'Data_Hash': data_hash, 'Model_Hash': model_hash, 'Success': bool(result['success']),
+            'Background_Method': background if isinstance(background, str) else 'array',
+            'Background_Low': float(inside_bg[order[0]]) if len(order) else np.nan,
+            'Background_High': float(inside_bg[order[-1]]) if len(order) else np.nan,
+            'Limit_Low': limits[0] if limits is not None else np.nan,
+            'Limit_High': limits[1] if limits is not None else np.nan,
+            **{name: stats[name] for name in _STATISTICS},
+            'N_Points': len(be), 'N_Components': len(result['components']),
+            'Curve_Offset': -1, 'Fitted_At': time.time(),
+        }
+        self.remove(sample, region)
+        self._fits = _append_rows(self._fits, pd.DataFrame([row], columns=_FIT_COLUMNS))
+
+        params = result['parameters'].copy()
+        params.insert(0, 'Region', region)
+        params.insert(0, 'Sample', sample)
+        params.insert(0, 'Key', key)
+        self._components = _append_rows(self._components, params)
+
+        self._curves[key] = np.vstack([be, result['raw'], bg, result['components']])
+        self._dirty = True
+
+    def remove(self, sample, region):
+        """Drop the stored fit of one (sample, region), if any."""
+        match = (self._fits['Sample'] == sample) & (self._fits['Region'] == region)
+        if not match.any():
+            return
+        removed = set(self._fits.loc[match, 'Key'])
+        self._fits = self._fits.loc[~match].reset_index(drop=True)
+        # Curves are shared by identical spectra; keep those another row still uses
+        for key in removed - set(self._fits['Key']):
+            self._curves.pop(key, None)
+        if len(self._components):
+            keep = ~((self._components['Sample'] == sample) & (self._components['Region'] == region))
+            self._components = self._components.loc[keep].reset_index(drop=True)
+        self._dirty = True
+
+    def save(self):
+        """Write the store if it changed since it was loaded or last saved."""
+        from shared.scripts.data_loading import save_results
+
+        if not self._dirty:
+            return
+        fits = self._fits.copy()
+        keys = list(dict.fromkeys(fits['Key']))     # each shared curve block written once
+        blocks = [np.asarray(self._curves[key], dtype=np.float64).ravel() for key in keys]
+        sizes = np.array([block.size for block in blocks], dtype=np.int64)
+        offsets = dict(zip(keys, np.cumsum(sizes) - sizes))
+        fits['Curve_Offset'] = fits['Key'].map(offsets).astype(np.int64)
+        curves = np.concatenate(blocks) if blocks else np.zeros(0)
+
+        # Point the in-memory curves at the new array so no map of the old file stays open
+        for key, size in zip(keys, sizes):
+            start = offsets[key]
+            self._curves[key] = curves[start:start + size].reshape(self._curves[key].shape)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        save_results(self.path, arrays={'curves': curves},
+                     metadata={'version': FIT_STORE_VERSION},
+                     dataframes={'fits': fits, 'components': self._components})
+        self._fits = fits
+        self._dirty = False
@@ -0,0 +1,156 @@
+# shared/utils/xps_monte_carlo.py
+"""
+Monte Carlo uncertainties for fitted XPS components.
+
+Every region is fitted once, then Poisson-noise replicas of the fitted
+envelope are refitted with the same model. The spread of the refitted
+positions, FWHMs, areas and area fractions gives their confidence
+intervals. Replicas are refitted in a process pool; the fitted envelopes
+are published once in shared memory, and each (spectrum, chunk) task draws
+from its own random stream spawned from one seed, so results are identical
+for any number of worker processes.
+
+Usage:
+    from shared.utils.xps_monte_carlo import monte_carlo_uncertainty
+    from shared.utils.xps_utils import VamasFile
+
+    counts_per_cps = VamasFile('data/raw/session.vms').counts_per_cps()
+    uncertainty = monte_carlo_uncertainty(all_dataframes, counts_per_cps, n_replicas=200)
+    uncertainty[uncertainty['Quantity'] == 'Area_Fraction']
+"""
+
+import numpy as np
+import pandas as pd
+
+from .xps_utils import XPSDataset, XPS_DEFAULT_MODELS, fit_xps_dataset, fit_xps_region
+
+MC_QUANTITIES = ['Position_eV', 'FWHM_eV', 'Area', 'Area_Fraction']
+
+
+def _replica_task(task, be, expected):
+    """Refit ``n`` Poisson replicas of one spectrum; returns (row, chunk, draws)."""
+    row, chunk, n, n_points, model, background, weights, counts_per_cps, seed = task
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(row, chunk)))
+    x = be[row, :n_points]
+    mean_counts = np.maximum(expected[row, :n_points], 0) * counts_per_cps
+
+    k = len(model['components'])
+    draws = np.full((n, 3, k), np.nan)
+    for i in range(n):
+        replica = rng.poisson(mean_counts) / counts_per_cps
+        try:
+            result = fit_xps_region(x, replica, model, background, weights)
+        except Exception:
+            continue
+        if result['success']:
+            params = result['parameters']
+            draws[i] = params[['Position_eV', 'FWHM_eV', 'Area']].to_numpy().T
+    return row, chunk, draws
+
+
+def monte_carlo_uncertainty(data, counts_per_cps, models=None, n_replicas=100,
+                            background='shirley', weights=None, confidence=0.95, seed=0,
+                            chunk_size=25, processes=None, store=None):
+    """
+    Confidence intervals of fitted component parameters from Poisson replicas.
+
+    Runtime grows linearly with ``n_replicas`` (one fit per replica per
+    region); 50-100 replicas give usable standard deviations, a few
+    hundred are needed for stable 95% intervals.
+
+    Args:
+        data: dict of {sample_name: DataFrame} or an XPSDataset
+        counts_per_cps: Detected counts per intensity unit, i.e. dwell time x
+            scans when the exports are in CPS, as one number or a dict of
+            {region: value} (see VamasFile.counts_per_cps). Pass 1.0 only for
+            exports that are already in counts.
+        models: dict of {region: model} (default: XPS_DEFAULT_MODELS)
+        n_replicas: Noise replicas per region
+        background, weights: As for fit_xps_region
+        confidence: Central interval coverage
+        seed: Root seed; the same seed gives the same result for any ``processes``
+        chunk_size: Replicas per pool task
+        processes: Worker processes (None for CPU count, 1 for serial)
+        store: Optional XPSFitStore (or path) for the reference fits
+
+    Returns:
+        DataFrame with Sample, Region, Component, Quantity (Position_eV,
+        FWHM_eV, Area, Area_Fraction), Value (reference fit), Mean, Std,
+        CI_Low, CI_High and N_Replicas (successful refits)
+    """
+    from .parallel import parallel_map
+
+    models = XPS_DEFAULT_MODELS if models is None else models
+    if not isinstance(counts_per_cps, dict):
+        counts_per_cps = {region: float(counts_per_cps) for region in models}
+    missing = [region for region in models if region not in counts_per_cps]
+    if missing:
+        raise ValueError(f"counts_per_cps has no value for regions: {missing}")
+    fitted, parameters = fit_xps_dataset(data, models, background, weights,
+                                         processes=processes, store=store)
+    if parameters.empty:
+        return pd.DataFrame()
+
+    # Fitted envelopes of every region, NaN-padded into one shared stack
+    spectra = [spectrum for spectrum in XPSDataset.from_frames(fitted) if spectrum.region in models]
+    n_max = max(len(spectrum) for spectrum in spectra)
+    be = np.zeros((len(spectra), n_max))
+    expected = np.zeros((len(spectra), n_max))
+    for row, spectrum in enumerate(spectra):
+        be[row, :len(spectrum)] = spectrum.be
+        expected[row, :len(spectrum)] = spectrum.envelope
+
+    tasks = []
+    for row, spectrum in enumerate(spectra):
+        for chunk, start in enumerate(range(0, n_replicas, chunk_size)):
+            tasks.append((row, chunk, min(chunk_size, n_replicas - start), len(spectrum),
+                          models[spectrum.region], background, weights,
+                          counts_per_cps[spectrum.region], seed))
+
+    results = parallel_map(_replica_task, tasks, shared={'be': be, 'expected': expected},
+                           processes=processes)
+    draws_by_row = {}
+    for row, chunk, draws in sorted(results, key=lambda r: (r[0], r[1])):
+        draws_by_row.setdefault(row, []).append(draws)
+
+    tail = (1 - confidence) / 2 * 100
+    tables = []
+    for row, spectrum in enumerate(spectra):
+        draws = np.concatenate(draws_by_row[row])                   # (n_replicas, 3, k)
+        fractions = draws[:, 2] / draws[:, 2].sum(axis=1, keepdims=True)
+        values = np.concatenate([draws, fractions[:, None]], axis=1)  # (n_replicas, 4, k)
+        ok = np.isfinite(values).all(axis=(1, 2))
+        values = values[ok]
+
+        # Exactly one reference row per component, in model order
+        names = [component['name'] for component in models[spectrum.region]['components']]
+        reference = parameters[(parameters['Sample'] == spectrum.sample)
+                               & (parameters['Region'] == spectrum.region)]
+        reference = reference.drop_duplicates('Component').set_index('Component').reindex(names)
+        ref_area = reference['Area'].to_numpy()
+        ref_values = np.vstack([reference['Position_eV'], reference['FWHM_eV'], ref_area,
+                                ref_area / ref_area.sum()])
+        if ref_values.shape != values.shape[1:]:
+            raise ValueError(f"{spectrum.sample} {spectrum.region}: reference fit has shape "
+                             f"{ref_values.shape} but the replica draws have {values.shape[1:]}")
+
+        with np.errstate(invalid='ignore'):
+            summary = {
+                'Value': ref_values,
+                'Mean': values.mean(axis=0) if ok.any() else np.full_like(ref_values, np.nan),
+                'Std': values.std(axis=0, ddof=1) if ok.sum() > 1 else np.full_like(ref_values, np.nan),
+                'CI_Low': np.percentile(values, tail, axis=0) if ok.any() else np.full_like(ref_values, np.nan),
+                'CI_High': np.percentile(values, 100 - tail, axis=0) if ok.any() else np.full_like(ref_values, np.nan),
+            }
+        n_components = ref_values.shape[1]
+        table = pd.DataFrame({
+            'Sample': spectrum.sample,
+            'Region': spectrum.region,
+            'Component': np.tile(names, len(MC_QUANTITIES)),
+            'Quantity': np.repeat(MC_QUANTITIES, n_components),
+            **{name: array.ravel() for name, array in summary.items()},
+            'N_Replicas': int(ok.sum()),
+        })
+        tables.append(table)
+
+    return pd.concat(tables, ignore_index=True)
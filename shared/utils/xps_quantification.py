@@ -0,0 +1,333 @@
+# shared/utils/xps_quantification.py
+"""
+XPS quantification: atomic composition from background-subtracted peak areas.
+
+Areas for every (sample, region, component) are integrated in one batched
+pass over all spectra, divided by relative sensitivity factors (RSF) and an
+optional analyser transmission correction, and normalized to atomic
+percentages with Poisson counting uncertainties propagated through the
+normalization.
+
+Usage:
+    from shared.utils.xps_quantification import quantify_xps, composition_matrix
+
+    components, composition = quantify_xps(all_dataframes)
+    print(composition_matrix(composition))
+"""
+
+import numpy as np
+import pandas as pd
+
+from .xps_utils import XPSDataset, XPS_DEFAULT_MODELS, XPS_FIT_COLUMNS, XPS_TREATMENT_LABELS
+from .xps_chemical_states import chemical_state_index
+
+# Al K-alpha photon energy (eV)
+AL_KALPHA_EV = 1486.6
+
+# Relative sensitivity factors (Kratos library values used for the alucone
+# films, see data/raw/Alucone Composition.xlsx); keys are regions or elements
+XPS_RSF = {
+    'O 1s': 0.78,
+    'C 1s': 0.278,
+    'Al 2p': 0.193,
+    'N 1s': 0.477,
+    'Si 2p': 0.328,
+    'F 1s': 1.0,
+    'Na 1s': 1.685,
+    'Ca 2p': 1.833,
+    'S 2p': 0.668,
+    'Zn 2p': 3.726,
+}
+
+def region_element(region):
+    """Element symbol of a core-level region name ('Al 2p' -> 'Al')."""
+    return str(region).split()[0]
+
+
+def parse_sample_name(sample):
+    """
+    Split a sample name into organic and treatment ('BTY_AD' -> ('BTY', 'As Deposited')).
+
+    Args:
+        sample: Sample name of the form ORGANIC_TREATMENT
+    Returns:
+        (organic, treatment) - treatment is '' when the name has no suffix
+    """
+    organic, _, suffix = str(sample).partition('_')
+    return organic, XPS_TREATMENT_LABELS.get(suffix, suffix)
+
+
+def load_rsf_table(filepath, sheet_name=None, key_column='Peak', rsf_column='RSF'):
+    """
+    Load an RSF table from an Excel or CSV file.
+
+    Args:
+        filepath: Table with one row per peak (e.g. Alucone Composition.xlsx)
+        sheet_name: Excel sheet to read (default: all sheets)
+        key_column: Column holding region or element names
+        rsf_column: Column holding the sensitivity factors
+    Returns:
+        dict of {region or element: RSF}
+    """
+    filepath = str(filepath)
+    if filepath.endswith('.csv'):
+        table = pd.read_csv(filepath)
+    else:
+        table = pd.read_excel(filepath, sheet_name=sheet_name)
+        if isinstance(table, dict):
+            table = pd.concat([sheet for sheet in table.values() if key_column in sheet.columns])
+    table = table[[key_column, rsf_column]].dropna()
+    rsf = pd.to_numeric(table[rsf_column], errors='coerce')
+    return rsf.groupby(table[key_column].astype(str).str.strip()).median().dropna().to_dict()
+
+
+def lookup_rsf(region, rsf_table):
+    """RSF for a region, falling back to its element symbol; None if unknown."""
+    if region in rsf_table:
+        return rsf_table[region]
+    return rsf_table.get(region_element(region))
+
+
+def transmission_correction(be_values, exponent=0.0, source_energy=AL_KALPHA_EV):
+    """
+    Relative analyser transmission T(KE) = KE**exponent.
+
+    The default exponent of 0 applies no correction, which is appropriate for
+    exports that are already transmission-corrected.
+
+    Args:
+        be_values: Binding energies (eV)
+        exponent: Transmission exponent (typically -0.5 to -1 when correcting)
+        source_energy: Photon energy (eV)
+    Returns:
+        Transmission factors with the shape of ``be_values``
+    """
+    return (source_energy - np.asarray(be_values, dtype=np.float64)) ** exponent
+
+
+def _default_limits():
+    return {region: model['limits'] for region, model in XPS_DEFAULT_MODELS.items()
+            if 'limits' in model}
+
+
+def integrate_spectra(data, limits=None, counts_per_cps=1.0):
+    """
+    Background-subtracted areas of every (sample, region, component).
+
+    All spectra are concatenated and integrated with one set of bincount
+    reductions, so the cost does not grow with per-spectrum Python overhead.
+    The 'Total' component is raw - Background; fit components are
+    fitN - Background. Area uncertainties assume Poisson counting noise on
+    the raw signal. A component's error counts only its share of the raw
+    counts at each point (its fitted signal over the sum of all fitted
+    signals there); this ignores the correlation between overlapping
+    components in the fit, so it is a lower bound where peaks overlap
+    strongly (see monte_carlo_uncertainty for full refits).
+
+    Args:
+        data: XPSDataset or dict of {sample_name: DataFrame}
+        limits: dict of {region: (min_be, max_be)} integration windows
+            (default: region limits of XPS_DEFAULT_MODELS; other regions use
+            their full range)
+        counts_per_cps: Counts per CPS unit (dwell time x scans) for the
+            Poisson uncertainty, as one number or a dict of {region: value}
+            (see VamasFile.counts_per_cps)
+    Returns:
+        DataFrame with Sample, Region, Component, Area, Area_err, Centroid_eV
+    """
+    dataset = XPSDataset.coerce(data)
+    limits = _default_limits() if limits is None else limits
+    spectra = [spectrum for spectrum in dataset if len(spectrum) > 1]
+    columns = ['Sample', 'Region', 'Component', 'Area', 'Area_err', 'Centroid_eV']
+    if not spectra:
+        return pd.DataFrame(columns=columns)
+    if isinstance(counts_per_cps, dict):
+        missing = sorted({spectrum.region for spectrum in spectra} - set(counts_per_cps))
+        if missing:
+            raise ValueError(f"counts_per_cps has no value for regions: {missing}")
+        factor = np.array([counts_per_cps[spectrum.region] for spectrum in spectra], dtype=np.float64)
+    else:
+        factor = np.full(len(spectra), float(counts_per_cps))
+
+    n_spectra = len(spectra)
+    lengths = np.array([len(spectrum) for spectrum in spectra])
+    segment = np.repeat(np.arange(n_spectra), lengths)
+    be = np.concatenate([spectrum.be for spectrum in spectra])
+    raw = np.concatenate([spectrum.raw for spectrum in spectra])
+    background = np.concatenate([spectrum.background for spectrum in spectra])
+    fits = np.hstack([spectrum.fits for spectrum in spectra])
+
+    window = np.array([limits.get(spectrum.region, (-np.inf, np.inf)) for spectrum in spectra],
+                      dtype=np.float64)
+    inside = (be >= window[segment, 0]) & (be <= window[segment, 1])
+
+    # Trapezoid weights of each neighbouring pair inside the same spectrum and window
+    pair = (segment[1:] == segment[:-1]) & inside[1:] & inside[:-1]
+    half_dx = np.where(pair, 0.5 * np.diff(be), 0.0)
+    pair_segment = segment[:-1]
+    pair_be = 0.5 * (be[1:] + be[:-1])
+
+    def reduce(values):
+        return np.bincount(pair_segment, weights=values, minlength=n_spectra)
+
+    signals = np.vstack([raw - background, fits - background])
+    has_fit = [np.bincount(segment, weights=(~np.isnan(f)).astype(np.float64),
+                           minlength=n_spectra) > 0 for f in fits]
+    present = np.vstack([np.ones(n_spectra, dtype=bool)] + has_fit)
+    signals = np.nan_to_num(signals)
+    pair_sums = half_dx * (signals[:, 1:] + signals[:, :-1])
+    areas = np.vstack([reduce(row) for row in pair_sums])
+    moments = np.vstack([reduce(row * pair_be) for row in pair_sums])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centroids = np.where(areas != 0, moments / areas, np.nan)
+
+    # Each point carries the trapezoid weight of the pairs on either side
+    point_weight = np.zeros_like(be)
+    point_weight[:-1] += half_dx
+    point_weight[1:] += half_dx
+    counts = np.clip(np.nan_to_num(raw), 0, None)
+
+    # Raw counts split between components by their fitted signal at each point
+    component_signal = np.clip(signals[1:], 0, None)
+    fitted_total = component_signal.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares = np.where(fitted_total > 0, component_signal / fitted_total, 0.0)
+    point_variance = point_weight ** 2 * counts
+    variance = np.vstack([np.bincount(segment, weights=point_variance * share, minlength=n_spectra)
+                          for share in np.vstack([np.ones_like(counts), shares])]) / factor
+    errors = np.sqrt(variance)
+
+    component_names = ['Total'] + XPS_FIT_COLUMNS
+    rows = []
+    for i, spectrum in enumerate(spectra):
+        for k in np.flatnonzero(present[:, i]):
+            rows.append((spectrum.sample, spectrum.region, component_names[k], areas[k, i],
+                         errors[k, i], centroids[k, i]))
+    return pd.DataFrame(rows, columns=columns)
+
+
+def atomic_fractions(normalized_areas, normalized_err):
+    """
+    Atomic percentages with first-order propagated uncertainty.
+
+    For x_j = n_j / S with S = sum(n), the gradient dx_j/dn_k = delta_jk/S - n_j/S^2
+    gives var(x_j) = s_j^2/S^2 - 2 n_j s_j^2/S^3 + n_j^2 sum(s^2)/S^4.
+
+    Args:
+        normalized_areas: (n_samples, n_elements) RSF-normalized areas (0 if absent)
+        normalized_err: Matching standard uncertainties
+    Returns:
+        (atomic_percent, atomic_percent_err) arrays of the same shape
+    """
+    n = np.asarray(normalized_areas, dtype=np.float64)
+    s2 = np.asarray(normalized_err, dtype=np.float64) ** 2
+    total = n.sum(axis=1, keepdims=True)
+    total_var = s2.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = n / total
+        variance = s2 / total ** 2 - 2 * n * s2 / total ** 3 + n ** 2 * total_var / total ** 4
+    return 100 * fraction, 100 * np.sqrt(np.clip(variance, 0, None))
+
+
+def quantify_xps(data, rsf=None, limits=None, transmission_exponent=0.0,
+                 source_energy=AL_KALPHA_EV, counts_per_cps=1.0, sample_info=None,
+                 chemical_states=None):
+    """
+    Atomic composition of every sample from its core-level regions.
+
+    Args:
+        data: XPSDataset or dict of {sample_name: DataFrame}
+        rsf: dict of {region or element: RSF}, or a path for load_rsf_table
+            (default: XPS_RSF)
+        limits: Integration windows, see integrate_spectra
+        transmission_exponent: Exponent of the KE**x transmission correction
+        source_energy: Photon energy (eV)
+        counts_per_cps: Counts per CPS unit for the Poisson uncertainty, one
+            number or a dict of {region: value}, see integrate_spectra
+        sample_info: Callable sample -> (organic, treatment)
+            (default: parse_sample_name)
+        chemical_states: ChemicalStateIndex, or a table for chemical_state_index,
+            used to label components by centroid (default: XPS_CHEMICAL_STATES)
+    Returns:
+        (components, composition): per-component areas with their chemical
+        state and share of the region and of the sample's atoms, and
+        per-element atomic % with
+        uncertainties. Both carry Organic and Treatment columns.
+    """
+    if rsf is None:
+        rsf = XPS_RSF
+    elif not isinstance(rsf, dict):
+        rsf = load_rsf_table(rsf)
+    sample_info = sample_info or parse_sample_name
+
+    areas = integrate_spectra(data, limits=limits, counts_per_cps=counts_per_cps)
+    if areas.empty:
+        print("  ✗ No spectra to quantify")
+        return areas, pd.DataFrame()
+
+    totals = areas[areas['Component'] == 'Total'].copy()
+    totals['RSF'] = [lookup_rsf(region, rsf) for region in totals['Region']]
+    missing = sorted(totals.loc[totals['RSF'].isna(), 'Region'].unique())
+    if missing:
+        print(f"  ⚠️  No RSF for {', '.join(missing)}; excluded from composition")
+    totals = totals.dropna(subset=['RSF'])
+
+    totals['Element'] = totals['Region'].map(region_element)
+    totals['Transmission'] = transmission_correction(totals['Centroid_eV'].fillna(0.0),
+                                                     transmission_exponent, source_energy)
+    factor = totals['RSF'].to_numpy(dtype=np.float64) * totals['Transmission'].to_numpy()
+    totals['Normalized_Area'] = totals['Area'].clip(lower=0) / factor
+    totals['Normalized_Area_err'] = totals['Area_err'] / factor
+
+    # Samples x elements matrices, so every sample is normalized in one step
+    samples = pd.unique(totals['Sample'])
+    elements = pd.unique(totals['Element'])
+    grid = pd.MultiIndex.from_product([samples, elements], names=['Sample', 'Element'])
+    grouped = totals.groupby(['Sample', 'Element'], sort=False)
+    normalized = grouped['Normalized_Area'].sum().reindex(grid, fill_value=0.0)
+    normalized_err = np.sqrt((grouped['Normalized_Area_err'].apply(lambda e: (e ** 2).sum()))
+                             .reindex(grid, fill_value=0.0))
+    shape = (len(samples), len(elements))
+    percent, percent_err = atomic_fractions(normalized.to_numpy().reshape(shape),
+                                            normalized_err.to_numpy().reshape(shape))
+    atomic = pd.DataFrame({'Atomic_%': percent.ravel(), 'Atomic_%_err': percent_err.ravel()},
+                          index=grid)
+
+    composition = totals.join(atomic, on=['Sample', 'Element'])
+    info = [sample_info(sample) for sample in composition['Sample']]
+    composition.insert(0, 'Organic', [organic for organic, _ in info])
+    composition.insert(1, 'Treatment', [treatment for _, treatment in info])
+    composition = composition[['Organic', 'Treatment', 'Sample', 'Region', 'Element', 'Area',
+                               'Area_err', 'Centroid_eV', 'RSF', 'Transmission',
+                               'Normalized_Area', 'Normalized_Area_err', 'Atomic_%',
+                               'Atomic_%_err']].reset_index(drop=True)
+
+    components = areas[areas['Component'] != 'Total'].copy()
+    region_totals = components.groupby(['Sample', 'Region'])['Area'].transform('sum')
+    components['Region_%'] = 100 * components['Area'] / region_totals.where(region_totals != 0)
+    region_atomic = composition.set_index(['Sample', 'Region'])['Atomic_%']
+    components['Atomic_%'] = components['Region_%'] / 100 * [
+        region_atomic.get(key, np.nan) for key in zip(components['Sample'], components['Region'])]
+    info = [sample_info(sample) for sample in components['Sample']]
+    components.insert(0, 'Organic', [organic for organic, _ in info])
+    components.insert(1, 'Treatment', [treatment for _, treatment in info])
+    if not hasattr(chemical_states, 'annotate'):
+        chemical_states = chemical_state_index(chemical_states)
+    components = chemical_states.annotate(components, position_column='Centroid_eV').drop(
+        columns='State_Color')
+
+    return components.reset_index(drop=True), composition
+
+
+def composition_matrix(composition, value='Atomic_%'):
+    """
+    Pivot a composition table to organic x treatment rows and element columns.
+
+    Args:
+        composition: Composition DataFrame from quantify_xps
+        value: Column to tabulate (e.g. 'Atomic_%' or 'Atomic_%_err')
+    Returns:
+        DataFrame indexed by (Organic, Treatment)
+    """
+    return composition.pivot_table(index=['Organic', 'Treatment'], columns='Element',
+                                   values=value, aggfunc='mean', sort=False)
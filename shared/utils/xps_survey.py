@@ -0,0 +1,311 @@
+# shared/utils/xps_survey.py
+"""
+XPS survey screening: automatic element identification on wide scans.
+
+Peaks are detected on a stack of survey spectra at once (smoothing, a
+morphological-opening background and a Poisson significance test are all
+row-wise array operations), charge-referenced to adventitious carbon, and
+matched against a binding-energy table of core levels and Auger lines kept
+as a sorted array, so every peak's candidate lines come from two
+searchsorted calls instead of a scan of the table.
+
+Usage:
+    from shared.utils.xps_survey import screen_vamas_surveys
+
+    peaks, candidates = screen_vamas_surveys('data/raw/02122025_duncanreece_rit2749.vms')
+    print(candidates.pivot(index='Survey', columns='Element', values='Score'))
+"""
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+from .xps_utils import XPS_CHARGE_REFERENCE, VamasFile
+from .xps_quantification import AL_KALPHA_EV
+
+# (element, line, energy, kind, weight). Core levels are binding energies;
+# Auger lines are kinetic energies and are placed on the binding-energy scale
+# for the excitation source. Weights are approximate relative intensities
+# within an element (strongest line = 1) used only for scoring.
+XPS_CORE_LEVELS = [
+    ('C', 'C 1s', 284.8, 'core', 1.0),
+    ('C', 'C KLL', 263.0, 'auger', 0.4),
+    ('O', 'O 1s', 531.0, 'core', 1.0),
+    ('O', 'O 2s', 23.0, 'core', 0.05),
+    ('O', 'O KLL', 510.0, 'auger', 0.4),
+    ('N', 'N 1s', 399.5, 'core', 1.0),
+    ('N', 'N KLL', 379.0, 'auger', 0.3),
+    ('Al', 'Al 2p', 74.5, 'core', 1.0),
+    ('Al', 'Al 2s', 119.0, 'core', 0.8),
+    ('Si', 'Si 2p', 99.5, 'core', 1.0),
+    ('Si', 'Si 2s', 150.5, 'core', 0.8),
+    ('Zn', 'Zn 2p3/2', 1021.8, 'core', 1.0),
+    ('Zn', 'Zn 2p1/2', 1044.9, 'core', 0.5),
+    ('Zn', 'Zn 3p', 89.0, 'core', 0.1),
+    ('Zn', 'Zn LMM', 992.0, 'auger', 0.4),
+    ('F', 'F 1s', 686.0, 'core', 1.0),
+    ('F', 'F KLL', 656.0, 'auger', 0.4),
+    ('Na', 'Na 1s', 1071.5, 'core', 1.0),
+    ('Na', 'Na KLL', 990.0, 'auger', 0.5),
+    ('Mg', 'Mg 1s', 1303.5, 'core', 1.0),
+    ('Mg', 'Mg KLL', 1186.0, 'auger', 0.6),
+    ('Ca', 'Ca 2p', 347.0, 'core', 1.0),
+    ('Ca', 'Ca 2s', 438.5, 'core', 0.3),
+    ('S', 'S 2p', 164.0, 'core', 1.0),
+    ('S', 'S 2s', 228.0, 'core', 0.5),
+    ('Cl', 'Cl 2p', 199.0, 'core', 1.0),
+    ('Cl', 'Cl 2s', 270.0, 'core', 0.4),
+    ('P', 'P 2p', 133.5, 'core', 1.0),
+    ('P', 'P 2s', 191.0, 'core', 0.6),
+    ('K', 'K 2p', 293.0, 'core', 1.0),
+    ('K', 'K 2s', 378.0, 'core', 0.3),
+    ('B', 'B 1s', 190.0, 'core', 1.0),
+    ('Ti', 'Ti 2p', 458.8, 'core', 1.0),
+    ('Ti', 'Ti LMM', 418.0, 'auger', 0.2),
+    ('Fe', 'Fe 2p', 710.8, 'core', 1.0),
+    ('Fe', 'Fe LMM', 703.0, 'auger', 0.3),
+    ('Cu', 'Cu 2p', 932.6, 'core', 1.0),
+    ('Cu', 'Cu LMM', 918.0, 'auger', 0.3),
+]
+
+
+@functools.lru_cache(maxsize=8)
+def _reference_arrays(source_energy):
+    """Reference lines sorted by binding energy, as read-only arrays."""
+    table = survey_reference_table(source_energy)
+    elements, element_index = np.unique(table['Element'].to_numpy(), return_inverse=True)
+    arrays = (table['BE_eV'].to_numpy(), table['Weight'].to_numpy(), element_index,
+              elements, table['Line'].to_numpy())
+    for array in arrays:
+        array.flags.writeable = False
+    return arrays
+
+
+def survey_reference_table(source_energy=AL_KALPHA_EV):
+    """
+    Core levels and Auger lines on the binding-energy scale of a source.
+
+    Args:
+        source_energy: Photon energy in eV (default Al K-alpha)
+
+    Returns:
+        DataFrame with Element, Line, Kind, BE_eV and Weight, sorted by BE_eV
+    """
+    table = pd.DataFrame(XPS_CORE_LEVELS, columns=['Element', 'Line', 'Energy_eV', 'Kind', 'Weight'])
+    auger = table['Kind'] == 'auger'
+    table['BE_eV'] = np.where(auger, source_energy - table['Energy_eV'], table['Energy_eV'])
+    table = table.drop(columns='Energy_eV')
+    return table.sort_values('BE_eV', kind='stable').reset_index(drop=True)[
+        ['Element', 'Line', 'Kind', 'BE_eV', 'Weight']]
+
+
+def _rolling(stack, window, reduce):
+    """Centered rolling min/max along rows with edge padding."""
+    half = window // 2
+    padded = np.pad(stack, ((0, 0), (half, half)), mode='edge')
+    return reduce(np.lib.stride_tricks.sliding_window_view(padded, window, axis=1), axis=-1)
+
+
+def detect_survey_peaks(be, counts, opening_width=20.0, n_sigma=5.0, min_relative=0.005):
+    """
+    Find peaks on a stack of survey spectra sharing one binding-energy axis.
+
+    The inelastic background is a morphological opening (rolling minimum
+    then maximum) of the 3-point smoothed counts, which removes features
+    narrower than ``opening_width``. A local maximum of the net signal is a
+    peak when it exceeds ``n_sigma`` Poisson standard deviations and
+    ``min_relative`` of the strongest peak in its spectrum.
+
+    Args:
+        be: Binding energy axis (n_points,), uniformly spaced
+        counts: (n_surveys, n_points) counts
+        opening_width: Background structuring element width (eV)
+        n_sigma: Significance threshold
+        min_relative: Minimum net height relative to the largest peak
+
+    Returns:
+        DataFrame with Survey (row index), BE_eV (parabolic refinement),
+        Net_Counts and SNR, one row per peak
+    """
+    be = np.asarray(be, dtype=float)
+    counts = np.atleast_2d(np.asarray(counts, dtype=float))
+    if be[0] > be[-1]:
+        be, counts = be[::-1], counts[:, ::-1]
+    step = np.median(np.diff(be))
+
+    padded = np.pad(counts, ((0, 0), (1, 1)), mode='edge')
+    smooth = (padded[:, :-2] + padded[:, 1:-1] + padded[:, 2:]) / 3
+
+    window = max(3, int(round(opening_width / step)) | 1)
+    background = _rolling(_rolling(smooth, window, np.min), window, np.max)
+    net = smooth - background
+    noise = np.sqrt(np.maximum(smooth, 1.0) / 3)
+
+    is_max = np.zeros(net.shape, dtype=bool)
+    is_max[:, 1:-1] = (net[:, 1:-1] > net[:, :-2]) & (net[:, 1:-1] >= net[:, 2:])
+    snr = net / noise
+    significant = (snr >= n_sigma) & (net >= min_relative * net.max(axis=1, keepdims=True))
+    rows, idx = np.nonzero(is_max & significant)
+
+    # Parabolic interpolation through each maximum and its neighbours
+    y0, y1, y2 = net[rows, idx - 1], net[rows, idx], net[rows, idx + 1]
+    curvature = y0 - 2 * y1 + y2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offset = np.where(curvature < 0, 0.5 * (y0 - y2) / curvature, 0.0)
+
+    return pd.DataFrame({
+        'Survey': rows,
+        'BE_eV': be[idx] + offset * step,
+        'Net_Counts': y1,
+        'SNR': snr[rows, idx],
+    })
+
+
+def identify_survey_elements(be, counts, labels=None, source_energy=AL_KALPHA_EV,
+                             charge_reference=XPS_CHARGE_REFERENCE, tolerance=2.0,
+                             min_score=0.3, n_sigma=5.0, **peak_kwargs):
+    """
+    Detect survey peaks and score candidate elements for every spectrum.
+
+    Each survey is first shifted so its strongest peak within 8 eV of the
+    charge reference sits at the reference energy. Every peak is matched to
+    all reference lines within ``tolerance`` with a Gaussian closeness
+    (sigma = tolerance / 2) scaled by the peak's significance,
+    1 - n_sigma / SNR. An element's score is the weight of its matched
+    lines over the weight of its lines inside the measured range, and is
+    zero unless its strongest line in range is matched.
+
+    Args:
+        be: Binding energy axis (n_points,)
+        counts: (n_surveys, n_points) counts
+        labels: Survey names (default: row numbers)
+        source_energy: Photon energy in eV for placing Auger lines
+        charge_reference: (line, BE) used for the charge shift, or None for no shift
+        tolerance: Matching window half-width (eV)
+        min_score: Smallest element score reported
+        n_sigma: Peak significance threshold (see detect_survey_peaks)
+        **peak_kwargs: Passed to detect_survey_peaks
+
+    Returns:
+        (peaks, candidates) DataFrames. peaks has one row per detected peak
+        with the corrected BE and its best-matching line; candidates has
+        Survey, Element, Score, Matched_Lines and Shift_eV, in survey order
+        and by decreasing score.
+    """
+    counts = np.atleast_2d(np.asarray(counts, dtype=float))
+    n_surveys = counts.shape[0]
+    labels = list(labels) if labels is not None else list(range(n_surveys))
+    ref_be, ref_weight, ref_element, elements, ref_line = _reference_arrays(float(source_energy))
+
+    peaks = detect_survey_peaks(be, counts, n_sigma=n_sigma, **peak_kwargs)
+    survey_idx = peaks['Survey'].to_numpy()
+    peak_be = peaks['BE_eV'].to_numpy()
+    net = peaks['Net_Counts'].to_numpy()
+
+    # Charge shift per survey from the strongest peak near the reference line
+    shifts = np.zeros(n_surveys)
+    if charge_reference is not None and len(peaks):
+        reference_be = charge_reference[1]
+        near = np.abs(peak_be - reference_be) <= 8.0
+        strength = np.where(near, net, -np.inf)
+        order = np.lexsort((strength, survey_idx))
+        last = np.r_[survey_idx[order][1:] != survey_idx[order][:-1], True]
+        best = order[last]
+        found = np.isfinite(strength[best])
+        shifts[survey_idx[best][found]] = reference_be - peak_be[best][found]
+    corrected = peak_be + shifts[survey_idx]
+
+    # Candidate (peak, line) pairs from the sorted table: lines in [BE - tol, BE + tol]
+    lo = np.searchsorted(ref_be, corrected - tolerance, side='left')
+    hi = np.searchsorted(ref_be, corrected + tolerance, side='right')
+    n_candidates = hi - lo
+    pair_peak = np.repeat(np.arange(len(peaks)), n_candidates)
+    pair_line = (np.repeat(lo - np.cumsum(n_candidates) + n_candidates, n_candidates)
+                 + np.arange(n_candidates.sum()))
+    closeness = np.exp(-0.5 * ((corrected[pair_peak] - ref_be[pair_line]) / (tolerance / 2)) ** 2)
+    # Peaks just over the detection threshold count for little
+    closeness *= np.clip(1 - n_sigma / peaks['SNR'].to_numpy()[pair_peak], 0, 1)
+
+    # Best closeness of every reference line in every survey
+    line_match = np.zeros((n_surveys, len(ref_be)))
+    np.maximum.at(line_match, (survey_idx[pair_peak], pair_line), closeness)
+
+    be_axis = np.asarray(be, dtype=float)
+    low = be_axis.min() + shifts[:, None] + tolerance
+    high = be_axis.max() + shifts[:, None] - tolerance
+    in_range = (ref_be >= low) & (ref_be <= high)
+
+    one_hot = np.zeros((len(ref_be), len(elements)))
+    one_hot[np.arange(len(ref_be)), ref_element] = 1.0
+    expected = (in_range * ref_weight) @ one_hot
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.where(expected > 0, ((line_match * ref_weight) @ one_hot) / expected, 0.0)
+
+    # Strongest in-range line of each element must itself be matched
+    in_range_weight = np.where(in_range, ref_weight, -1.0)
+    for e in range(len(elements)):
+        lines = np.flatnonzero(ref_element == e)
+        principal = lines[np.argmax(in_range_weight[:, lines], axis=1)]
+        scores[:, e] *= line_match[np.arange(n_surveys), principal] > 0
+
+    rows, cols = np.nonzero(scores >= min_score)
+    order = np.lexsort((-scores[rows, cols], rows))
+    rows, cols = rows[order], cols[order]
+    matched = line_match[rows] > 0
+    candidates = pd.DataFrame({
+        'Survey': [labels[r] for r in rows],
+        'Element': elements[cols],
+        'Score': scores[rows, cols],
+        'Matched_Lines': [', '.join(ref_line[m & (ref_element == c)]) for m, c in zip(matched, cols)],
+        'Shift_eV': shifts[rows],
+    })
+
+    # Label each peak with its best line (closeness times line weight)
+    assignment = np.full(len(peaks), '', dtype=object)
+    if len(pair_peak):
+        rank = closeness * ref_weight[pair_line]
+        order = np.lexsort((rank, pair_peak))
+        last = np.r_[pair_peak[order][1:] != pair_peak[order][:-1], True]
+        assignment[pair_peak[order][last]] = ref_line[pair_line[order][last]]
+    peaks = peaks.assign(Survey=[labels[s] for s in survey_idx], BE_eV=corrected,
+                         Assignment=assignment)
+    return peaks, candidates
+
+
+def _counts_on_axis(block, be):
+    """Counts of a VAMAS block on an increasing binding-energy axis."""
+    order = np.argsort(block['binding_energy'])
+    block_be, block_counts = block['binding_energy'][order], block['counts'][order]
+    if np.array_equal(block_be, be):
+        return block_counts
+    return np.interp(be, block_be, block_counts)
+
+
+def screen_vamas_surveys(path, **kwargs):
+    """
+    Identify elements on every survey block of a VAMAS file.
+
+    Blocks are placed on the first survey's binding-energy axis (linear
+    interpolation when the axes differ) and screened together.
+
+    Args:
+        path: .vms file
+        **kwargs: Passed to identify_survey_elements
+
+    Returns:
+        (peaks, candidates) as from identify_survey_elements, or
+        (None, None) if the file has no survey blocks
+    """
+    vms = VamasFile(path)
+    blocks = list(vms.iter_blocks(region='Survey'))
+    if not blocks:
+        print(f"⚠️ No survey blocks in {path}")
+        return None, None
+
+    be = np.sort(blocks[0]['binding_energy'])
+    counts = np.vstack([_counts_on_axis(block, be) for block in blocks])
+    labels = [block['block_id'] if block['sample_id'] in ('', 'Not Specified')
+              else f"{block['sample_id']} {block['block_id']}" for block in blocks]
+    kwargs.setdefault('source_energy', blocks[0]['source_energy'])
+    return identify_survey_elements(be, counts, labels=labels, **kwargs)
@@ -4,53 +4,296 @@ XPS-specific utility functions for data processing and plotting.
 UPDATED: Fixed numpy.trapz deprecation warnings
 """
 
+import csv
+import functools
+import hashlib
+import os
+import re
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.colors import to_hex
 import warnings
 
+# Expected binding energy window (eV) for each core-level region
+XPS_BE_RANGES = {
+    'O 1s': (520, 550),
+    'C 1s': (270, 310),
+    'Al 2p': (60, 95),
+    'Zn 2p': (1010, 1060),
+    'N 1s': (390, 410),
+    'Si 2p': (95, 110)
+}
+
+# Column layout of the per-sample frames produced by the XPS parser
+XPS_FIT_COLUMNS = ['fit1', 'fit2', 'fit3', 'fit4', 'fit5', 'fit6']
+XPS_OUTPUT_COLUMNS = ['B.E.', 'raw'] + XPS_FIT_COLUMNS + ['Envelope', 'Background', 'Region']
+
+
+def extract_xps_regions(data_rows, regions_info, be_ranges=None):
+    """
+    Extract every region's column block from a CasaXPS export into one long frame.
+
+    Each region is sliced as a NumPy block and filtered with vectorized masks:
+    rows with a missing binding energy, a binding energy outside the region's
+    window, or a non-numeric entry in any used column are dropped. Rows keep the
+    export's row-major order (row by row, regions in ``regions_info`` order).
+
+    Args:
+        data_rows: DataFrame of data rows (below the header rows), header=None layout
+        regions_info: list of dicts with 'name', 'be_col', 'raw_col', 'fit_cols',
+            'env_col' and 'bg_col' column positions
+        be_ranges: dict of {region: (min, max)} windows (default: XPS_BE_RANGES)
+
+    Returns:
+        DataFrame with XPS_OUTPUT_COLUMNS
+    """
+    be_ranges = XPS_BE_RANGES if be_ranges is None else be_ranges
+    n_cols = data_rows.shape[1]
+    n_fits = len(XPS_FIT_COLUMNS)
+
+    # Parse every column once; entries that were present but not numeric are invalid
+    try:
+        numeric = data_rows.to_numpy(dtype=np.float64, na_value=np.nan)
+        invalid = np.zeros(numeric.shape, dtype=bool)
+    except (TypeError, ValueError):
+        numeric = data_rows.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        invalid = np.isnan(numeric) & data_rows.notna().to_numpy()
+    row_positions = np.arange(len(data_rows))
+
+    blocks, regions, order_keys = [], [], []
+    for region_idx, region in enumerate(regions_info):
+        fit_cols = list(region['fit_cols'])[:n_fits]
+        used_cols = [region['be_col'], region['raw_col']] + fit_cols + [region['env_col'], region['bg_col']]
+        if max(used_cols) >= n_cols:
+            continue
+
+        be = numeric[:, region['be_col']]
+        keep = ~np.isnan(be)
+        if region['name'] in be_ranges:
+            be_min, be_max = be_ranges[region['name']]
+            keep &= (be >= be_min) & (be <= be_max)
+        keep &= ~invalid[:, used_cols].any(axis=1)
+
+        block = np.full((int(keep.sum()), n_fits + 4), np.nan)
+        block[:, 0] = be[keep]
+        block[:, 1] = numeric[keep, region['raw_col']]
+        block[:, 2:2 + len(fit_cols)] = numeric[np.ix_(keep, fit_cols)]
+        block[:, -2] = numeric[keep, region['env_col']]
+        block[:, -1] = numeric[keep, region['bg_col']]
+
+        blocks.append(block)
+        regions.append(np.full(len(block), region['name'], dtype=object))
+        order_keys.append((row_positions[keep], np.full(len(block), region_idx)))
+
+    if not blocks:
+        return pd.DataFrame(columns=XPS_OUTPUT_COLUMNS)
+
+    values = np.concatenate(blocks)
+    region_names = np.concatenate(regions)
+    rows = np.concatenate([k[0] for k in order_keys])
+    region_order = np.concatenate([k[1] for k in order_keys])
+    order = np.lexsort((region_order, rows))
+
+    df = pd.DataFrame(values[order], columns=XPS_OUTPUT_COLUMNS[:-1])
+    df['Region'] = region_names[order].tolist()
+    return df
+
+
+class XPSSpectrum:
+    """
+    One (sample, region) spectrum as contiguous arrays sorted by increasing
+    binding energy. ``fits`` is (len(XPS_FIT_COLUMNS), n_points); unused fit
+    components are all-NaN rows.
+    """
+
+    __slots__ = ('sample', 'region', 'be', 'raw', 'fits', 'envelope', 'background')
+
+    def __init__(self, sample, region, be, raw, fits, envelope, background):
+        self.sample = sample
+        self.region = region
+        self.be = be
+        self.raw = raw
+        self.fits = fits
+        self.envelope = envelope
+        self.background = background
+
+    def __len__(self):
+        return self.be.size
+
+    def __repr__(self):
+        return f"XPSSpectrum({self.sample!r}, {self.region!r}, n_points={len(self)})"
+
+    def fit(self, column):
+        """Return a fit component by column name (e.g. 'fit1')."""
+        return self.fits[XPS_FIT_COLUMNS.index(column)]
+
+
+class XPSDataset:
+    """
+    Region-indexed XPS data for many samples.
+
+    Each sample frame from process_xps_file is split once into XPSSpectrum
+    arrays, so ``dataset[sample, region]`` is a dict lookup instead of a
+    boolean scan of the frame. The source frames are kept for CSV export.
+
+    Usage:
+        dataset = XPSDataset.from_frames({'BTY_AD': df_ad, 'BTY_UV': df_uv})
+        spectrum = dataset['BTY_AD', 'O 1s']
+        plt.plot(spectrum.be, spectrum.raw - spectrum.background)
+    """
+
+    __slots__ = ('_spectra', '_regions', '_frames')
+
+    required_columns = ['B.E.', 'raw', 'Background', 'Envelope', 'Region']
+
+    def __init__(self):
+        self._spectra = {}
+        self._regions = {}
+        self._frames = {}
+
+    @classmethod
+    def from_frames(cls, dataframes_dict):
+        """
+        Args:
+            dataframes_dict: dict of {sample_name: DataFrame} in the parser's layout
+        Returns:
+            XPSDataset
+        """
+        dataset = cls()
+        for sample, df in dataframes_dict.items():
+            dataset.add_frame(sample, df)
+        return dataset
+
+    @classmethod
+    def coerce(cls, data, sample='sample'):
+        """Return ``data`` as an XPSDataset (accepts a dataset, a dict of frames or one frame)."""
+        if isinstance(data, cls):
+            return data
+        if isinstance(data, pd.DataFrame):
+            data = {sample: data}
+        return cls.from_frames(data)
+
+    def add_frame(self, sample, df):
+        """Split one sample's frame into sorted per-region arrays."""
+        missing = [col for col in self.required_columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns for {sample}: {missing}")
+
+        codes, names = pd.factorize(df['Region'])
+        be = df['B.E.'].to_numpy(dtype=np.float64)
+        order = np.lexsort((be, codes))
+        bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+
+        def column(name):
+            if name not in df.columns:
+                return np.full(len(df), np.nan)
+            return df[name].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+
+        be, raw = be[order], column('raw')
+        envelope, background = column('Envelope'), column('Background')
+        fits = np.vstack([column(name) for name in XPS_FIT_COLUMNS])
+
+        regions = []
+        for code, region in enumerate(names):
+            part = slice(bounds[code], bounds[code + 1])
+            self._spectra[sample, region] = XPSSpectrum(
+                sample, region, be[part], raw[part], np.ascontiguousarray(fits[:, part]),
+                envelope[part], background[part])
+            regions.append(region)
+
+        self._regions[sample] = regions
+        self._frames[sample] = df
+
+    @property
+    def samples(self):
+        return list(self._regions)
+
+    def regions(self, sample):
+        """Regions of ``sample`` in the order they first appear in its frame."""
+        return list(self._regions.get(sample, []))
+
+    def get(self, sample, region, default=None):
+        return self._spectra.get((sample, region), default)
+
+    def frame(self, sample):
+        """The source DataFrame for ``sample``."""
+        return self._frames[sample]
+
+    def spectra(self, sample=None):
+        """Iterate spectra of one sample, or of all samples in load order."""
+        samples = self.samples if sample is None else [sample]
+        for name in samples:
+            for region in self._regions.get(name, []):
+                yield self._spectra[name, region]
+
+    def __getitem__(self, key):
+        return self._spectra[key]
+
+    def __contains__(self, key):
+        if isinstance(key, tuple):
+            return key in self._spectra
+        return key in self._regions
+
+    def __iter__(self):
+        return self.spectra()
+
+    def __len__(self):
+        return len(self._spectra)
+
+    def __repr__(self):
+        return f"XPSDataset(samples={self.samples}, spectra={len(self)})"
 
-def validate_xps_data(df, region_name):
+
+def validate_xps_data(df, region_name, sample=None):
     """
     Validate XPS data for a specific region.
 
     Args:
-        df: DataFrame containing XPS data
+        df: DataFrame containing XPS data, or an XPSDataset
         region_name: Name of the XPS region (e.g., 'O 1s', 'C 1s', 'Al 2p')
+        sample: Sample to check when ``df`` is an XPSDataset (default: every sample)
 
     Returns:
-        bool: True if data is valid
+        bool: True if data is valid (for a dataset, for every checked sample)
     """
-    required_columns = ['B.E.', 'raw', 'Background', 'Envelope', 'Region']
+    if isinstance(df, XPSDataset):
+        # Required columns are checked when the dataset is built
+        if sample is None:
+            if not df.samples:
+                warnings.warn(f"No data found for region: {region_name}")
+                return False
+            # Check all samples so each invalid one gets its own warning
+            results = [validate_xps_data(df, region_name, s) for s in df.samples]
+            return all(results)
+        spectrum = df.get(sample, region_name)
+        if spectrum is None or len(spectrum) == 0:
+            warnings.warn(f"No data found for region: {region_name}")
+            return False
+        region_be = spectrum.be
+    else:
+        required_columns = ['B.E.', 'raw', 'Background', 'Envelope', 'Region']
 
-    # Check if required columns exist
-    missing_cols = [col for col in required_columns if col not in df.columns]
-    if missing_cols:
-        warnings.warn(f"Missing columns for {region_name}: {missing_cols}")
-        return False
+        # Check if required columns exist
+        missing_cols = [col for col in required_columns if col not in df.columns]
+        if missing_cols:
+            warnings.warn(f"Missing columns for {region_name}: {missing_cols}")
+            return False
 
-    # Filter data for the region
-    region_df = df[df['Region'] == region_name]
-    if len(region_df) == 0:
-        warnings.warn(f"No data found for region: {region_name}")
-        return False
+        # Filter data for the region
+        region_df = df[df['Region'] == region_name]
+        if len(region_df) == 0:
+            warnings.warn(f"No data found for region: {region_name}")
+            return False
+        region_be = region_df['B.E.'].to_numpy()
 
     # Check for reasonable binding energy ranges
-    be_ranges = {
-        'O 1s': (520, 550),
-        'C 1s': (270, 310),
-        'Al 2p': (60, 95),
-        'Zn 2p': (1010, 1060),
-        'N 1s': (390, 410),
-        'Si 2p': (95, 110)
-    }
-
-    if region_name in be_ranges:
-        be_min, be_max = be_ranges[region_name]
-        region_be = region_df['B.E.']
+    if region_name in XPS_BE_RANGES:
+        be_min, be_max = XPS_BE_RANGES[region_name]
         if not ((region_be >= be_min) & (region_be <= be_max)).any():
-            warnings.warn(f"Binding energies for {region_name} outside expected range {be_ranges[region_name]}")
+            warnings.warn(f"Binding energies for {region_name} outside expected range {XPS_BE_RANGES[region_name]}")
             return False
 
     return True
@@ -127,39 +370,101 @@ def get_xps_colors(n_fits=6, colormap='viridis'):
     return [to_hex(color) for color in colors]
 
 
-def calculate_spectral_metrics(be_values, intensity_values):
+def pad_spectra(arrays):
     """
-    Calculate useful spectral metrics for XPS peaks.
+    Stack 1-D arrays of different lengths into a NaN-padded 2-D array.
 
     Args:
-        be_values: Binding energy values
-        intensity_values: Intensity values
+        arrays: Sequence of 1-D arrays
 
     Returns:
-        dict: Dictionary containing spectral metrics
+        (len(arrays), max_length) float array
     """
-    # Find peak position (maximum intensity)
-    max_idx = np.argmax(intensity_values)
-    peak_position = be_values[max_idx]
-    peak_intensity = intensity_values[max_idx]
+    lengths = np.array([len(a) for a in arrays])
+    stacked = np.full((len(arrays), lengths.max(initial=0)), np.nan)
+    stacked[np.arange(stacked.shape[1]) < lengths[:, None]] = np.concatenate(
+        [np.asarray(a, dtype=float) for a in arrays]) if len(arrays) else []
+    return stacked
 
-    # Calculate peak area (trapezoidal integration) - FIXED: Updated from trapz
-    peak_area = np.trapezoid(intensity_values, be_values)
 
-    # Calculate FWHM (Full Width at Half Maximum)
-    half_max = peak_intensity / 2
-    indices_above_half_max = np.where(intensity_values >= half_max)[0]
+def calculate_spectral_metrics_batch(be_values, intensities):
+    """
+    Spectral metrics for a stack of spectra in one vectorized pass.
+
+    FWHM is measured on the main peak: the half-maximum crossings on either
+    side of the maximum are linearly interpolated between samples, so it is
+    not quantized to the step size. Rows may be NaN-padded (see pad_spectra).
+
+    Args:
+        be_values: Binding energy axis, shared (n_points,) or per row (n_spectra, n_points)
+        intensities: (n_spectra, n_points) intensity values
+
+    Returns:
+        dict of (n_spectra,) arrays: 'peak_position', 'peak_intensity',
+        'peak_area', 'fwhm' and 'centroid'
+    """
+    y = np.atleast_2d(np.asarray(intensities, dtype=float))
+    x = np.asarray(be_values, dtype=float)
+    n_spectra, n_points = y.shape
+    rows = np.arange(n_spectra)
 
-    if len(indices_above_half_max) > 1:
-        fwhm = be_values[indices_above_half_max[-1]] - be_values[indices_above_half_max[0]]
+    # NaN padding only needs masking when present
+    padded = not (np.isfinite(y).all() and np.isfinite(x).all())
+    if padded:
+        x = np.broadcast_to(x, y.shape)
+        finite = np.isfinite(y) & np.isfinite(x)
+        y = np.where(finite, y, np.nan)
+        peak_idx = np.argmax(np.where(finite, y, -np.inf), axis=1)
     else:
-        fwhm = np.nan
+        peak_idx = np.argmax(y, axis=1)
 
-    # Calculate centroid (intensity-weighted average) - FIXED: Updated from trapz
-    if peak_area > 0:
-        centroid = np.trapezoid(be_values * intensity_values, be_values) / peak_area
+    def at(values, idx):
+        return values[idx] if values.ndim == 1 else values[rows, idx]
+
+    # Peak position and height
+    peak_position = at(x, peak_idx)
+    peak_intensity = y[rows, peak_idx]
+
+    # Trapezoidal area and first moment as weighted sums (padded points get zero weight)
+    dx = np.diff(x, axis=-1)
+    if padded:
+        dx = np.nan_to_num(dx)
+    weights = np.zeros(x.shape)
+    weights[..., 1:] += dx / 2
+    weights[..., :-1] += dx / 2
+    if padded:
+        filled = np.nan_to_num(y)
+        peak_area = np.einsum('ij,ij->i', filled, weights)
+        moment = np.einsum('ij,ij->i', filled, np.nan_to_num(x) * weights)
     else:
-        centroid = np.nan
+        peak_area = y @ weights
+        moment = y @ (x * weights)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centroid = np.where(peak_area > 0, moment / peak_area, np.nan)
+
+    # Nearest samples below half maximum on each side of the peak (NaN counts as below)
+    half_max = peak_intensity / 2
+    below = ~(y >= half_max[:, None])
+    before_peak = np.arange(n_points) < peak_idx[:, None]
+    left_mask = (below & before_peak)[:, ::-1]
+    right_mask = below & ~before_peak
+    left = np.where(left_mask.any(axis=1), n_points - 1 - np.argmax(left_mask, axis=1), -1)
+    right = np.where(right_mask.any(axis=1), np.argmax(right_mask, axis=1), n_points)
+    left_c = np.clip(left, 0, n_points - 2)
+    right_c = np.clip(right, 1, n_points - 1)
+    has_width = (left >= 0) & (right < n_points)
+    if padded:
+        has_width &= np.isfinite(y[rows, left_c]) & np.isfinite(y[rows, right_c])
+
+    def crossing(i, j):
+        yi, yj = y[rows, i], y[rows, j]
+        xi, xj = at(x, i), at(x, j)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.where(yj != yi, (half_max - yi) / (yj - yi), 0.0)
+        return xi + t * (xj - xi)
+
+    fwhm = np.where(has_width, np.abs(crossing(right_c - 1, right_c) - crossing(left_c, left_c + 1)),
+                    np.nan)
 
     return {
         'peak_position': peak_position,
@@ -170,12 +475,30 @@ def calculate_spectral_metrics(be_values, intensity_values):
     }
 
 
+def calculate_spectral_metrics(be_values, intensity_values):
+    """
+    Calculate useful spectral metrics for XPS peaks.
+
+    Single-spectrum form of calculate_spectral_metrics_batch.
+
+    Args:
+        be_values: Binding energy values
+        intensity_values: Intensity values
+
+    Returns:
+        dict: Dictionary containing spectral metrics
+    """
+    metrics = calculate_spectral_metrics_batch(be_values, [intensity_values])
+    return {key: values[0] for key, values in metrics.items()}
+
+
 def export_spectral_data(dataframes_dict, output_dir='../data/processed/'):
     """
     Export processed XPS data to CSV files for further analysis.
 
     Args:
-        dataframes_dict: Dictionary of {sample_name: DataFrame} containing XPS data
+        dataframes_dict: Dictionary of {sample_name: DataFrame} containing XPS data,
+            or an XPSDataset
         output_dir: Directory to save processed data
     """
     import os
@@ -183,33 +506,1448 @@ def export_spectral_data(dataframes_dict, output_dir='../data/processed/'):
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
 
-    for sample_name, df in dataframes_dict.items():
+    dataset = XPSDataset.coerce(dataframes_dict)
+
+    # Metrics for every (sample, region) in one batched call
+    spectra = [spectrum for spectrum in dataset if len(spectrum) > 0]
+    if spectra:
+        corrected = [background_subtract_normalize(spectrum.raw, spectrum.background, method='max')
+                     for spectrum in spectra]
+        all_metrics = pd.DataFrame(calculate_spectral_metrics_batch(
+            pad_spectra([spectrum.be for spectrum in spectra]), pad_spectra(corrected)))
+        all_metrics['Sample'] = [spectrum.sample for spectrum in spectra]
+        all_metrics['Region'] = [spectrum.region for spectrum in spectra]
+    else:
+        all_metrics = pd.DataFrame(columns=['Sample'])
+
+    for sample_name in dataset.samples:
         # Save raw data
         output_file = os.path.join(output_dir, f"{sample_name}_processed.csv")
-        df.to_csv(output_file, index=False)
+        dataset.frame(sample_name).to_csv(output_file, index=False)
         print(f"✓ Saved processed data: {output_file}")
 
-        # Calculate and save spectral metrics
-        metrics_data = []
-        for region in df['Region'].unique():
-            region_df = df[df['Region'] == region]
-            if len(region_df) > 0:
-                be_values = region_df['B.E.'].values
-                raw_data = region_df['raw'].values
-                background_data = region_df['Background'].values
-
-                # Background-corrected data
-                corrected_data = background_subtract_normalize(raw_data, background_data, method='max')
-
-                # Calculate metrics
-                metrics = calculate_spectral_metrics(be_values, corrected_data)
-                metrics['Sample'] = sample_name
-                metrics['Region'] = region
-                metrics_data.append(metrics)
-
         # Save metrics
-        if metrics_data:
-            metrics_df = pd.DataFrame(metrics_data)
+        metrics_df = all_metrics[all_metrics['Sample'] == sample_name].reset_index(drop=True)
+        if not metrics_df.empty:
             metrics_file = os.path.join(output_dir, f"{sample_name}_metrics.csv")
             metrics_df.to_csv(metrics_file, index=False)
-            print(f"✓ Saved spectral metrics: {metrics_file}")
\ No newline at end of file
+            print(f"✓ Saved spectral metrics: {metrics_file}")
+
+# --- Charge correction and common-grid resampling -------------------------------
+
+# Adventitious carbon C-C/C-H reference used for charge correction
+XPS_CHARGE_REFERENCE = ('C 1s', 284.8)
+
+XPS_GRID_SIGNALS = ('corrected', 'raw', 'envelope', 'background')
+
+
+def _refined_peak(be_values, intensity):
+    """Peak position with parabolic interpolation through the maximum and its neighbours."""
+    i = int(np.nanargmax(intensity))
+    if 0 < i < len(intensity) - 1:
+        y0, y1, y2 = intensity[i - 1:i + 2]
+        curvature = y0 - 2 * y1 + y2
+        if curvature < 0:
+            offset = 0.5 * (y0 - y2) / curvature
+            return be_values[i] + offset * 0.5 * (be_values[i + 1] - be_values[i - 1])
+    return be_values[i]
+
+
+def charge_correction_shifts(data, reference_region=XPS_CHARGE_REFERENCE[0],
+                             reference_be=XPS_CHARGE_REFERENCE[1], method='component'):
+    """
+    Binding-energy shifts that move each sample's reference peak to ``reference_be``.
+
+    Args:
+        data: XPSDataset or dict of {sample_name: DataFrame}
+        reference_region: Region holding the reference peak (default 'C 1s')
+        reference_be: Reference binding energy in eV (default 284.8)
+        method: 'component' uses the lowest-BE fitted component (C-C/C-H for
+            C 1s), falling back to 'peak'; 'peak' uses the maximum of the
+            background-subtracted spectrum
+
+    Returns:
+        dict of {sample_name: shift in eV} to add to the binding energies;
+        samples without the reference region are left out
+    """
+    if method not in ('component', 'peak'):
+        raise ValueError(f"Unknown charge reference method: {method}")
+
+    dataset = XPSDataset.coerce(data)
+    shifts = {}
+    for sample in dataset.samples:
+        spectrum = dataset.get(sample, reference_region)
+        if spectrum is None or len(spectrum) < 3:
+            print(f"  ⚠️  {sample}: no {reference_region} region, no charge correction")
+            continue
+
+        positions = []
+        if method == 'component':
+            for fit in spectrum.fits:
+                component = fit - spectrum.background
+                if np.isfinite(component).any() and np.nanmax(component) > 0:
+                    positions.append(_refined_peak(spectrum.be, np.nan_to_num(component)))
+        if positions:
+            measured = min(positions)
+        else:
+            measured = _refined_peak(spectrum.be, np.nan_to_num(spectrum.raw - spectrum.background))
+        shifts[sample] = float(reference_be - measured)
+    return shifts
+
+
+def _grid_signal(spectrum, signal):
+    if signal == 'corrected':
+        return spectrum.raw - spectrum.background
+    return getattr(spectrum, signal)
+
+
+def _batched_interp(x_query, xs, ys):
+    """
+    Linear interpolation of several sorted curves onto one query axis.
+
+    Each curve is offset into its own disjoint range so a single searchsorted
+    call covers all of them. Points outside a curve's range are NaN.
+
+    Returns:
+        (n_curves, len(x_query)) array
+    """
+    n_curves = len(xs)
+    lengths = np.array([len(x) for x in xs])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    x_all = np.concatenate(xs)
+    y_all = np.concatenate(ys)
+
+    span = max(x_all.max(), x_query.max()) - min(x_all.min(), x_query.min()) + 1.0
+    offsets = span * np.arange(n_curves)
+    keys = x_all + np.repeat(offsets, lengths)
+    queries = x_query[None, :] + offsets[:, None]
+
+    right = np.searchsorted(keys, queries)
+    right = np.clip(right, starts[:, None] + 1, (starts + lengths - 1)[:, None])
+    left = right - 1
+    x0, x1 = keys[left], keys[right]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(x1 > x0, (queries - x0) / (x1 - x0), 0.0)
+    result = y_all[left] + t * (y_all[right] - y_all[left])
+
+    first = np.array([x[0] for x in xs])[:, None]
+    last = np.array([x[-1] for x in xs])[:, None]
+    result[(x_query[None, :] < first) | (x_query[None, :] > last)] = np.nan
+    return result
+
+
+def resample_to_common_grid(data, regions=None, shifts=None, n_points=400, windows=None,
+                            signal='corrected', normalize=None):
+    """
+    Charge-correct every (sample, region) and resample onto shared BE grids.
+
+    Args:
+        data: XPSDataset or dict of {sample_name: DataFrame}
+        regions: Regions to include (default: regions present in every sample)
+        shifts: dict of {sample_name: shift in eV}, 'C 1s' to reference the
+            C 1s component to 284.8 eV, or None for no correction
+        n_points: Grid points per region
+        windows: dict of {region: (min_be, max_be)}; regions without a window
+            use the BE range covered by every shifted sample
+        signal: 'corrected' (raw - Background), 'raw', 'envelope' or 'background'
+        normalize: None, 'max' or 'area' (per sample and region)
+
+    Returns:
+        dict with 'samples', 'regions', 'shifts', 'energy' (n_regions x n_points
+        increasing BE grid) and 'intensity' (n_samples x n_regions x n_points,
+        NaN where a sample does not cover the grid)
+    """
+    if signal not in XPS_GRID_SIGNALS:
+        raise ValueError(f"Unknown signal: {signal}")
+
+    dataset = XPSDataset.coerce(data)
+    samples = dataset.samples
+    if shifts == XPS_CHARGE_REFERENCE[0]:
+        shifts = charge_correction_shifts(dataset)
+    shifts = {sample: float((shifts or {}).get(sample, 0.0)) for sample in samples}
+
+    if regions is None:
+        regions = [region for region in dataset.regions(samples[0])
+                   if all((sample, region) in dataset for sample in samples)] if samples else []
+    windows = windows or {}
+
+    energy = np.full((len(regions), n_points), np.nan)
+    intensity = np.full((len(samples), len(regions), n_points), np.nan)
+    for r, region in enumerate(regions):
+        members = [(s, dataset.get(sample, region)) for s, sample in enumerate(samples)]
+        members = [(s, spectrum) for s, spectrum in members if spectrum is not None and len(spectrum) > 1]
+        if not members:
+            continue
+        xs = [spectrum.be + shifts[spectrum.sample] for _, spectrum in members]
+        ys = [_grid_signal(spectrum, signal) for _, spectrum in members]
+
+        if region in windows:
+            be_min, be_max = windows[region]
+        else:
+            be_min = max(x[0] for x in xs)
+            be_max = min(x[-1] for x in xs)
+        if be_max <= be_min:
+            print(f"  ⚠️  {region}: samples share no BE range, region left empty")
+            continue
+
+        energy[r] = np.linspace(be_min, be_max, n_points)
+        rows = [s for s, _ in members]
+        intensity[rows, r] = _batched_interp(energy[r], xs, ys)
+
+    if normalize == 'max':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            intensity = intensity / np.nanmax(np.abs(intensity), axis=-1, keepdims=True)
+    elif normalize == 'area':
+        step = np.diff(energy, axis=-1).mean(axis=-1)[None, :, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            intensity = intensity / (np.nansum(intensity, axis=-1, keepdims=True) * step)
+    elif normalize is not None:
+        raise ValueError(f"Unknown normalization method: {normalize}")
+
+    return {'samples': samples, 'regions': list(regions), 'shifts': shifts,
+            'energy': energy, 'intensity': intensity}
+
+
+def difference_spectra(grid, reference_sample):
+    """
+    Subtract one sample from every sample of a resample_to_common_grid result.
+
+    Args:
+        grid: dict from resample_to_common_grid
+        reference_sample: Sample to subtract (e.g. the as-deposited film)
+
+    Returns:
+        (n_samples x n_regions x n_points) array of differences
+    """
+    reference = grid['samples'].index(reference_sample)
+    return grid['intensity'] - grid['intensity'][reference]
+
+
+# --- Backgrounds and peak fitting -----------------------------------------------
+
+# Starting models for refitting CasaXPS regions (positions, FWHM and region
+# limits taken from the BTY exports)
+XPS_DEFAULT_MODELS = {
+    'O 1s': {
+        'components': [{'name': 'O 1s A', 'position': 530.90},
+                       {'name': 'O 1s B', 'position': 532.05},
+                       {'name': 'O 1s C', 'position': 533.51}],
+        'lineshape': 'GL(30)', 'fwhm': 1.8, 'shared_fwhm': True, 'position_window': 1.0,
+        'limits': (528.14, 535.54),
+    },
+    'C 1s': {
+        'components': [{'name': 'C 1s A', 'position': 284.80},
+                       {'name': 'C 1s B', 'position': 286.32},
+                       {'name': 'C 1s C', 'position': 287.48},
+                       {'name': 'C 1s D', 'position': 289.01},
+                       {'name': 'C 1s E', 'position': 290.27}],
+        'lineshape': 'GL(30)', 'fwhm': 1.4, 'shared_fwhm': True, 'position_window': 0.8,
+        'limits': (280.54, 292.04),
+    },
+    'Al 2p': {
+        'components': [{'name': 'Al 2p A', 'position': 74.58}],
+        'lineshape': 'GL(30)', 'fwhm': 1.5, 'shared_fwhm': True, 'position_window': 1.5,
+        'limits': (71.34, 77.84),
+    },
+}
+
+_FOUR_LN2 = 4 * np.log(2)
+
+
+# Universal cross-section constant (eV^2) for the Tougaard background
+TOUGAARD_C = 1643.0
+
+
+def _sorted_stack(be_values, intensity):
+    """
+    Sort a spectrum or a stack of spectra by increasing binding energy.
+
+    Returns:
+        (x, Y, order, is_1d) where Y is 2-D (n_spectra x n_points)
+    """
+    be_values = np.asarray(be_values, dtype=np.float64)
+    intensity = np.asarray(intensity, dtype=np.float64)
+    is_1d = intensity.ndim == 1
+    stack = np.atleast_2d(intensity)
+    if stack.ndim != 2 or stack.shape[1] != be_values.shape[0]:
+        raise ValueError("intensity must be (n_points,) or (n_spectra, n_points) "
+                         "matching the binding energy axis")
+    order = np.argsort(be_values, kind='stable')
+    return be_values[order], stack[:, order], order, is_1d
+
+
+def _unsort_stack(background, order, is_1d):
+    result = np.empty_like(background)
+    result[:, order] = background
+    return result[0] if is_1d else result
+
+
+def _endpoint_levels(stack, n_avg):
+    """Mean of the first and last ``n_avg`` points of every row."""
+    n_avg = max(1, min(n_avg, stack.shape[1] // 2))
+    return stack[:, :n_avg].mean(axis=1), stack[:, -n_avg:].mean(axis=1)
+
+
+def _cumulative_trapezoid(signal, dx):
+    """Running trapezoid integral along the last axis, starting at 0."""
+    cumulative = np.zeros_like(signal)
+    np.cumsum(0.5 * (signal[:, 1:] + signal[:, :-1]) * dx, axis=1, out=cumulative[:, 1:])
+    return cumulative
+
+
+def linear_background(be_values, intensity, n_avg=3):
+    """
+    Straight-line background between the averaged end points of a region.
+
+    Args:
+        be_values: Binding energy values (n_points,)
+        intensity: Intensity values (n_points,) or a stack (n_spectra, n_points)
+        n_avg: Number of points averaged at each end
+
+    Returns:
+        Background array with the shape and point order of ``intensity``
+    """
+    x, stack, order, is_1d = _sorted_stack(be_values, intensity)
+    low, high = _endpoint_levels(stack, n_avg)
+    span = x[-1] - x[0]
+    fraction = (x - x[0]) / span if span > 0 else np.zeros_like(x)
+    background = low[:, None] + (high - low)[:, None] * fraction
+    return _unsort_stack(background, order, is_1d)
+
+
+def shirley_background(be_values, intensity, n_avg=3, max_iter=50, tol=1e-6,
+                       return_info=False):
+    """
+    Iterative Shirley background.
+
+    The background at each binding energy is proportional to the peak area
+    at lower binding energy; it is recomputed from the background-subtracted
+    signal until it stops changing. Each iteration is one cumulative sum, and
+    a stack of spectra on a common axis is iterated together, dropping rows
+    from the update as they converge.
+
+    Args:
+        be_values: Binding energy values (n_points,)
+        intensity: Intensity values (n_points,) or a stack (n_spectra, n_points)
+        n_avg: Number of points averaged at each end
+        max_iter: Maximum number of iterations
+        tol: Convergence tolerance relative to the background step height
+        return_info: Also return per-spectrum iteration counts and convergence flags
+
+    Returns:
+        Background array with the shape and point order of ``intensity``, or
+        (background, {'iterations': array, 'converged': array}) with return_info
+    """
+    x, stack, order, is_1d = _sorted_stack(be_values, intensity)
+    low, high = _endpoint_levels(stack, n_avg)
+    step = high - low
+    threshold = tol * np.maximum(np.abs(step), 1e-12)
+
+    n_spectra = stack.shape[0]
+    background = np.repeat(low[:, None], stack.shape[1], axis=1)
+    iterations = np.zeros(n_spectra, dtype=int)
+    converged = np.zeros(n_spectra, dtype=bool)
+    active = np.arange(n_spectra)
+    dx = np.diff(x)
+
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        cumulative = _cumulative_trapezoid(stack[active] - background[active], dx)
+        total = cumulative[:, -1]
+        flat = total == 0
+        scale = np.divide(step[active], total, out=np.zeros_like(total), where=~flat)
+        updated = low[active, None] + scale[:, None] * cumulative
+        updated[flat] = background[active[flat]]
+
+        change = np.max(np.abs(updated - background[active]), axis=1)
+        background[active] = updated
+        iterations[active] += 1
+
+        done = flat | (change <= threshold[active])
+        converged[active[done]] = True
+        active = active[~done]
+
+    background = _unsort_stack(background, order, is_1d)
+    if return_info:
+        info = {'iterations': iterations, 'converged': converged}
+        if is_1d:
+            info = {key: value[0] for key, value in info.items()}
+        return background, info
+    return background
+
+
+def _tougaard_loss(x, signal, C):
+    """
+    Loss integral  sum_j K(E_i - E_j) * signal_j * dE  over lower binding
+    energies, with the universal kernel K(T) = T / (C + T^2)^2.
+
+    Uses an FFT convolution on a uniform axis and a direct O(n^2) sum
+    otherwise.
+    """
+    n_points = x.size
+    dx = np.diff(x)
+    uniform = n_points > 2 and np.allclose(dx, dx[0], rtol=1e-6, atol=0)
+
+    if uniform:
+        step = dx[0]
+        T = step * np.arange(n_points)
+        kernel = T / (C + T ** 2) ** 2
+        n_fft = 1 << int(2 * n_points - 1).bit_length()
+        spectrum = np.fft.rfft(signal, n_fft, axis=1) * np.fft.rfft(kernel, n_fft)
+        return np.fft.irfft(spectrum, n_fft, axis=1)[:, :n_points] * step
+
+    T = x[:, None] - x[None, :]
+    if n_points > 1:
+        weights = np.concatenate([[dx[0]], 0.5 * (dx[1:] + dx[:-1]), [dx[-1]]])
+    else:
+        weights = np.ones(1)
+    kernel = np.where(T > 0, T / (C + T ** 2) ** 2, 0.0) * weights
+    return signal @ kernel.T
+
+
+def tougaard_background(be_values, intensity, C=TOUGAARD_C, n_avg=3, return_info=False):
+    """
+    Tougaard background with the two-parameter universal cross-section.
+
+    The inelastic loss at each binding energy is the signal at lower binding
+    energy convolved with K(T) = B * T / (C + T^2)^2. B is scaled per spectrum
+    so the background meets the averaged high-binding-energy end.
+
+    Args:
+        be_values: Binding energy values (n_points,)
+        intensity: Intensity values (n_points,) or a stack (n_spectra, n_points)
+        C: Cross-section constant in eV^2 (1643 for the universal cross-section)
+        n_avg: Number of points averaged at each end
+        return_info: Also return the fitted B coefficient(s)
+
+    Returns:
+        Background array with the shape and point order of ``intensity``, or
+        (background, {'B': coefficient(s)}) with return_info
+    """
+    x, stack, order, is_1d = _sorted_stack(be_values, intensity)
+    low, high = _endpoint_levels(stack, n_avg)
+
+    loss = _tougaard_loss(x, stack - low[:, None], C)
+    end_loss = loss[:, -1]
+    B = np.divide(high - low, end_loss, out=np.zeros_like(end_loss), where=end_loss != 0)
+    background = low[:, None] + B[:, None] * loss
+
+    background = _unsort_stack(background, order, is_1d)
+    if return_info:
+        return background, {'B': B[0] if is_1d else B}
+    return background
+
+
+def xps_background(be_values, intensity, method='shirley', **kwargs):
+    """
+    Compute a background by name ('shirley', 'tougaard' or 'linear').
+
+    Args:
+        be_values: Binding energy values (n_points,)
+        intensity: Intensity values (n_points,) or a stack (n_spectra, n_points)
+        method: Background algorithm
+        **kwargs: Options for the background function
+
+    Returns:
+        Background array with the shape and point order of ``intensity``
+    """
+    methods = {'shirley': shirley_background, 'tougaard': tougaard_background,
+               'linear': linear_background}
+    if method not in methods:
+        raise ValueError(f"Unknown background method: {method}")
+    return methods[method](be_values, intensity, **kwargs)
+
+
+def parse_lineshape(lineshape):
+    """
+    Parse a CasaXPS-style lineshape string.
+
+    'GL(m)' is the Gaussian-Lorentzian product and 'SGL(m)' (alias 'PV(m)') the
+    Gaussian-Lorentzian sum, i.e. a pseudo-Voigt with Lorentzian fraction m/100.
+
+    Returns:
+        (is_sum, lorentzian_fraction)
+    """
+    text = str(lineshape).strip().upper()
+    kind, _, rest = text.partition('(')
+    mix = float(rest.rstrip(')')) / 100 if rest else 0.3
+    if kind not in ('GL', 'SGL', 'PV'):
+        raise ValueError(f"Unsupported lineshape: {lineshape}")
+    return kind != 'GL', min(max(mix, 0.0), 1.0)
+
+
+def _lineshape_profiles(u, is_sum, mix):
+    """
+    Unit-height profiles and their derivative with respect to u = (x - E) / FWHM.
+
+    ``u`` is (n_points, n_components); ``is_sum`` and ``mix`` are per component.
+    """
+    u2 = u * u
+
+    # Gaussian-Lorentzian product
+    a = _FOUR_LN2 * (1 - mix)
+    b = 4 * mix
+    denom = 1 + b * u2
+    product = np.exp(-a * u2) / denom
+    d_product = product * (-2 * a * u - 2 * b * u / denom)
+
+    # Gaussian-Lorentzian sum (pseudo-Voigt)
+    gauss = np.exp(-_FOUR_LN2 * u2)
+    lorentz = 1 / (1 + 4 * u2)
+    pseudo_voigt = mix * lorentz + (1 - mix) * gauss
+    d_pseudo_voigt = mix * (-8 * u * lorentz ** 2) + (1 - mix) * (-2 * _FOUR_LN2 * u * gauss)
+
+    return np.where(is_sum, pseudo_voigt, product), np.where(is_sum, d_pseudo_voigt, d_product)
+
+
+class _CompiledModel:
+    """
+    Parameter bookkeeping for a multi-component region model.
+
+    Parameter vector: free positions, FWHMs (one if shared), amplitudes.
+    Linked positions (``'link': (other_name, offset)``) follow their reference
+    component, and the selection matrices map parameters to components so the
+    Jacobian is assembled with matrix products.
+    """
+
+    def __init__(self, model):
+        components = model['components']
+        names = [c['name'] for c in components]
+        k = len(components)
+        self.names = names
+        self.lineshapes = [c.get('lineshape', model.get('lineshape', 'GL(30)')) for c in components]
+        parsed = [parse_lineshape(ls) for ls in self.lineshapes]
+        self.is_sum = np.array([p[0] for p in parsed])
+        self.mix = np.array([p[1] for p in parsed])
+
+        window = model.get('position_window', 1.0)
+        free = [i for i, c in enumerate(components) if 'link' not in c]
+        self.position_map = np.zeros((k, len(free)))
+        self.position_offset = np.zeros(k)
+        position_bounds = []
+        for j, i in enumerate(free):
+            self.position_map[i, j] = 1.0
+            c = components[i]
+            position_bounds.append(c.get('bounds', (c['position'] - window, c['position'] + window)))
+        for i, c in enumerate(components):
+            if 'link' in c:
+                ref_name, offset = c['link']
+                ref = names.index(ref_name)
+                if ref not in free:
+                    raise ValueError(f"Component '{c['name']}' links to linked component '{ref_name}'")
+                self.position_map[i, free.index(ref)] = 1.0
+                self.position_offset[i] = offset
+
+        shared = model.get('shared_fwhm', True)
+        n_fwhm = 1 if shared else k
+        self.fwhm_map = np.ones((k, 1)) if shared else np.eye(k)
+        fwhm0 = model.get('fwhm', 1.5)
+        fwhm_bounds = model.get('fwhm_bounds', (0.3, 4.0))
+
+        self.n_pos, self.n_fwhm, self.k = len(free), n_fwhm, k
+        self.p0_positions = np.array([components[i]['position'] for i in free], dtype=np.float64)
+        self.p0_fwhm = np.full(n_fwhm, fwhm0, dtype=np.float64)
+        lower = [b[0] for b in position_bounds] + [fwhm_bounds[0]] * n_fwhm + [0.0] * k
+        upper = [b[1] for b in position_bounds] + [fwhm_bounds[1]] * n_fwhm + [np.inf] * k
+        self.bounds = (np.array(lower, dtype=np.float64), np.array(upper, dtype=np.float64))
+
+    def split(self, p):
+        positions = self.position_map @ p[:self.n_pos] + self.position_offset
+        fwhm = self.fwhm_map @ p[self.n_pos:self.n_pos + self.n_fwhm]
+        amplitudes = p[self.n_pos + self.n_fwhm:]
+        return positions, fwhm, amplitudes
+
+    def evaluate(self, x, p, jacobian=False):
+        """Component matrix (n_points, k) and optionally d(envelope)/dp."""
+        positions, fwhm, amplitudes = self.split(p)
+        u = (x[:, None] - positions) / fwhm
+        g, dg = _lineshape_profiles(u, self.is_sum, self.mix)
+        components = amplitudes * g
+        if not jacobian:
+            return components, None
+        d_position = amplitudes * dg * (-1 / fwhm)
+        d_fwhm = amplitudes * dg * (-u / fwhm)
+        jac = np.hstack([d_position @ self.position_map, d_fwhm @ self.fwhm_map, g])
+        return components, jac
+
+
+def fit_xps_region(be_values, raw_values, model, background='shirley', weights=None):
+    """
+    Fit a multi-component peak model to one XPS region.
+
+    The background is computed first (Shirley, linear, or a given array) and
+    the components are fitted to the background-subtracted signal by bounded
+    least squares with an analytic Jacobian. As in CasaXPS, only points inside
+    the model's 'limits' are used; outside them the background equals the raw
+    data and the components are zero.
+
+    Args:
+        be_values: Binding energy values
+        raw_values: Raw intensity values
+        model: dict with 'components' (each with 'name', 'position' and optional
+            'bounds', 'link': (name, offset) or 'lineshape'), plus optional
+            'lineshape', 'fwhm', 'shared_fwhm', 'fwhm_bounds', 'position_window'
+            and 'limits': (min_be, max_be)
+        background: 'shirley', 'linear' or a background array
+        weights: None for unweighted, 'poisson' for 1/sqrt(counts), or an array
+
+    Returns:
+        dict with 'be', 'raw', 'background', 'components' (k x n), 'envelope',
+        'parameters' (DataFrame, one row per component), 'statistics' and 'success'
+    """
+    from scipy.optimize import least_squares
+
+    be_all = np.asarray(be_values, dtype=np.float64)
+    raw_all = np.asarray(raw_values, dtype=np.float64)
+    inside = np.ones(len(be_all), dtype=bool)
+    if model.get('limits') is not None:
+        low, high = model['limits']
+        inside = (be_all >= low) & (be_all <= high)
+        if inside.sum() < 3:
+            raise ValueError(f"Fewer than 3 points inside limits {model['limits']}")
+
+    x, raw = be_all[inside], raw_all[inside]
+    bg_all = raw_all.copy()
+    if isinstance(background, str):
+        bg_all[inside] = xps_background(x, raw, method=background)
+    else:
+        bg_all = np.asarray(background, dtype=np.float64)
+    bg = bg_all[inside]
+    y = raw - bg
+
+    if weights is None:
+        w = np.ones_like(y)
+    elif isinstance(weights, str) and weights == 'poisson':
+        w = 1 / np.sqrt(np.maximum(raw, 1.0))
+    else:
+        w = np.asarray(weights, dtype=np.float64)[inside]
+
+    compiled = _CompiledModel(model)
+    order = np.argsort(x)
+    start_heights = np.interp(compiled.position_map @ compiled.p0_positions + compiled.position_offset,
+                              x[order], y[order])
+    start_heights = np.maximum(0.5 * start_heights, 1e-6 * max(np.max(y), 1.0))
+    p0 = np.concatenate([compiled.p0_positions, compiled.p0_fwhm, start_heights])
+    p0 = np.clip(p0, compiled.bounds[0], compiled.bounds[1])
+
+    def residuals(p):
+        components, _ = compiled.evaluate(x, p)
+        return (components.sum(axis=1) - y) * w
+
+    def jacobian(p):
+        _, jac = compiled.evaluate(x, p, jacobian=True)
+        return jac * w[:, None]
+
+    fit = least_squares(residuals, p0, jac=jacobian, bounds=compiled.bounds,
+                        method='trf', x_scale='jac')
+
+    components, _ = compiled.evaluate(x, fit.x)
+    positions, fwhm, amplitudes = compiled.split(fit.x)
+
+    n, n_params = len(x), len(fit.x)
+    dof = max(n - n_params, 1)
+    chi2 = float(np.sum(fit.fun ** 2))
+    try:
+        covariance = np.linalg.pinv(fit.jac.T @ fit.jac) * chi2 / dof
+        stderr = np.sqrt(np.clip(np.diag(covariance), 0, None))
+    except np.linalg.LinAlgError:
+        stderr = np.full(n_params, np.nan)
+
+    position_err = np.sqrt((compiled.position_map ** 2) @ stderr[:compiled.n_pos] ** 2)
+    fwhm_err = compiled.fwhm_map @ stderr[compiled.n_pos:compiled.n_pos + compiled.n_fwhm]
+    amplitude_err = stderr[compiled.n_pos + compiled.n_fwhm:]
+    areas = np.abs(np.trapezoid(components[order], x[order], axis=0))
+
+    parameters = pd.DataFrame({
+        'Component': compiled.names,
+        'Lineshape': compiled.lineshapes,
+        'Position_eV': positions,
+        'Position_err': position_err,
+        'FWHM_eV': fwhm,
+        'FWHM_err': fwhm_err,
+        'Amplitude': amplitudes,
+        'Amplitude_err': amplitude_err,
+        'Area': areas,
+    })
+    residual = components.sum(axis=1) - y
+
+    components_all = np.zeros((len(be_all), compiled.k))
+    components_all[inside] = components
+
+    return {
+        'be': be_all,
+        'raw': raw_all,
+        'background': bg_all,
+        'components': components_all.T,
+        'envelope': bg_all + components_all.sum(axis=1),
+        'parameters': parameters,
+        'statistics': {
+            'chi2': chi2,
+            'reduced_chi2': chi2 / dof,
+            'residual_rms': float(np.sqrt(np.mean(residual ** 2))),
+            'n_points': n,
+            'n_parameters': n_params,
+            'nfev': int(fit.nfev),
+        },
+        'success': bool(fit.success),
+    }
+
+
+def fit_result_to_frame(result, region):
+    """
+    Convert a fit_xps_region result to the parser's column layout.
+
+    Fit columns hold background + component, matching the CasaXPS exports that
+    the plotting code normalizes; unused fit columns are NaN.
+
+    Args:
+        result: dict returned by fit_xps_region
+        region: Region name for the 'Region' column
+
+    Returns:
+        DataFrame with XPS_OUTPUT_COLUMNS
+    """
+    n_fits = len(XPS_FIT_COLUMNS)
+    components = result['components']
+    if len(components) > n_fits:
+        warnings.warn(f"{region}: {len(components)} components, only the first {n_fits} are kept")
+
+    df = pd.DataFrame({'B.E.': result['be'], 'raw': result['raw']})
+    for i, col in enumerate(XPS_FIT_COLUMNS):
+        df[col] = result['background'] + components[i] if i < len(components) else np.nan
+    df['Envelope'] = result['envelope']
+    df['Background'] = result['background']
+    df['Region'] = region
+    return df
+
+
+def _fit_region_task(task):
+    sample, region, be_values, raw_values, model, background, weights = task
+    try:
+        return sample, region, fit_xps_region(be_values, raw_values, model, background, weights), None
+    except Exception as e:
+        return sample, region, None, str(e)
+
+
+def fit_xps_dataset(all_dataframes, models=None, background='shirley', weights=None,
+                    processes=None, store=None):
+    """
+    Refit every (sample, region) pair in a process pool.
+
+    With a fit store, spectra whose data and model hash to a stored fit are
+    read back instead of refitted, and new fits are added to the store.
+
+    Args:
+        all_dataframes: dict of {sample_name: DataFrame} from process_xps_file,
+            or an XPSDataset
+        models: dict of {region: model} (default: XPS_DEFAULT_MODELS); regions
+            without a model are skipped
+        background: Background method for every region
+        weights: Residual weighting passed to fit_xps_region
+        processes: Worker processes (None for CPU count, 1 for serial)
+        store: XPSFitStore or path of one (None to always refit)
+
+    Returns:
+        (fitted, parameters): dict of {sample_name: DataFrame} in the parser's
+        column layout, and one DataFrame of component parameters for all fits
+    """
+    from .parallel import parallel_map
+
+    models = XPS_DEFAULT_MODELS if models is None else models
+    tasks = [(spectrum.sample, spectrum.region, spectrum.be, spectrum.raw,
+              models[spectrum.region], background, weights)
+             for spectrum in XPSDataset.coerce(all_dataframes) if spectrum.region in models]
+
+    task_order = [task[:2] for task in tasks]
+    cached, keys = {}, {}
+    if store is not None:
+        from .xps_fit_store import XPSFitStore, fit_key
+        if not isinstance(store, XPSFitStore):
+            store = XPSFitStore(store)
+        for task in tasks:
+            keys[task[:2]] = fit_key(*task[2:])
+            result = store.get(task[0], task[1], keys[task[:2]][0])
+            if result is not None:
+                cached[task[:2]] = result
+        tasks = [task for task in tasks if task[:2] not in cached]
+        print(f"  Fit store: {len(cached)} cached, {len(tasks)} to fit")
+
+    results = parallel_map(_fit_region_task, tasks, processes=processes)
+
+    if store is not None:
+        for sample, region, result, error in results:
+            if error is None:
+                key, data_hash, model_hash = keys[sample, region]
+                store.put(sample, region, key, result, data_hash, model_hash, background,
+                          models[region].get('limits'))
+        store.save()
+    results = {(sample, region): (sample, region, result, error)
+               for sample, region, result, error in results}
+    results.update({pair: pair + (result, None) for pair, result in cached.items()})
+    results = [results[pair] for pair in task_order]
+
+    frames, parameter_tables = {}, []
+    for sample, region, result, error in results:
+        if error is not None:
+            print(f"  ✗ Fit failed for {sample} {region}: {error}")
+            continue
+        frames.setdefault(sample, []).append(fit_result_to_frame(result, region))
+        params = result['parameters'].copy()
+        params.insert(0, 'Region', region)
+        params.insert(0, 'Sample', sample)
+        for key in ('reduced_chi2', 'residual_rms'):
+            params[key] = result['statistics'][key]
+        parameter_tables.append(params)
+
+    fitted = {sample: pd.concat(parts, ignore_index=True) for sample, parts in frames.items()}
+    parameters = pd.concat(parameter_tables, ignore_index=True) if parameter_tables else pd.DataFrame()
+    return fitted, parameters
+
+
+# --- CasaXPS export layout detection ------------------------------------------
+
+# Labels in the first column of the component table above the data columns
+CASAXPS_COMPONENT_ROWS = {'Name': 'name', 'Position': 'position', 'FWHM': 'fwhm',
+                          'Area': 'area', 'Lineshape': 'lineshape'}
+
+# Detected layouts keyed by (path, mtime, size) of the export
+_LAYOUT_BY_FILE = {}
+
+_CASAXPS_REGION_PATTERN = re.compile(r'(?:^|:)\s*([A-Z][a-z]?\s*\d[spdf](?:\d/2)?)\s*/')
+
+
+def _header_cell(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    return str(value).strip()
+
+
+def _casaxps_region_name(*labels):
+    """Region name from column labels such as 'Cycle 16:O 1s/53:CPS'."""
+    for label in labels:
+        match = _CASAXPS_REGION_PATTERN.search(label)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _header_signature(be_row):
+    """Column-kind tuple of the B.E. header row, independent of cycle/block numbers."""
+    kinds = []
+    for cell in be_row:
+        if cell in ('B.E.', 'Background', 'Envelope', ''):
+            kinds.append(cell)
+        elif cell.endswith('CPS'):
+            kinds.append(f"CPS:{_casaxps_region_name(cell)}")
+        else:
+            kinds.append(f"fit:{_casaxps_region_name(cell)}")
+    return tuple(kinds)
+
+
+def detect_casaxps_layout(header_rows):
+    """
+    Derive every region's column map from the header rows of a CasaXPS export.
+
+    The B.E. row marks the start of each region block; within a block the
+    columns are raw (CPS), one column per fit component, Background and
+    Envelope. Component names, positions, FWHM, areas and lineshapes are read
+    from the Name/Position/FWHM/Area/Lineshape rows above.
+
+    Args:
+        header_rows: Rows of cell values from the top of the export, up to
+            and including the B.E. row
+
+    Returns:
+        dict with 'header_row', 'data_start', 'signature' and 'regions' (a
+        list of dicts with 'name', 'be_col', 'raw_col', 'fit_cols', 'bg_col',
+        'env_col' and 'components'), or None if no B.E. row is found
+    """
+    rows = [[_header_cell(value) for value in row] for row in header_rows]
+    be_row_idx = next((i for i, row in enumerate(rows) if 'B.E.' in row), None)
+    if be_row_idx is None:
+        return None
+
+    be_row = rows[be_row_idx]
+    table_rows = {}
+    for i, row in enumerate(rows[:be_row_idx]):
+        for cell in row:
+            if cell in CASAXPS_COMPONENT_ROWS:
+                table_rows[CASAXPS_COMPONENT_ROWS[cell]] = row
+                break
+
+    def table_value(key, col):
+        row = table_rows.get(key)
+        return row[col] if row is not None and col < len(row) else ''
+
+    regions = []
+    starts = [col for col, cell in enumerate(be_row) if cell == 'B.E.']
+    for block_idx, be_col in enumerate(starts):
+        end = starts[block_idx + 1] if block_idx + 1 < len(starts) else len(be_row)
+        block = [col for col in range(be_col + 1, end) if be_row[col]]
+        if not block:
+            continue
+
+        raw_col = next((col for col in block if be_row[col].endswith('CPS')), block[0])
+        bg_col = next((col for col in block if be_row[col] == 'Background'), None)
+        env_col = next((col for col in block if be_row[col] == 'Envelope'), None)
+        fit_cols = [col for col in block if col not in (raw_col, bg_col, env_col)]
+
+        name = (_casaxps_region_name(be_row[raw_col], *(be_row[col] for col in fit_cols))
+                or next((table_value('name', col) for col in fit_cols if table_value('name', col)), None))
+        if name is None:
+            print(f"  ⚠️  Block at column {be_col}: no region name in the headers, skipped")
+            continue
+        if bg_col is None or env_col is None:
+            print(f"  ⚠️  {name}: no Background/Envelope columns, region skipped")
+            continue
+
+        components = []
+        for col in fit_cols:
+            component = {'column': col, 'name': table_value('name', col) or name,
+                         'lineshape': table_value('lineshape', col)}
+            for key in ('position', 'fwhm', 'area'):
+                try:
+                    component[key] = float(table_value(key, col))
+                except ValueError:
+                    component[key] = np.nan
+            components.append(component)
+
+        regions.append({'name': name, 'be_col': be_col, 'raw_col': raw_col,
+                        'fit_cols': fit_cols, 'bg_col': bg_col, 'env_col': env_col,
+                        'components': components})
+
+    return {'header_row': be_row_idx, 'data_start': be_row_idx + 1,
+            'signature': _header_signature(be_row), 'regions': regions}
+
+
+def file_content_hash(filepath, chunk_size=1 << 20):
+    """BLAKE2 digest of a file's bytes."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_csv_header_rows(filepath, max_rows=50):
+    rows = []
+    with open(filepath, newline='', encoding='utf-8-sig', errors='replace') as f:
+        for row in csv.reader(f):
+            rows.append(row)
+            if 'B.E.' in (cell.strip() for cell in row) or len(rows) >= max_rows:
+                break
+    return rows
+
+
+def read_casaxps_export(filepath, use_cache=True):
+    """
+    Read a CasaXPS .xlsx/.xls or .csv export and detect its column layout.
+
+    The layout is cached under the file's path, modification time and size
+    (a stat call, not a read of the file), so re-reading an unchanged export
+    skips detection; its 'signature' groups exports that share a column
+    template. CSV data rows are parsed directly as floats, which is much
+    faster than reading the workbook.
+
+    Args:
+        filepath: Path to the export
+        use_cache: Reuse cached layouts
+
+    Returns:
+        (data_rows, layout): header=None DataFrame of the rows below the B.E.
+        row, and the layout dict from detect_casaxps_layout
+    Raises:
+        ValueError: Unsupported extension or no B.E. header row
+    """
+    filepath = str(filepath)
+    is_csv = filepath.lower().endswith('.csv')
+    if not is_csv and not filepath.lower().endswith(('.xlsx', '.xls')):
+        raise ValueError(f"Unsupported CasaXPS export format: {filepath}")
+
+    file_key = None
+    if use_cache:
+        stat = os.stat(filepath)
+        file_key = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+    layout = _LAYOUT_BY_FILE.get(file_key)
+
+    if is_csv:
+        if layout is None:
+            layout = detect_casaxps_layout(_read_csv_header_rows(filepath))
+        if layout is None:
+            raise ValueError(f"No B.E. header row found in {filepath}")
+        data_rows = pd.read_csv(filepath, header=None, skiprows=layout['data_start'],
+                                skip_blank_lines=False)
+    else:
+        sheet = pd.read_excel(filepath, header=None)
+        if layout is None:
+            layout = detect_casaxps_layout(sheet.iloc[:50].itertuples(index=False))
+        if layout is None:
+            raise ValueError(f"No B.E. header row found in {filepath}")
+        data_rows = sheet.iloc[layout['data_start']:]
+
+    if use_cache:
+        _LAYOUT_BY_FILE[file_key] = layout
+    return data_rows, layout
+
+
+# --- Multi-sample discovery and loading ---------------------------------------
+
+# Treatment suffixes of sample names such as 'BTY_AD', in plotting order, and
+# their labels; the one table used by discovery, figures and quantification
+XPS_TREATMENT_LABELS = {
+    'AD': 'As Deposited',
+    'UV': 'UV Treated',
+    'H2O': 'Water Exposed',
+    'UV_H2O': 'UV + Water',
+}
+XPS_TREATMENT_ORDER = list(XPS_TREATMENT_LABELS)
+
+# Sheet names of the long-format *_final workbooks, mapped to treatment
+# suffixes: a suffix, its label, or one of the short spellings used in sheets
+XPS_SHEET_TREATMENTS = {
+    **{suffix: suffix for suffix in XPS_TREATMENT_LABELS},
+    **{label: suffix for suffix, label in XPS_TREATMENT_LABELS.items()},
+    'AsDeposited': 'AD',
+    'Water': 'H2O',
+    'UV_Water': 'UV_H2O',
+}
+
+# Outputs written next to the exports that must not be picked up as samples
+_XPS_OUTPUT_SUFFIXES = ('_processed', '_metrics')
+
+
+def discover_xps_datasets(search_dirs, organics=None):
+    """
+    Find every organic x treatment XPS dataset in a list of directories.
+
+    CasaXPS exports named ORGANIC_TREATMENT.csv/.xlsx are found first, then
+    the sheets of long-format ORGANIC_final*.xlsx workbooks (one sheet per
+    treatment). Each (organic, treatment) pair is taken from the first
+    source found: earlier directories win, and within a directory .csv wins
+    over .xlsx. ' - Copy' files are ignored.
+
+    Args:
+        search_dirs: Directories in priority order
+        organics: Organic names to accept (default: config.organics)
+
+    Returns:
+        list of dicts with 'sample', 'organic', 'treatment', 'path' and
+        'sheet' (None for CasaXPS exports)
+    """
+    if organics is None:
+        from .config import organics
+
+    format_priority = {'.csv': 0, '.xlsx': 1, '.xls': 2}
+    exports, workbooks = [], []
+    for directory in search_dirs:
+        directory = Path(directory)
+        if not directory.is_dir():
+            continue
+        candidates = [f for f in directory.iterdir()
+                      if f.suffix.lower() in format_priority and ' - Copy' not in f.stem
+                      and not f.name.startswith('~$')]
+        for path in sorted(candidates, key=lambda f: (f.stem, format_priority[f.suffix.lower()])):
+            organic, _, treatment = path.stem.partition('_')
+            if organic not in organics or not treatment or treatment.endswith(_XPS_OUTPUT_SUFFIXES):
+                continue
+            if treatment.lower().startswith('final'):
+                if path.suffix.lower() != '.csv':
+                    workbooks.append((organic, path))
+            else:
+                exports.append((organic, treatment, path))
+
+    datasets = {}
+    for organic, treatment, path in exports:
+        datasets.setdefault((organic, treatment), {
+            'sample': f"{organic}_{treatment}", 'organic': organic, 'treatment': treatment,
+            'path': str(path), 'sheet': None})
+
+    for organic, path in workbooks:
+        sheets = pd.ExcelFile(path).sheet_names
+        for sheet in sheets:
+            treatment = XPS_SHEET_TREATMENTS.get(sheet.strip())
+            if treatment is None:
+                print(f"  ⚠️ Skipping {path.name}[{sheet}]: unknown treatment sheet name")
+                continue
+            datasets.setdefault((organic, treatment), {
+                'sample': f"{organic}_{treatment}", 'organic': organic, 'treatment': treatment,
+                'path': str(path), 'sheet': sheet})
+
+    return list(datasets.values())
+
+
+def _read_long_format_sheet(filepath, sheet):
+    """Read a sheet already in the parser's column layout (B.E., raw, fit1.., Region)."""
+    table = pd.read_excel(filepath, sheet_name=sheet)
+    missing = [col for col in XPS_OUTPUT_COLUMNS if col not in table.columns]
+    if missing:
+        raise ValueError(f"{Path(filepath).name}[{sheet}] is missing columns {missing}")
+    df = table[XPS_OUTPUT_COLUMNS].copy()
+    numeric = XPS_OUTPUT_COLUMNS[:-1]
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors='coerce')
+    df = df.dropna(subset=['B.E.', 'raw', 'Region']).reset_index(drop=True)
+    df['Region'] = df['Region'].astype(str).str.strip()
+    return df
+
+
+def _load_xps_source(filepath, sheet, content_hash):
+    # content_hash is part of the cache key only
+    if sheet is None:
+        data_rows, layout = read_casaxps_export(filepath)
+        return extract_xps_regions(data_rows, layout['regions'])
+    return _read_long_format_sheet(filepath, sheet)
+
+
+def _cached_xps_source():
+    from .cache import disk_cache
+    return disk_cache(name='xps_samples', version=1)(_load_xps_source)
+
+
+def load_xps_sample(entry, use_cache=True):
+    """
+    Load one discovered dataset into the parser's long-format frame.
+
+    Results are cached on disk under the file's content hash, so unchanged
+    exports are not re-parsed on the next run.
+
+    Args:
+        entry: dict from discover_xps_datasets
+        use_cache: Use the disk cache
+
+    Returns:
+        (sample, DataFrame or None, error message or None)
+    """
+    try:
+        loader = _cached_xps_source() if use_cache else _load_xps_source
+        df = loader(entry['path'], entry['sheet'], file_content_hash(entry['path']))
+        return entry['sample'], df, None
+    except Exception as e:
+        return entry['sample'], None, str(e)
+
+
+def load_xps_samples(entries, processes=None, use_cache=True):
+    """
+    Load many discovered datasets in a process pool.
+
+    Args:
+        entries: list of dicts from discover_xps_datasets
+        processes: Worker processes (None for CPU count, 1 for serial)
+        use_cache: Use the per-sample disk cache
+
+    Returns:
+        dict of {sample_name: DataFrame} in discovery order; failures are
+        reported and left out
+    """
+    from .parallel import parallel_map
+
+    results = parallel_map(functools.partial(load_xps_sample, use_cache=use_cache), entries,
+                           processes=processes)
+    frames = {}
+    for sample, df, error in results:
+        if error is not None:
+            print(f"  ✗ {sample}: {error}")
+        elif df is None or df.empty:
+            print(f"  ✗ {sample}: no XPS data found")
+        else:
+            frames[sample] = df
+    return frames
+
+
+# --- VAMAS (.vms) reader ------------------------------------------------------
+#
+# ISO 14976 "VAMAS Surface Chemical Analysis Standard Data Transfer Format", as
+# written by CasaXPS / Kratos. Every field is one line; the presence of some
+# fields depends on the experiment mode and technique declared in the header.
+
+_VAMAS_MAP_MODES = ('MAP', 'MAPDP')
+_VAMAS_REGION_MODES = ('MAP', 'MAPDP', 'NORM', 'SDP')
+_VAMAS_FOV_MODES = ('MAP', 'MAPDP', 'MAPSV', 'MAPSVDP', 'SEM')
+_VAMAS_LINESCAN_MODES = ('MAPSV', 'MAPSVDP', 'SEM')
+_VAMAS_SPUTTER_MODES = ('MAPDP', 'MAPSVDP', 'SDP', 'SDPSV')
+_VAMAS_ION_TECHNIQUES = ('FABMS', 'FABMS energy spec', 'ISS', 'SIMS', 'SIMS energy spec',
+                         'SNMS', 'SNMS energy spec')
+_VAMAS_ELECTRON_TECHNIQUES = ('AES diff', 'AES dir', 'EDX', 'ELS', 'UPS', 'XPS', 'XRF')
+
+_VAMAS_BLOCK_CACHE_SIZE = 64
+
+
+class _LineReader:
+    """Line-by-line reader over a binary file that tracks byte offsets."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def text(self):
+        line = self.f.readline()
+        if not line:
+            raise ValueError("Unexpected end of VAMAS file")
+        return line.decode('latin-1').rstrip('\r\n')
+
+    def int(self):
+        return int(float(self.text()))
+
+    def float(self):
+        return float(self.text())
+
+    def skip(self, n):
+        for _ in range(n):
+            self.f.readline()
+
+    def tell(self):
+        return self.f.tell()
+
+
+def _parse_vamas_comment(lines):
+    """Pull acquisition time and sweeps out of a CasaXPS block comment."""
+    import re
+
+    info = {}
+    text = ' '.join(lines)
+    for key, pattern in [('acquisition_time_s', r'Acqn\. Time\(s\):\s*([\d.]+)'),
+                         ('sweeps', r'Sweeps:\s*(\d+)'),
+                         ('step_meV', r'Step\(meV\):\s*([\d.]+)')]:
+        match = re.search(pattern, text)
+        if match:
+            info[key] = float(match.group(1))
+    if 'sweeps' in info:
+        info['sweeps'] = int(info['sweeps'])
+    return info
+
+
+def _read_vamas_block_header(r, header, offset):
+    """Parse one block up to its ordinate values; returns the block metadata dict."""
+    exp_mode = header['experiment_mode']
+    block = {'offset': offset, 'block_id': r.text(), 'sample_id': r.text()}
+    year, month, day, hour, minute, second = (r.int() for _ in range(6))
+    block['acquired'] = f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
+    r.skip(1)  # hours in advance of GMT
+
+    comment = [r.text() for _ in range(r.int())]
+    block['comment'] = comment
+    block.update(_parse_vamas_comment(comment))
+
+    technique = r.text()
+    block['technique'] = technique
+    if exp_mode in _VAMAS_MAP_MODES:
+        r.skip(2)  # x, y coordinates
+    r.skip(len(header['experimental_variables']))
+    block['source_label'] = r.text()
+    if exp_mode in _VAMAS_SPUTTER_MODES or technique in _VAMAS_ION_TECHNIQUES:
+        r.skip(3)
+    block['source_energy'] = r.float()
+    r.skip(3)  # source strength, beam width x, y
+    if exp_mode in _VAMAS_FOV_MODES:
+        r.skip(2)
+    if exp_mode in _VAMAS_LINESCAN_MODES:
+        r.skip(6)
+    r.skip(2)  # source polar angle, azimuth
+    block['analyser_mode'] = r.text()
+    block['pass_energy'] = r.float()
+    if technique == 'AES diff':
+        r.skip(1)
+    r.skip(1)  # lens magnification
+    block['work_function'] = r.float()
+    r.skip(5)  # target bias, analysis width x, y, take-off polar angle, azimuth
+    block['species'] = r.text()
+    block['transition'] = r.text()
+    r.skip(1)  # charge of detected particle
+
+    if header['scan_mode'] != 'REGULAR':
+        raise ValueError(f"Unsupported VAMAS scan mode: {header['scan_mode']}")
+    block['abscissa_label'] = r.text()
+    block['abscissa_units'] = r.text()
+    block['abscissa_start'] = r.float()
+    block['abscissa_step'] = r.float()
+
+    variables = []
+    for _ in range(r.int()):
+        variables.append(r.text())
+        r.skip(1)  # units
+    block['variables'] = variables
+    r.skip(1)  # signal mode
+    block['dwell_time_s'] = r.float()
+    block['scans'] = r.int()
+    r.skip(1)  # signal time correction
+    if exp_mode in _VAMAS_SPUTTER_MODES and technique in _VAMAS_ELECTRON_TECHNIQUES:
+        r.skip(7)
+    r.skip(3)  # sample tilt polar angle, azimuth, rotation
+
+    extra = {}
+    for _ in range(r.int()):
+        label = r.text()
+        r.skip(1)  # units
+        extra[label] = r.text()
+    block['additional_parameters'] = extra
+    r.skip(header['n_future_block_entries'])
+
+    n_values = r.int()
+    r.skip(2 * len(variables))  # min/max of each variable
+    block['n_values'] = n_values
+    block['n_points'] = n_values // max(len(variables), 1)
+    block['data_offset'] = r.tell()
+
+    block.setdefault('sweeps', block['scans'])
+    if block['transition'] in ('', 'None'):
+        block['region'] = 'Survey' if block['species'] == 'Wide' else block['species']
+    else:
+        block['region'] = f"{block['species']} {block['transition']}"
+    return block
+
+
+def _read_vamas_header(r):
+    header = {
+        'format': r.text(),
+        'institution': r.text(),
+        'instrument': r.text(),
+        'operator': r.text(),
+        'experiment': r.text(),
+    }
+    header['comment'] = [r.text() for _ in range(r.int())]
+    header['experiment_mode'] = r.text()
+    header['scan_mode'] = r.text()
+    if header['experiment_mode'] in _VAMAS_REGION_MODES:
+        header['n_regions'] = r.int()
+    if header['experiment_mode'] in _VAMAS_MAP_MODES:
+        r.skip(3)  # analysis positions, discrete x and y coordinates
+
+    variables = []
+    for _ in range(r.int()):
+        variables.append(r.text())
+        r.skip(1)  # units
+    header['experimental_variables'] = variables
+
+    if r.int() != 0:
+        raise ValueError("VAMAS parameter inclusion/exclusion lists are not supported")
+    r.skip(r.int())  # manually entered items
+    n_future_experiment = r.int()
+    header['n_future_block_entries'] = r.int()
+    r.skip(n_future_experiment)
+    header['n_blocks'] = r.int()
+    return header
+
+
+@functools.lru_cache(maxsize=_VAMAS_BLOCK_CACHE_SIZE)
+def _read_vamas_values(path, file_key, data_offset, n_values, n_variables):
+    """Read one block's ordinate values; cached per file version and block."""
+    with open(path, 'rb') as f:
+        f.seek(data_offset)
+        lines = [f.readline() for _ in range(n_values)]
+    values = np.array(b' '.join(lines).split(), dtype=np.float64)
+    values = values.reshape(-1, max(n_variables, 1))
+    values.flags.writeable = False
+    return values
+
+
+class VamasFile:
+    """
+    Indexed reader for VAMAS (.vms) acquisition files.
+
+    Opening a file parses the experiment header and each block's header once,
+    skipping over the ordinate values, to build a block index. Spectra are read
+    on demand by seeking straight to a block's data, and decoded blocks are
+    cached, so loading one region never parses the whole session.
+
+    Usage:
+        vms = VamasFile('data/raw/02122025_duncanreece_rit2749.vms')
+        vms.block_table()              # one row per block
+        c1s = vms.read_region('C 1s')  # first C 1s block
+        c1s['binding_energy'], c1s['counts']
+    """
+
+    _index_cache = {}
+
+    def __init__(self, path):
+        self.path = str(Path(path).resolve())
+        stat = os.stat(self.path)
+        self._file_key = (stat.st_mtime_ns, stat.st_size)
+
+        cached = VamasFile._index_cache.get(self.path)
+        if cached is not None and cached[0] == self._file_key:
+            self.header, self.blocks = cached[1], cached[2]
+            return
+
+        with open(self.path, 'rb') as f:
+            r = _LineReader(f)
+            self.header = _read_vamas_header(r)
+            self.blocks = []
+            for index in range(self.header['n_blocks']):
+                block = _read_vamas_block_header(r, self.header, r.tell())
+                block['index'] = index
+                r.skip(block['n_values'])
+                self.blocks.append(block)
+        VamasFile._index_cache[self.path] = (self._file_key, self.header, self.blocks)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def block_table(self):
+        """Return the block index as a DataFrame (one row per block)."""
+        columns = ['index', 'block_id', 'sample_id', 'region', 'technique', 'n_points',
+                   'abscissa_start', 'abscissa_step', 'pass_energy', 'scans', 'sweeps',
+                   'acquisition_time_s', 'dwell_time_s', 'acquired']
+        return pd.DataFrame([{col: b.get(col) for col in columns} for b in self.blocks],
+                            columns=columns)
+
+    def counts_per_cps(self):
+        """
+        Detected counts per CPS unit of each region (dwell time x scans).
+
+        Regions acquired with different settings take the smallest value, so
+        counting noise derived from it is never underestimated.
+
+        Returns:
+            dict of {region: counts per CPS}
+        """
+        factors = {}
+        for b in self.blocks:
+            factor = b['dwell_time_s'] * b['scans']
+            factors[b['region']] = min(factor, factors.get(b['region'], factor))
+        return factors
+
+    def find(self, region=None, sample_id=None):
+        """Indices of blocks matching a region name and/or sample identifier."""
+        return [b['index'] for b in self.blocks
+                if (region is None or b['region'] == region)
+                and (sample_id is None or b['sample_id'] == sample_id)]
+
+    def read_block(self, index):
+        """
+        Read one block's spectrum.
+
+        Args:
+            index: Block position in the file
+
+        Returns:
+            dict with the block metadata plus 'kinetic_energy', 'binding_energy'
+            and 'counts' arrays (first corresponding variable) and 'variables',
+            a dict of every corresponding variable's array
+        """
+        block = self.blocks[index]
+        values = _read_vamas_values(self.path, self._file_key, block['data_offset'],
+                                    block['n_values'], len(block['variables']))
+        abscissa = block['abscissa_start'] + block['abscissa_step'] * np.arange(len(values))
+
+        if 'binding' in block['abscissa_label'].lower():
+            binding, kinetic = abscissa, block['source_energy'] - abscissa
+        else:
+            kinetic, binding = abscissa, block['source_energy'] - abscissa
+
+        result = dict(block)
+        result['kinetic_energy'] = kinetic
+        result['binding_energy'] = binding
+        result['variables'] = {name: values[:, i] for i, name in enumerate(block['variables'])}
+        result['counts'] = values[:, 0]
+        return result
+
+    def read_region(self, region, sample_id=None, which=0):
+        """Read the ``which``-th block for a region (e.g. 'C 1s', 'Survey')."""
+        matches = self.find(region=region, sample_id=sample_id)
+        if not matches:
+            raise KeyError(f"No '{region}' block in {self.path}")
+        return self.read_block(matches[which])
+
+    def iter_blocks(self, region=None, sample_id=None):
+        """Yield blocks one at a time (only one block's data in memory per step)."""
+        for index in self.find(region=region, sample_id=sample_id):
+            yield self.read_block(index)